@@ -0,0 +1,154 @@
+import shutil
+import subprocess
+import wave
+from functools import lru_cache
+
+from harmony import parse_note
+
+SAMPLE_RATE = 22050
+
+# Relative amplitudes of the harmonics summed for every note (a soft, organ-like tone)
+PARTIALS = (1.0, 0.5, 0.25, 0.125)
+
+# Envelope attack, decay and release in seconds, and the sustain level
+ATTACK, DECAY, SUSTAIN, RELEASE = 0.02, 0.1, 0.7, 0.25
+
+CHORD_SECONDS = 1.0
+GAP_SECONDS = 0.3
+
+# Chord voicings: close position, the third raised an octave, and the two inversions
+VOICINGS = ("close", "open", "first inversion", "second inversion")
+
+# Lowest MIDI note a chord root may get (C3)
+BASS_C = 48
+
+# Local players that read a WAV stream from stdin, tried in order
+PLAYERS = (("aplay", "-q", "-"), ("ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-"))
+
+
+def available():
+    """Whether NumPy, which the synthesiser needs, can be imported"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def voice(notes, voicing="close"):
+    """MIDI note numbers for a chord's notes (root first), stacked upwards in the given voicing"""
+    notes = list(notes)
+    if voicing == "first inversion":
+        notes = notes[1:] + notes[:1]
+    elif voicing == "second inversion":
+        notes = notes[2:] + notes[:2]
+    pitches = [BASS_C + parse_note(notes[0])[1]]
+    for note in notes[1:]:
+        # Each note goes on the first pitch of its class above the one below it
+        pitches.append(pitches[-1] + ((parse_note(note)[1] - pitches[-1]) % 12 or 12))
+    if voicing == "open" and len(pitches) > 2:
+        pitches[1] += 12
+        pitches.sort()
+    return tuple(pitches)
+
+
+def frequency(midi):
+    return 440.0 * 2 ** ((midi - 69) / 12)
+
+
+def envelope(np, length, sample_rate):
+    """ADSR amplitude envelope of `length` samples"""
+    attack, decay, release = (int(seconds * sample_rate) for seconds in (ATTACK, DECAY, RELEASE))
+    sustain = max(0, length - attack - decay - release)
+    return np.concatenate([
+        np.linspace(0.0, 1.0, attack, endpoint=False),
+        np.linspace(1.0, SUSTAIN, decay, endpoint=False),
+        np.full(sustain, SUSTAIN),
+        np.linspace(SUSTAIN, 0.0, release),
+    ])[:length]
+
+
+@lru_cache(maxsize=512)
+def chord_pcm(notes, voicing="close", sample_rate=SAMPLE_RATE, seconds=CHORD_SECONDS):
+    """16-bit mono PCM samples of a chord, cached by (notes, voicing, sample rate)
+
+    Every harmonic of every note is one row of a phase matrix, so the whole
+    chord is a single sin() and a matrix-vector product with the partial
+    amplitudes; no Python code runs per sample. The returned array is shared
+    by every caller and read-only.
+    """
+    import numpy as np
+
+    length = int(seconds * sample_rate)
+    t = np.arange(length) / sample_rate
+    harmonics = np.arange(1, len(PARTIALS) + 1)
+    freqs = np.outer([frequency(m) for m in voice(notes, voicing)], harmonics).ravel()
+    amplitudes = np.tile(PARTIALS, len(freqs) // len(PARTIALS))
+    audible = freqs < sample_rate / 2  # Drop harmonics above Nyquist rather than let them alias
+    signal = amplitudes[audible] @ np.sin(np.outer(2 * np.pi * freqs[audible], t))
+    signal *= envelope(np, length, sample_rate)
+    peak = np.abs(signal).max()
+    if peak:
+        signal *= 0.8 * 32767 / peak
+    pcm = signal.astype(np.int16)
+    pcm.flags.writeable = False
+    return pcm
+
+
+@lru_cache(maxsize=16)
+def silence_pcm(sample_rate=SAMPLE_RATE, seconds=GAP_SECONDS):
+    import numpy as np
+
+    pcm = np.zeros(int(seconds * sample_rate), dtype=np.int16)
+    pcm.flags.writeable = False
+    return pcm
+
+
+def progression_pcm(chords, voicing="close", sample_rate=SAMPLE_RATE):
+    """Buffers for a sequence of chords (note tuples) with a short gap after each
+
+    The cached chord buffers are returned as they are rather than joined into
+    one array; write_wav streams them one after another.
+    """
+    buffers = []
+    for notes in chords:
+        buffers.append(chord_pcm(tuple(notes), voicing, sample_rate))
+        buffers.append(silence_pcm(sample_rate))
+    return buffers
+
+
+def write_wav(target, buffers, sample_rate=SAMPLE_RATE):
+    """Write PCM buffers as one mono 16-bit WAV to a path or binary file object (a pipe is fine)
+
+    The frame count is known up front, so the header is written once and
+    never patched, and each buffer is written straight from its own memory.
+    """
+    with wave.open(target, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.setnframes(sum(len(buffer) for buffer in buffers))
+        for buffer in buffers:
+            out.writeframesraw(buffer)
+
+
+def find_player():
+    """Command line of the first local WAV player found on PATH (None if there is none)"""
+    for command in PLAYERS:
+        if shutil.which(command[0]):
+            return command
+    return None
+
+
+def play(buffers, sample_rate=SAMPLE_RATE, player=None):
+    """Pipe the buffers to a local player and wait for it; False when no player is available"""
+    player = player or find_player()
+    if player is None:
+        return False
+    proc = subprocess.Popen(player, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        write_wav(proc.stdin, buffers, sample_rate)
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    return proc.wait() == 0
@@ -0,0 +1,177 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import combinations
+
+from questions import (ITEMS, PROGRESSION_PATTERNS, Progression, Question, chord_question, circle_question,
+                       progression_questions, relative_question, signature_key_question, signature_question)
+from storage import write_atomic
+from theory import THEORY
+
+MAGIC = b"COFQ"
+VERSION = 2  # Version 1 asked key identification chord questions for chord progressions
+
+# Key identification difficulties (1 unlocks circle questions, 2+ relative keys and chords)
+DIFFICULTIES = (1, 2, 3)
+
+# generate_progression leaves one or two chords blank
+PROGRESSION_BLANKS = (1, 2)
+
+# The fields of a question are joined with this separator in the packed text
+SEPARATOR = "\x1f"
+
+
+def enumerate_questions():
+    """Every distinct question, grouped by (exercise, difficulty)
+
+    Difficulty is None for exercises that do not have one. Mirrors what the
+    question generators can produce, with each random choice (flat spelling,
+    circle direction and distance, progression pattern and blanks) expanded
+    into its own question.
+    """
+    buckets = {}
+    signature_keys = [
+        (item, flats) for item in ITEMS["sig"]
+        for flats in ((False, True) if item.split(":")[1] in THEORY.flat_keys[5:] else (False,))
+    ]
+    circle = [(key, steps, position) for key in THEORY.keys for steps in range(1, 6)
+              for position in ("clockwise", "counterclockwise")]
+    for difficulty in DIFFICULTIES:
+        exercise = "Key Identification"
+        questions = [signature_key_question(None, item, exercise, difficulty, flats)
+                     for item, flats in signature_keys]
+        questions += [circle_question(key, steps, position, exercise, difficulty)
+                      for key, steps, position in circle]
+        if difficulty >= 2:
+            questions += [relative_question(item, exercise, difficulty) for item in ITEMS["rel"]]
+            questions += [chord_question(item, exercise, difficulty) for item in ITEMS["chord"]]
+        buckets[exercise, difficulty] = questions
+    patterns = dict.fromkeys(pattern for patterns in PROGRESSION_PATTERNS.values() for pattern in patterns)
+    buckets["Chord Progression", None] = [
+        question
+        for key in THEORY.keys for pattern in patterns
+        for count in PROGRESSION_BLANKS for blanks in combinations(range(len(pattern)), count)
+        for question in progression_questions(Progression(
+            key, [(THEORY.chord_degrees[degree], THEORY.chord[key, degree]) for degree in pattern], blanks, pattern
+        ))
+    ]
+    buckets["Relative Keys", None] = [relative_question(item) for item in ITEMS["rel"]]
+    buckets["Key Signatures", None] = [signature_question(item) for item in ITEMS["sig"]]
+    return buckets
+
+
+class QuestionBank:
+    """Immutable, precomputed set of every question, packed for O(1) random access
+
+    All prompts, answers and metadata are stored as one UTF-8 text blob with an
+    array of offsets, so the bank can be written to a file and memory-mapped by
+    any number of processes. Questions of one (exercise, difficulty) form a
+    contiguous range of indexes, so drawing one is a single randrange. Each
+    question is decoded on first access and then reused, so callers must not
+    modify the returned metadata.
+    """
+
+    def __init__(self, data):
+        if bytes(data[:4]) != MAGIC:
+            raise ValueError("Not a question bank file")
+        version, header_size = struct.unpack_from("<HI", data, 4)
+        if version != VERSION:
+            raise ValueError(f"Unsupported question bank version {version}")
+        offset = 4 + struct.calcsize("<HI")
+        header = json.loads(bytes(data[offset:offset + header_size]))
+        offset += header_size
+
+        self._data = data
+        self.count = header["count"]
+        self.buckets = {
+            (exercise, difficulty): range(start, stop) for exercise, difficulty, start, stop in header["buckets"]
+        }
+        size = 4 * (self.count + 1)
+        if header["byteorder"] == sys.byteorder and offset % 4 == 0:
+            # Read the offsets in place (no copy when the data is memory-mapped)
+            self._offsets = memoryview(data)[offset:offset + size].cast("I")
+        else:
+            self._offsets = array("I", bytes(data[offset:offset + size]))
+            if header["byteorder"] != sys.byteorder:
+                self._offsets.byteswap()
+        self._text = offset + size
+        self._decoded = [None] * self.count
+
+    @classmethod
+    def build(cls):
+        """Enumerate every question and pack them into an in-memory bank"""
+        return cls(cls.pack(enumerate_questions()))
+
+    @staticmethod
+    def pack(buckets):
+        records, ranges = [], []
+        for (exercise, difficulty), questions in buckets.items():
+            ranges.append([exercise, difficulty, len(records), len(records) + len(questions)])
+            for q in questions:
+                records.append(SEPARATOR.join((q.prompt, q.answer, json.dumps(q.metadata, separators=(",", ":")))))
+        encoded = [record.encode("utf-8") for record in records]
+        offsets = array("I", [0])
+        for record in encoded:
+            offsets.append(offsets[-1] + len(record))
+        header = json.dumps({"count": len(records), "buckets": ranges, "byteorder": sys.byteorder}).encode("utf-8")
+        # Pad the header so the offsets array starts 4-byte aligned
+        header += b" " * (-(4 + struct.calcsize("<HI") + len(header)) % 4)
+        return b"".join([MAGIC, struct.pack("<HI", VERSION, len(header)), header, offsets.tobytes()] + encoded)
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a bank written by `write`, building the file first if it does not exist or is outdated"""
+        if not os.path.exists(path) or cls.outdated(path):
+            cls.build().write(path)
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @staticmethod
+    def outdated(path):
+        """Whether `path` is a bank file of an earlier version"""
+        with open(path, "rb") as f:
+            head = f.read(6)
+        return head[:4] == MAGIC and len(head) == 6 and struct.unpack("<H", head[4:])[0] < VERSION
+
+    def write(self, path):
+        write_atomic(path, bytes(self._data))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        question = self._decoded[index]
+        if question is None:
+            start = self._text + self._offsets[index]
+            stop = self._text + self._offsets[index + 1]
+            prompt, answer, metadata = bytes(self._data[start:stop]).decode("utf-8").split(SEPARATOR)
+            question = self._decoded[index] = Question(prompt, answer, json.loads(metadata))
+        return question
+
+    def bucket(self, exercise, difficulty=None):
+        """Indexes of the questions for `exercise` (and difficulty, for key identification)"""
+        if exercise == "Key Identification" and difficulty is None:
+            difficulty = DIFFICULTIES[-1]
+        return self.buckets[exercise, difficulty]
+
+    def draw(self, rng, exercise, difficulty=None):
+        """One uniformly random question from the bucket"""
+        bucket = self.bucket(exercise, difficulty)
+        return self[bucket[rng.randrange(len(bucket))]]
+
+    def shuffled(self, rng, exercise, difficulty=None, repeat=False):
+        """Yield every question of the bucket once in random order
+
+        This is coverage mode; with `repeat`, a fresh shuffle follows each pass,
+        so a session never sees a question twice until it has seen them all.
+        """
+        order = list(self.bucket(exercise, difficulty))
+        while True:
+            rng.shuffle(order)
+            for index in order:
+                yield self[index]
+            if not repeat:
+                return
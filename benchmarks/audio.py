@@ -0,0 +1,49 @@
+"""Benchmark for the ear-training synthesiser
+
+Times rendering every diatonic triad in every voicing with the chord cache
+cleared, cached lookups, and streaming an eight-chord progression to WAV.
+"""
+import io
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio  # noqa: E402
+from harmony import chord_notes  # noqa: E402
+from theory import THEORY  # noqa: E402
+
+
+def run(number=20000):
+    if not audio.available():
+        return {"skipped": "numpy is not installed"}
+    chords = sorted({chord_notes(key, "major", degree) for key in THEORY.keys for degree in range(7)})
+    renders = [(notes, voicing) for notes in chords for voicing in audio.VOICINGS]
+
+    audio.chord_pcm.cache_clear()
+    start = time.perf_counter()
+    for notes, voicing in renders:
+        audio.chord_pcm(notes, voicing)
+    cold = time.perf_counter() - start
+
+    cached = timeit.timeit(lambda: audio.chord_pcm(chords[0], "close"), number=number) / number
+    progression = [chord_notes("Eb", "major", degree) for degree in (0, 5, 3, 4, 0, 1, 4, 0)]
+
+    def write_progression():
+        audio.write_wav(io.BytesIO(), audio.progression_pcm(progression))
+
+    return {
+        "chords": len(renders),
+        "rendered_chords_per_s": len(renders) / cold,
+        "render_ms": cold / len(renders) * 1000,
+        "cached_lookup_us": cached * 1e6,
+        "progression_wav_ms": min(timeit.repeat(write_progression, number=20, repeat=3)) / 20 * 1000,
+        "audio_seconds_per_chord": audio.CHORD_SECONDS,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps({"audio": run()}, indent=4))
@@ -0,0 +1,40 @@
+"""Benchmark for the precomputed question bank
+
+Compares drawing a question from the exercise generators with a single random
+index into the bank (in memory and memory-mapped from a file), and times
+building the bank.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank import QuestionBank  # noqa: E402
+from questions import bank_stream, question_stream  # noqa: E402
+
+
+def run(number=100000, seed=1):
+    rng = random.Random(seed)
+    bank = QuestionBank.build()
+    with tempfile.TemporaryDirectory() as workdir:
+        mapped = QuestionBank.open(os.path.join(workdir, "bank.bin"))
+        generators = question_stream(rng)
+        drawn = bank_stream(rng, bank)
+        mapped_drawn = bank_stream(rng, mapped)
+        results = {
+            "questions": len(bank),
+            "build_ms": timeit.timeit(QuestionBank.build, number=10) / 10 * 1000,
+            "generator_us": timeit.timeit(lambda: next(generators), number=number) / number * 1e6,
+            "bank_us": timeit.timeit(lambda: next(drawn), number=number) / number * 1e6,
+            "bank_mmap_us": timeit.timeit(lambda: next(mapped_drawn), number=number) / number * 1e6,
+        }
+        del mapped_drawn, mapped
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps({"bank": run()}, indent=4))
@@ -0,0 +1,53 @@
+"""Benchmark for the chord-corpus analyser
+
+Generates songs from the diatonic chords of random keys (some with sevenths
+and slash chords) and times key detection plus roman-numeral analysis, with
+and without writing the JSONL output.
+"""
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import analyse_corpus, analyse_line  # noqa: E402
+from theory import THEORY  # noqa: E402
+
+
+def make_songs(count, seed=1):
+    rng = random.Random(seed)
+    songs = []
+    for _ in range(count):
+        chords = THEORY.major_chords[rng.choice(THEORY.keys)]
+        song = [chords[rng.choice((0, 0, 1, 3, 4, 4, 5))] for _ in range(rng.randint(4, 32))]
+        song[rng.randrange(len(song))] += rng.choice(("7", "/E", ""))
+        songs.append(" ".join(song) + "\n")
+    return songs
+
+
+def run(count=20000):
+    songs = make_songs(count)
+    chords = sum(len(song.split()) for song in songs)
+
+    start = time.perf_counter()
+    for song in songs:
+        analyse_line(song)
+    analyse_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analyse_corpus(iter(songs), io.StringIO())
+    corpus_s = time.perf_counter() - start
+    return {
+        "songs": count,
+        "chords_per_song": chords / count,
+        "songs_per_s": count / analyse_s,
+        "chords_per_s": chords / analyse_s,
+        "songs_per_s_with_output": count / corpus_s,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps({"corpus": run()}, indent=4))
@@ -0,0 +1,34 @@
+"""Benchmark for the pitch-class chord engine
+
+Compares a cached diatonic_chords() call with the TheoryIndex dict lookup it
+replaced, and times uncached generation of every mode and chord size.
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harmony import CHORD_SIZES, MODES, diatonic_chords  # noqa: E402
+from theory import THEORY  # noqa: E402
+
+
+def generate_all():
+    return [diatonic_chords.__wrapped__(key, mode, size)
+            for key in THEORY.keys for mode in MODES for size in CHORD_SIZES.values()]
+
+
+def run(number=200000):
+    diatonic_chords("Eb", "major", 3)
+    combinations = len(THEORY.keys) * len(MODES) * len(CHORD_SIZES)
+    return {
+        "dict_lookup_ns": timeit.timeit(lambda: THEORY.chord["Eb", 4], number=number) / number * 1e9,
+        "cached_ns": timeit.timeit(lambda: diatonic_chords("Eb", "major", 3)[4], number=number) / number * 1e9,
+        "uncached_us": timeit.timeit(generate_all, number=5) / 5 / combinations * 1e6,
+        "combinations": combinations,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps({"harmony": run()}, indent=4))
@@ -0,0 +1,88 @@
+"""Disk writes per session with and without the write-behind store
+
+Replays a session of exercises against real profile files: every answer marks
+the profile dirty, every exercise ends with a save and the session ends with a
+final save. The time between answers is drawn from an exponential distribution
+and the whole session is scaled down by TIME_SCALE to run quickly (the save
+delay is scaled the same way). Writes are counted for a store that saves at
+every change and for WriteBehindStore, alongside the time a save request
+blocks the session.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import CircleOfFifths  # noqa: E402
+from storage import AppendOnlyStore, WriteBehindStore  # noqa: E402
+
+TIME_SCALE = 0.02
+
+
+def silent(text=""):
+    pass
+
+
+def replay(store, exercises, answer_gap, rng):
+    """Run a scripted session against `store`; returns the mean time a save request took in ms"""
+    app = CircleOfFifths(store, output=silent)
+    blocked, requests = 0.0, 0
+    for i in range(exercises):
+        for _ in range(5):
+            time.sleep(rng.expovariate(1 / (answer_gap * TIME_SCALE)))
+            app.raise_proficiency(app.keys[i % 12], 0.2)
+            start = time.perf_counter()
+            store.mark_dirty(app.user_data)
+            blocked += time.perf_counter() - start
+            requests += 1
+        app.record_exercise({"date": "2026-01-01T00:00:00", "type": "Key Signatures", "score": 80.0})
+        start = time.perf_counter()
+        store.save(app.user_data)
+        blocked += time.perf_counter() - start
+        requests += 1
+    start = time.perf_counter()
+    store.save(app.user_data)
+    store.close()
+    blocked += time.perf_counter() - start
+    return blocked / (requests + 1) * 1000
+
+
+class EveryChangeStore(AppendOnlyStore):
+    """Synchronous store that writes on every change, counting its writes"""
+
+    writes = 0
+
+    def save(self, user_data):
+        self.writes += 1
+        super().save(user_data)
+
+    mark_dirty = save
+
+
+def run(exercises=10, answer_gaps=(1.0, 5.0), delay=2.0, seed=1):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for gap in answer_gaps:
+            sync = EveryChangeStore(os.path.join(workdir, f"sync_{gap}.json"))
+            sync_ms = replay(sync, exercises, gap, random.Random(seed))
+            behind = WriteBehindStore(AppendOnlyStore(os.path.join(workdir, f"behind_{gap}.json")),
+                                      delay * TIME_SCALE)
+            behind_ms = replay(behind, exercises, gap, random.Random(seed))
+            results[f"{gap:g}s between answers"] = {
+                "save_requests": behind.requested,
+                "exercise_end_writes": exercises + 1,  # The old save points, without per-answer saves
+                "every_change_writes": sync.writes,
+                "write_behind_writes": behind.writes,
+                "write_reduction": 1 - behind.writes / sync.writes,
+                "every_change_request_ms": sync_ms,
+                "write_behind_request_ms": behind_ms,
+            }
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps({"persistence": run()}, indent=4))
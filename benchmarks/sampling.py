@@ -0,0 +1,67 @@
+"""Benchmark and distribution check for the weighted key sampler
+
+Times sampling and weight updates against the old approach of rebuilding a
+list of repeated keys, then draws a large sample and runs a chi-square
+goodness-of-fit test against the exact float weights.
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sampling import key_sampler, proficiency_weight  # noqa: E402
+from theory import THEORY  # noqa: E402
+
+# 99.9th percentile of the chi-square distribution with 11 degrees of freedom
+CHI2_CRITICAL_11 = 31.26
+
+
+def repeated_list_choice(proficiency, rng):
+    """The selection the chord progression exercise used to do on every call"""
+    weighted_keys = []
+    for key, prof in proficiency.items():
+        weighted_keys.extend([key] * int(max(1, (11 - prof))))
+    return rng.choice(weighted_keys)
+
+
+def chi_square(sampler, rng, draws):
+    counts = dict.fromkeys(sampler.items, 0)
+    for _ in range(draws):
+        counts[sampler.sample(rng)] += 1
+    total = sampler.total()
+    return sum(
+        (counts[item] - draws * sampler.weight(item) / total) ** 2 / (draws * sampler.weight(item) / total)
+        for item in sampler.items
+    )
+
+
+def run(number=100000, draws=200000, seed=1):
+    rng = random.Random(seed)
+    # Fractional proficiencies, which int() truncation used to ignore
+    proficiency = {key: 1 + (i * 0.7) % 9 for i, key in enumerate(THEORY.keys)}
+    sampler = key_sampler(proficiency)
+
+    results = {
+        "sample_us": timeit.timeit(lambda: sampler.sample(rng), number=number) / number * 1e6,
+        "update_us": timeit.timeit(
+            lambda: sampler.update("D", proficiency_weight(rng.uniform(1, 10))), number=number
+        ) / number * 1e6,
+        "repeated_list_us": timeit.timeit(
+            lambda: repeated_list_choice(proficiency, rng), number=number // 10
+        ) / (number // 10) * 1e6,
+    }
+
+    statistic = chi_square(sampler, rng, draws)
+    results["chi_square"] = statistic
+    results["chi_square_critical"] = CHI2_CRITICAL_11
+    results["distribution_ok"] = statistic < CHI2_CRITICAL_11
+    return results
+
+
+if __name__ == "__main__":
+    results = run()
+    print(json.dumps({"sampling": results}, indent=4))
+    sys.exit(0 if results["distribution_ok"] else 1)
@@ -0,0 +1,40 @@
+"""Cold-start benchmark: how long it takes to import the app in a fresh interpreter
+
+Compares importing main.py as it is now (matplotlib loaded on first chart)
+with importing it plus matplotlib, which is what every launch used to pay.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    "import main": "import main",
+    "import main + matplotlib (eager)": "import main; from matplotlib.figure import Figure",
+}
+
+
+def time_import(code, runs=10):
+    """Median wall time in ms of running `code` in a fresh interpreter"""
+    timer = "import time; t = time.perf_counter(); {}; print((time.perf_counter() - t) * 1000)"
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", timer.format(code)],
+            cwd=REPO, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            return None
+        samples.append(float(result.stdout.strip()))
+    return statistics.median(samples)
+
+
+def run(runs=10):
+    return {name: time_import(code, runs) for name, code in CASES.items()}
+
+
+if __name__ == "__main__":
+    print(json.dumps({"startup_ms": run()}, indent=4))
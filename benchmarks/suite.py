@@ -0,0 +1,268 @@
+"""Benchmark suite for a learner session, run with `main.py bench`
+
+Times question generation and full exercises for every exercise type (answers
+are sent straight into the exercise generators, so nothing waits on input()),
+answer checking, saving and loading profiles at several history sizes,
+update_skill_level and the progress chart. Results are printed as JSON, with
+the commit they were measured on, so runs can be compared across commits.
+With --profile the whole run is also recorded with cProfile, and with
+--tracemalloc every section reports its peak traced memory and largest
+allocation sites.
+"""
+import cProfile
+import importlib.util
+import io
+import json
+import os
+import platform
+import pstats
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from grading import canonical, is_correct  # noqa: E402
+from main import CircleOfFifths  # noqa: E402
+from questions import (chord_progression_questions, key_identification_questions,  # noqa: E402
+                       key_signature_questions, question_stream, relative_key_questions)
+from storage import AppendOnlyStore  # noqa: E402
+
+HISTORY_SIZES = (10, 10000, 1000000)
+
+# Exercise type -> name of the CircleOfFifths steps generator that runs it
+EXERCISE_STEPS = {
+    "Key Identification": "key_identification_steps",
+    "Chord Progression": "chord_progression_steps",
+    "Relative Keys": "relative_key_steps",
+    "Key Signatures": "key_signature_steps",
+}
+
+SECTIONS = ("questions", "exercises", "grading", "skill", "profiles", "startup", "sampling", "harmony",
+            "persistence", "bank", "audio", "corpus", "voicing", "sync")
+
+
+def silent(text=""):
+    pass
+
+
+def per_call_us(fn, number, repeat=3):
+    """Best-of-`repeat` mean time of one call to `fn`, in microseconds"""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def once_ms(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def make_app(path):
+    return CircleOfFifths(AppendOnlyStore(path), output=silent)
+
+
+def play(steps, answers):
+    """Run an exercise generator to the end, answering every prompt from `answers`"""
+    try:
+        next(steps)
+        while True:
+            steps.send(next(answers))
+    except StopIteration:
+        pass
+
+
+def bench_questions(number):
+    rng = random.Random(1)
+    generators = {
+        "Key Identification": key_identification_questions(rng, 3),
+        "Chord Progression": chord_progression_questions(rng),
+        "Relative Keys": relative_key_questions(rng),
+        "Key Signatures": key_signature_questions(rng),
+    }
+    return {name: per_call_us(lambda g=gen: next(g), number) for name, gen in generators.items()}
+
+
+def bench_exercises(workdir, number):
+    """Whole five-question exercises, including the profile save at the end"""
+    app = make_app(os.path.join(workdir, "exercises.json"))
+    answers = iter(lambda: random.choice(("C", "Am", "3", "F#/Gb", "")), None)
+    return {
+        name: per_call_us(lambda m=method: play(getattr(app, m)(), answers), number, repeat=1) / 1000
+        for name, method in EXERCISE_STEPS.items()
+    }
+
+
+def bench_grading(number):
+    rng = random.Random(2)
+    questions = question_stream(rng)
+    pairs = []
+    for _ in range(1000):
+        q = next(questions)
+        pairs.append((rng.choice((q.answer, q.answer.lower(), "C", "Gbm", "7")), q.answer))
+
+    def check_all():
+        for response, answer in pairs:
+            is_correct(response, answer)
+
+    def check_all_cold():
+        canonical.cache_clear()
+        check_all()
+
+    return {
+        "is_correct_us": per_call_us(check_all, max(1, number // 1000)) / len(pairs),
+        "is_correct_uncached_us": per_call_us(check_all_cold, max(1, number // 1000)) / len(pairs),
+    }
+
+
+def bench_skill(workdir, number):
+    app = make_app(os.path.join(workdir, "skill.json"))
+    return {"update_skill_level_us": per_call_us(app.update_skill_level, number)}
+
+
+def build_profile(path, size):
+    """Write a profile with `size` history entries spread over the last few years"""
+    app = make_app(path)
+    rng = random.Random(size)
+    start = datetime(2020, 1, 1)
+    history = app.user_data["exercise_history"]
+    types = tuple(EXERCISE_STEPS)
+    for i in range(size):
+        history.append({
+            "date": start + timedelta(seconds=i * 3600 * 24 * 1500 // size),
+            "type": rng.choice(types),
+            "score": rng.choice((0.0, 20.0, 40.0, 60.0, 80.0, 100.0)),
+        })
+    app.user_data["exercises_completed"] = size
+    app.store.save(app.user_data)
+    return app
+
+
+def bench_profiles(workdir, sizes):
+    """Save, load and progress chart timings per history size"""
+    results = {}
+    can_draw = importlib.util.find_spec("matplotlib") is not None
+    for size in sizes:
+        path = os.path.join(workdir, f"profile_{size}.json")
+        case = {"build_s": once_ms(lambda: build_profile(path, size)) / 1000}
+        app = make_app(path)
+
+        def save_one():
+            app.record_exercise({"date": datetime.now(), "type": "Key Signatures", "score": 80.0})
+            app.save_user_data()
+
+        case["save_ms"] = per_call_us(save_one, 20, repeat=1) / 1000
+        case["load_ms"] = per_call_us(app.load_user_data, 20, repeat=1) / 1000
+        case["load_full_history_ms"] = once_ms(lambda: len(list(make_app(path).user_data["exercise_history"])))
+        app = make_app(path)
+        case["progress_series_cold_ms"] = once_ms(app.progress_series)
+        case["progress_series_cached_ms"] = once_ms(app.progress_series)
+        # The chart itself needs matplotlib, which is optional
+        case["generate_progress_graph_ms"] = once_ms(app.generate_progress_graph) if can_draw else None
+        results[str(size)] = case
+    return results
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(sections=SECTIONS, sizes=HISTORY_SIZES, number=10000, track_memory=False):
+    """Run the selected sections and return ({section: results}, snapshots)
+
+    With `track_memory` (tracemalloc already started) the results also hold
+    each section's peak traced memory, and `snapshots` maps each section to a
+    tracemalloc snapshot taken at its end.
+    """
+    results = {}
+    memory = {}
+    snapshots = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # Charts are written to the working directory
+        try:
+            cases = {
+                "questions": lambda: bench_questions(number),
+                "exercises": lambda: bench_exercises(workdir, max(1, number // 1000)),
+                "grading": lambda: bench_grading(number),
+                "skill": lambda: bench_skill(workdir, number),
+                "profiles": lambda: bench_profiles(workdir, sizes),
+                "startup": lambda: importlib.import_module("benchmarks.startup").run(),
+                "sampling": lambda: importlib.import_module("benchmarks.sampling").run(),
+                "harmony": lambda: importlib.import_module("benchmarks.harmony").run(),
+                "persistence": lambda: importlib.import_module("benchmarks.persistence").run(),
+                "bank": lambda: importlib.import_module("benchmarks.bank").run(),
+                "audio": lambda: importlib.import_module("benchmarks.audio").run(),
+                "corpus": lambda: importlib.import_module("benchmarks.corpus").run(),
+                "voicing": lambda: importlib.import_module("benchmarks.voicing").run(),
+                "sync": lambda: importlib.import_module("benchmarks.sync").run(),
+            }
+            for section in sections:
+                if track_memory and hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+                    tracemalloc.reset_peak()
+                results[section] = cases[section]()
+                if track_memory:
+                    memory[section] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                    snapshots[section] = tracemalloc.take_snapshot()
+        finally:
+            os.chdir(cwd)
+    if track_memory:
+        results["peak_memory_mb"] = memory
+    return results, snapshots
+
+
+def run_benchmarks(args):
+    """Entry point for `main.py bench`"""
+    sections = args.only or SECTIONS
+    unknown = sorted(set(sections) - set(SECTIONS))
+    if unknown:
+        sys.exit(f"Unknown benchmark section(s): {', '.join(unknown)}")
+    profiler = cProfile.Profile() if args.profile else None
+    if args.tracemalloc:
+        tracemalloc.start(25)
+    if profiler:
+        profiler.enable()
+    results, snapshots = run(sections, tuple(args.sizes or HISTORY_SIZES), args.number, bool(args.tracemalloc))
+    if profiler:
+        profiler.disable()
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "profiled": bool(args.profile or args.tracemalloc),
+        "results": results,
+    }
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if profiler:
+        # Raw stats for snakeviz/pstats plus the hottest functions as text
+        profiler.dump_stats(args.profile + ".prof")
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(40)
+        with open(args.profile + ".txt", "w") as f:
+            f.write(buf.getvalue())
+        print(f"Profile written to {args.profile}.prof and {args.profile}.txt", file=sys.stderr)
+    if args.tracemalloc:
+        tracemalloc.stop()
+        with open(args.tracemalloc, "w") as f:
+            for section, snapshot in snapshots.items():
+                f.write(f"== {section}: peak {results['peak_memory_mb'][section]:.1f} MiB ==\n")
+                for stat in snapshot.statistics("lineno")[:10]:
+                    f.write(f"{stat}\n")
+                f.write("\n")
+        print(f"Memory report written to {args.tracemalloc}", file=sys.stderr)
@@ -0,0 +1,65 @@
+"""Profile sync cost against history size
+
+Two machines share a sync directory. Each profile has a long history that was
+synced earlier; one machine then records a few new exercises and both sync.
+The time should depend on the new entries, not on the length of the history.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import CircleOfFifths  # noqa: E402
+from storage import AppendOnlyStore  # noqa: E402
+
+
+def silent(text=""):
+    pass
+
+
+def open_app(path):
+    return CircleOfFifths(AppendOnlyStore(path), output=silent)
+
+
+def record(app, count):
+    for i in range(count):
+        app.raise_proficiency(app.keys[i % 12], 0.2)
+        app.record_answer(True, "Key Signatures", app.keys[i % 12])
+        app.record_exercise({"date": "2026-01-01T00:00:00", "type": "Key Signatures", "score": 100.0})
+    app.save_user_data()
+
+
+def sync(path, shared):
+    """Load a profile, sync it and save it; returns the seconds taken"""
+    start = time.perf_counter()
+    app = open_app(path)
+    app.sync.sync_directory(app.user_data, app.stats, shared)
+    app.store.save(app.user_data)
+    return time.perf_counter() - start
+
+
+def run(sizes=(1000, 100000), new=10):
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = os.path.join(tmp, "a.json"), os.path.join(tmp, "b.json")
+            shared = os.path.join(tmp, "shared")
+            record(open_app(first), size)
+            open_app(second).save_user_data()
+            # Both machines learn of each other, so the timed syncs only move entries
+            initial = sync(first, shared) + sync(second, shared) + sync(first, shared)
+            record(open_app(first), new)
+            results[str(size)] = {
+                "initial_sync_s": initial,
+                "publish_ms": sync(first, shared) * 1000,
+                "merge_ms": sync(second, shared) * 1000,
+                "new_entries": new,
+            }
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps({"sync": run()}, indent=4))
@@ -0,0 +1,55 @@
+"""Benchmark for the voice-leading solver and MIDI export
+
+Times voicing every pattern in every key with cold caches, the same again
+with warm caches, and a bulk export to an in-memory MIDI file.
+"""
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harmony import chord_notes  # noqa: E402
+from questions import PROGRESSION_PATTERNS  # noqa: E402
+from theory import THEORY  # noqa: E402
+from voicing import candidate_voicings, export_midi, transition_table, voice_progression  # noqa: E402
+
+
+def all_progressions():
+    return [tuple(chord_notes(key, "major", degree) for degree in pattern)
+            for key in THEORY.keys for patterns in PROGRESSION_PATTERNS.values() for pattern in patterns]
+
+
+def run(count=20000):
+    progressions = all_progressions()
+    for cached in (candidate_voicings, transition_table, voice_progression):
+        cached.cache_clear()
+
+    start = time.perf_counter()
+    for chords in progressions:
+        voice_progression(chords)
+    cold_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chords in progressions:
+        voice_progression(chords)
+    warm_s = time.perf_counter() - start
+
+    f = io.BytesIO()
+    start = time.perf_counter()
+    export_midi(f, count)
+    export_s = time.perf_counter() - start
+    return {
+        "distinct_progressions": len(progressions),
+        "cold_progressions_per_s": len(progressions) / cold_s,
+        "warm_progressions_per_s": len(progressions) / warm_s,
+        "export_progressions": count,
+        "export_progressions_per_s": count / export_s,
+        "export_bytes": f.tell(),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps({"voicing": run()}, indent=4))
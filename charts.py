@@ -0,0 +1,166 @@
+import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DAY = 86400
+WEEK = 7 * DAY
+
+# Bucket widths tried in turn until a series fits in the chart's point budget
+BUCKET_WIDTHS = (DAY, WEEK, 4 * WEEK, 52 * WEEK)
+
+
+def _timestamp(date):
+    """Epoch seconds for a history date (a datetime, or its string form after a reload)"""
+    if isinstance(date, str):
+        return datetime.fromisoformat(date).timestamp()
+    return date.timestamp()
+
+
+class ProgressSeries:
+    """Pre-parsed score history per exercise type, kept up to date as exercises are recorded
+
+    Each exercise type holds two parallel arrays of epoch timestamps and scores,
+    so dates are parsed once when an entry is added rather than on every chart.
+    `version` increases with every new entry, which tells the renderer whether
+    the last chart is still current.
+    """
+
+    def __init__(self, history=()):
+        self.series = {}
+        self.version = 0
+        self._unsorted = set()
+        for entry in history:
+            self.add(entry)
+
+    def add(self, entry):
+        ts = _timestamp(entry["date"])
+        columns = self.series.get(entry["type"])
+        if columns is None:
+            columns = self.series[entry["type"]] = (array("d"), array("d"))
+        times, scores = columns
+        if times and ts < times[-1]:
+            self._unsorted.add(entry["type"])
+        times.append(ts)
+        scores.append(entry["score"])
+        self.version += 1
+
+    def __len__(self):
+        return sum(len(times) for times, _ in self.series.values())
+
+    def _sorted(self, ex_type):
+        times, scores = self.series[ex_type]
+        if ex_type in self._unsorted:
+            order = sorted(range(len(times)), key=times.__getitem__)
+            times = array("d", (times[i] for i in order))
+            scores = array("d", (scores[i] for i in order))
+            self.series[ex_type] = (times, scores)
+            self._unsorted.discard(ex_type)
+        return times, scores
+
+    def points(self, max_points=500):
+        """Date-sorted (date, score) lists per type, bucketed into daily/weekly/... means when large"""
+        result = {}
+        for ex_type in self.series:
+            times, scores = self._sorted(ex_type)
+            if len(times) <= max_points:
+                pairs = zip(times, scores)
+            else:
+                for width in BUCKET_WIDTHS:
+                    pairs = self._bucketed(times, scores, width)
+                    if len(pairs) <= max_points:
+                        break
+            result[ex_type] = [(datetime.fromtimestamp(ts), score) for ts, score in pairs]
+        return result
+
+    @staticmethod
+    def _bucketed(times, scores, width):
+        """Mean score per `width`-second bucket, placed at the bucket start"""
+        buckets = []
+        current, total, count = None, 0.0, 0
+        for ts, score in zip(times, scores):
+            bucket = int(ts // width)
+            if bucket != current:
+                if count:
+                    buckets.append((current * width, total / count))
+                current, total, count = bucket, 0.0, 0
+            total += score
+            count += 1
+        if count:
+            buckets.append((current * width, total / count))
+        return buckets
+
+
+def render_progress_chart(series, path="progress_chart.png"):
+    """Draw score-over-time lines for each exercise type and save them as a PNG
+
+    `series` maps exercise type to a date-sorted list of (date, score) pairs.
+    matplotlib is imported here rather than at startup, and the Figure API is
+    used directly so no GUI backend is ever involved.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+
+    for ex_type, scores in series.items():
+        dates = [s[0] for s in scores]
+        values = [s[1] for s in scores]
+        ax.plot(dates, values, marker='o', label=ex_type)
+
+    ax.set_title("Your Progress Over Time")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Score (%)")
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.legend()
+    ax.set_ylim(0, 105)
+
+    # Format the date axis
+    fig.autofmt_xdate()
+
+    fig.savefig(path)
+    return path
+
+
+class ChartRenderer:
+    """Renders progress charts on a background thread so the menu never waits on them"""
+
+    def __init__(self):
+        self._executor = None
+        self._pending = None
+        self._pending_path = None
+        self._rendered = {}  # path -> data version of the last chart written there
+
+    def is_current(self, version, path="progress_chart.png"):
+        """Whether `path` already shows data at `version` (or is being drawn from it)"""
+        if version is None or self._rendered.get(path) != version:
+            return False
+        return os.path.exists(path) or (self.busy() and self._pending_path == path)
+
+    def submit(self, series, path="progress_chart.png", version=None):
+        """Start rendering `series` to `path` and return immediately"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+        self._pending = self._executor.submit(render_progress_chart, series, path)
+        self._pending_path = path
+        self._rendered[path] = version
+        return self._pending
+
+    def busy(self):
+        return self._pending is not None and not self._pending.done()
+
+    def poll(self):
+        """Return the finished render as (path, error) once, or None if nothing has finished"""
+        if self._pending is None or not self._pending.done():
+            return None
+        future, self._pending = self._pending, None
+        error = future.exception()
+        if error:
+            self._rendered.pop(self._pending_path, None)
+        return (None, error) if error else (future.result(), None)
+
+    def close(self):
+        """Wait for any chart still being drawn"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
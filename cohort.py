@@ -0,0 +1,195 @@
+import csv
+import json
+import os
+import sys
+from itertools import islice
+from multiprocessing import Pool
+
+from questions import EXERCISES
+from storage import AppendOnlyStore
+from theory import THEORY
+
+# Proficiency histogram bins: [1, 1.5), [1.5, 2), ... [9.5, 10) and a last one for 10
+PROFICIENCY_BINS = tuple(1 + 0.5 * i for i in range(19))
+
+# Profiles handed to the pool at a time, per worker; bounds memory however many profiles there are
+WINDOW_PER_WORKER = 64
+
+CSV_FIELDS = (["path", "username", "exercises_completed", "skill_level", "mean_score", "history_entries"]
+              + [f"proficiency {key}" for key in THEORY.keys] + [f"count {name}" for name in EXERCISES])
+
+
+def find_profiles(root):
+    """Yield the path of every profile snapshot under `root`"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(".json"):
+                yield os.path.join(dirpath, name)
+
+
+def analyse_profile(path):
+    """Summarise one profile: proficiency, score per exercise type and per month
+
+    Runs in a worker process and returns only small aggregates, so the parent
+    never holds a profile's history.
+    """
+    try:
+        user_data = AppendOnlyStore(path).load()
+        proficiency = user_data["key_proficiency"]
+        types, months = {}, {}
+        for entry in user_data["exercise_history"]:
+            score = entry["score"]
+            totals = types.setdefault(entry["type"], [0, 0.0])
+            totals[0] += 1
+            totals[1] += score
+            totals = months.setdefault(str(entry["date"])[:7], [0, 0.0])
+            totals[0] += 1
+            totals[1] += score
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        # Not a profile (or an unreadable one); reported but not counted
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+    return {
+        "path": path,
+        "username": user_data.get("username"),
+        "exercises_completed": user_data.get("exercises_completed", 0),
+        "skill_level": user_data.get("skill_level", 1),
+        "proficiency": {key: proficiency.get(key, 1) for key in THEORY.keys},
+        "types": types,
+        "months": months,
+    }
+
+
+class CohortReport:
+    """Running aggregates over profile summaries; its size depends on keys, types and months only"""
+
+    def __init__(self):
+        self.profiles = 0
+        self.errors = 0
+        self.proficiency_bins = {key: [0] * len(PROFICIENCY_BINS) for key in THEORY.keys}
+        self.proficiency_sums = dict.fromkeys(THEORY.keys, 0.0)
+        self.skill_sum = 0.0
+        self.types = {}
+        self.months = {}
+
+    def add(self, summary):
+        if "error" in summary:
+            self.errors += 1
+            return
+        self.profiles += 1
+        self.skill_sum += summary["skill_level"]
+        for key, value in summary["proficiency"].items():
+            self.proficiency_sums[key] += value
+            index = min(len(PROFICIENCY_BINS) - 1, max(0, int((value - 1) * 2)))
+            self.proficiency_bins[key][index] += 1
+        for totals, updates in ((self.types, summary["types"]), (self.months, summary["months"])):
+            for name, (count, score) in updates.items():
+                current = totals.setdefault(name, [0, 0.0])
+                current[0] += count
+                current[1] += score
+
+    def summary(self):
+        profiles = self.profiles or 1
+        return {
+            "profiles": self.profiles,
+            "unreadable": self.errors,
+            "mean_skill_level": self.skill_sum / profiles,
+            "proficiency": {
+                key: {"mean": self.proficiency_sums[key] / profiles,
+                      "bins": dict(zip((f"{low:g}" for low in PROFICIENCY_BINS), self.proficiency_bins[key]))}
+                for key in THEORY.keys
+            },
+            "exercise_mix": {name: {"exercises": count, "mean_score": score / count}
+                             for name, (count, score) in sorted(self.types.items())},
+            "accuracy_by_month": {month: {"exercises": count, "mean_score": score / count}
+                                  for month, (count, score) in sorted(self.months.items())},
+        }
+
+
+def csv_row(summary):
+    exercises = sum(count for count, _ in summary["types"].values())
+    scores = sum(score for _, score in summary["types"].values())
+    return ([summary["path"], summary["username"], summary["exercises_completed"],
+             round(summary["skill_level"], 3), round(scores / exercises, 3) if exercises else "", exercises]
+            + [summary["proficiency"][key] for key in THEORY.keys]
+            + [summary["types"].get(name, [0])[0] for name in EXERCISES])
+
+
+def render_cohort_charts(summary, out_dir):
+    """Summary charts for the cohort; returns the paths written (none without matplotlib)"""
+    try:
+        from matplotlib.figure import Figure
+    except ImportError:
+        return []
+    paths = []
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.bar(THEORY.keys, [summary["proficiency"][key]["mean"] for key in THEORY.keys])
+    ax.set_title("Mean Proficiency by Key")
+    ax.set_ylabel("Proficiency (1-10)")
+    ax.set_ylim(0, 10)
+    paths.append(os.path.join(out_dir, "proficiency_by_key.png"))
+    fig.savefig(paths[-1])
+
+    months = summary["accuracy_by_month"]
+    if months:
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
+        ax.plot(list(months), [m["mean_score"] for m in months.values()], marker="o")
+        ax.set_title("Cohort Accuracy Over Time")
+        ax.set_xlabel("Month")
+        ax.set_ylabel("Mean Score (%)")
+        ax.set_ylim(0, 105)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        fig.autofmt_xdate()
+        paths.append(os.path.join(out_dir, "accuracy_over_time.png"))
+        fig.savefig(paths[-1])
+
+    mix = summary["exercise_mix"]
+    if mix:
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
+        ax.bar(list(mix), [m["exercises"] for m in mix.values()])
+        ax.set_title("Exercise Mix")
+        ax.set_ylabel("Exercises Completed")
+        paths.append(os.path.join(out_dir, "exercise_mix.png"))
+        fig.savefig(paths[-1])
+    return paths
+
+
+def analyse_cohort(root, out_dir, workers=None):
+    """Scan every profile under `root`, stream per-profile rows to CSV and return the summary
+
+    Paths are handed to the pool a window at a time, so neither the list of
+    profiles nor the per-profile results are ever held in full.
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    report = CohortReport()
+    paths = find_profiles(root)
+    with open(os.path.join(out_dir, "profiles.csv"), "w", newline="") as f, Pool(workers) as pool:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        while True:
+            window = list(islice(paths, workers * WINDOW_PER_WORKER))
+            if not window:
+                break
+            for summary in pool.imap_unordered(analyse_profile, window, chunksize=8):
+                report.add(summary)
+                if "error" not in summary:
+                    writer.writerow(csv_row(summary))
+    summary = report.summary()
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def run_cohort(args):
+    """Entry point for `main.py cohort`"""
+    summary = analyse_cohort(args.root, args.output, args.workers)
+    charts = render_cohort_charts(summary, args.output)
+    print(f"Analysed {summary['profiles']} profiles ({summary['unreadable']} unreadable files skipped)",
+          file=sys.stderr)
+    print(f"Report written to {os.path.join(args.output, 'profiles.csv')} and summary.json"
+          + (f", with {len(charts)} charts" if charts else " (install matplotlib for charts)"), file=sys.stderr)
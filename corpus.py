@@ -0,0 +1,294 @@
+"""Key detection and roman-numeral analysis for chord-chart corpora, run with `main.py corpus`
+
+Input has one song per line: chord symbols separated by spaces, commas or bar
+lines. Each chord becomes a 12-bit pitch-class mask, and its fit to all 24
+major and minor keys is one integer holding 24 fixed-width score lanes, so
+scoring a song against every key is one integer addition per chord. Lines are
+read and analysed a chunk at a time by a process pool, so memory use does not
+depend on the size of the corpus.
+"""
+import json
+import re
+import sys
+from array import array
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
+from multiprocessing import Pool
+
+from harmony import MODES, SEVENTH_SUFFIXES, TRIAD_SUFFIXES, parse_note
+from theory import THEORY
+
+# Chord suffix -> semitones above the root, from the names harmony.py gives chords
+CHORD_TYPES = {suffix: (0,) + intervals for intervals, suffix in TRIAD_SUFFIXES.items()}
+CHORD_TYPES.update({suffix: (0,) + intervals for intervals, suffix in SEVENTH_SUFFIXES.items()})
+CHORD_TYPES.update({
+    "5": (0, 7), "sus2": (0, 2, 7), "sus4": (0, 5, 7), "sus": (0, 5, 7), "7sus4": (0, 5, 7, 10),
+    "6": (0, 4, 7, 9), "m6": (0, 3, 7, 9), "add9": (0, 4, 7, 2),
+    "9": (0, 4, 7, 10, 2), "maj9": (0, 4, 7, 11, 2), "m9": (0, 3, 7, 10, 2),
+})
+# Other spellings of the same suffixes
+CHORD_ALIASES = {
+    "maj": "", "M": "", "min": "m", "-": "m", "°": "dim", "o": "dim", "+": "aug",
+    "M7": "maj7", "Δ": "maj7", "Δ7": "maj7", "min7": "m7", "-7": "m7", "ø": "m7b5", "ø7": "m7b5",
+    "°7": "dim7", "o7": "dim7",
+}
+
+# Chord symbols are separated by whitespace, commas and bar lines
+SEPARATORS = re.compile(r"[\s,|]+")
+ROOT = re.compile(r"([A-Ga-g][#b♯♭]*)(.*)")
+
+# The 24 candidate keys: (tonic pitch class, mode), majors first
+KEYS = [(pc, "major") for pc in range(12)] + [(pc, "minor") for pc in range(12)]
+
+# Minor keys also accept the raised leading tone (harmonic minor)
+SCALES = {"major": MODES["major"], "minor": MODES["natural minor"] + (11,)}
+
+# Width of one key's score lane; no song is long enough to carry a lane into the next
+LANE = 32
+LANE_MASK = (1 << LANE) - 1
+
+# Score of a chord for a key: per tone in the scale, for a chord entirely in the
+# scale, for the tonic chord, and for the dominant; songs usually open and close on the tonic
+TONE_IN_SCALE = 2
+DIATONIC = 3
+TONIC = 4
+DOMINANT = 1
+CADENCE = 4
+
+NUMERALS = ("I", "II", "III", "IV", "V", "VI", "VII")
+
+# Lines per task handed to the pool, and tasks in flight per worker
+CHUNK_LINES = 2000
+WINDOW_PER_WORKER = 4
+
+
+def _key_names():
+    names = {}
+    for key in THEORY.keys:
+        tonic = parse_note(key.split("/")[0])[1]
+        minor = THEORY.relative_minor[key]
+        names[tonic, "major"] = key
+        # The relative minor is a minor third down; "d#/ebm" is written "D#/Ebm"
+        names[(tonic + 9) % 12, "minor"] = "/".join(part[0].upper() + part[1:] for part in minor.split("/"))
+    return names
+
+
+KEY_NAMES = _key_names()
+
+
+def pack(scores):
+    """Pack one small non-negative score per key into lanes of a single integer"""
+    packed = 0
+    for i, score in enumerate(scores):
+        packed |= score << (LANE * i)
+    return packed
+
+
+def unpack(packed):
+    """Scores from the lanes of a packed integer, in KEYS order"""
+    lanes = array("I", packed.to_bytes(len(KEYS) * LANE // 8, sys.byteorder))
+    if sys.byteorder == "big":
+        lanes.reverse()
+    return lanes
+
+
+@lru_cache(maxsize=8192)
+def parse_chord(symbol):
+    """(root pitch class, pitch-class mask, chord type intervals) for a chord symbol, or None
+
+    The mask has bit n set for pitch class n; a slash bass ("C/E") is added to it.
+    """
+    symbol = symbol.replace("♯", "#").replace("♭", "b")
+    symbol, _, bass = symbol.partition("/")
+    match = ROOT.fullmatch(symbol)
+    if not match:
+        return None
+    root_name, suffix = match.groups()
+    suffix = CHORD_ALIASES.get(suffix, suffix)
+    intervals = CHORD_TYPES.get(suffix)
+    if intervals is None:
+        return None
+    try:
+        root = parse_note(root_name)[1]
+        mask = 0
+        for interval in intervals:
+            mask |= 1 << ((root + interval) % 12)
+        if bass:
+            mask |= 1 << parse_note(bass)[1]
+    except ValueError:
+        return None
+    return root, mask, intervals
+
+
+def _scale_mask(tonic, mode):
+    mask = 0
+    for step in SCALES[mode]:
+        mask |= 1 << ((tonic + step) % 12)
+    return mask
+
+
+SCALE_MASKS = [_scale_mask(tonic, mode) for tonic, mode in KEYS]
+
+
+def chord_scores(root, mask, intervals):
+    """(packed score for every key, packed cadence bonus for every key) of one chord"""
+    minor_third = 3 in intervals and 4 not in intervals
+    scores, cadence = [], []
+    for (tonic, mode), scale in zip(KEYS, SCALE_MASKS):
+        score = TONE_IN_SCALE * bin(mask & scale).count("1")
+        if mask & scale == mask:
+            score += DIATONIC
+        is_tonic = root == tonic and minor_third == (mode == "minor")
+        if is_tonic:
+            score += TONIC
+        elif root == (tonic + 7) % 12 and 4 in intervals:
+            score += DOMINANT
+        scores.append(score)
+        cadence.append(CADENCE if is_tonic else 0)
+    return pack(scores), pack(cadence)
+
+
+def roman(root, intervals, tonic, mode):
+    """Roman numeral of a chord in a key: case for the third, ° ø + for the fifth, b/# for chromatic roots"""
+    step = (root - tonic) % 12
+    scale = MODES["major"] if mode == "major" else MODES["natural minor"]
+    if step in scale:
+        prefix, degree = "", scale.index(step)
+    elif mode == "minor" and step == 11:
+        prefix, degree = "", 6  # Raised leading tone
+    elif (step + 1) % 12 in scale:
+        prefix, degree = "b", scale.index((step + 1) % 12)
+    else:
+        prefix, degree = "#", scale.index((step - 1) % 12)
+    numeral = NUMERALS[degree]
+    if 3 in intervals and 4 not in intervals:
+        numeral = numeral.lower()
+    tones = set(intervals)
+    if {3, 6} <= tones:
+        numeral += "°7" if 9 in tones else "ø7" if 10 in tones else "°"
+    elif {4, 8} <= tones:
+        numeral += "+"
+    elif 11 in tones:
+        numeral += "maj7"
+    elif 10 in tones:
+        numeral += "7"
+    return prefix + numeral
+
+
+@lru_cache(maxsize=8192)
+def chord_profile(symbol):
+    """Everything the analysis needs about one chord symbol, worked out once per distinct symbol
+
+    (packed scores, packed cadence bonuses, roman numeral in each of KEYS), or
+    None if the symbol is not a chord.
+    """
+    chord = parse_chord(symbol)
+    if chord is None:
+        return None
+    root, mask, intervals = chord
+    scores, cadence = chord_scores(root, mask, intervals)
+    return scores, cadence, tuple(roman(root, intervals, tonic, mode) for tonic, mode in KEYS)
+
+
+def analyse_line(line):
+    """Key, confidence and roman numerals for one song (None when no chord could be read)"""
+    chords, unknown = [], 0
+    for symbol in SEPARATORS.split(line.strip()):
+        if symbol:
+            profile = chord_profile(symbol)
+            if profile is None:
+                unknown += 1
+            else:
+                chords.append(profile)
+    if not chords:
+        return None
+    # Opening and closing on the tonic count extra
+    total = chords[0][1] + chords[-1][1]
+    for profile in chords:
+        total += profile[0]
+    scores = unpack(total)
+    ranked = sorted(scores, reverse=True)
+    best = scores.index(ranked[0])
+    tonic, mode = KEYS[best]
+    return {
+        "key": KEY_NAMES[tonic, mode],
+        "mode": mode,
+        "confidence": round((ranked[0] - ranked[1]) / ranked[0], 3) if ranked[0] else 0.0,
+        "numerals": [profile[2][best] for profile in chords],
+        "unknown_chords": unknown,
+    }
+
+
+def analyse_chunk(task):
+    """Analyse a chunk of lines; returns the JSONL text and the chunk's key and pattern counts"""
+    first, lines = task
+    out, keys, patterns = [], Counter(), Counter()
+    for number, line in enumerate(lines, start=first):
+        result = analyse_line(line)
+        if result is None:
+            continue
+        out.append(json.dumps({"line": number, **result}, ensure_ascii=False))
+        keys[result["key"]] += 1
+        numerals = result["numerals"]
+        if len(numerals) >= 4:
+            patterns[" ".join(numerals[:4])] += 1
+    return "".join(line + "\n" for line in out), keys, patterns
+
+
+def chunks(f, size=CHUNK_LINES):
+    """Yield (first line number, lines) for successive chunks of a file"""
+    first = 1
+    while True:
+        lines = list(islice(f, size))
+        if not lines:
+            return
+        yield first, lines
+        first += len(lines)
+
+
+def analyse_corpus(infile, outfile, workers=1, chunk_lines=CHUNK_LINES):
+    """Stream `infile` through the analyser, writing JSONL to `outfile` in input order
+
+    Returns (songs analysed, key counts, opening four-chord pattern counts).
+    Only a window of chunks is in flight at a time.
+    """
+    songs, keys, patterns = 0, Counter(), Counter()
+    tasks = chunks(infile, chunk_lines)
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        while True:
+            window = list(islice(tasks, max(1, workers * WINDOW_PER_WORKER)))
+            if not window:
+                break
+            results = pool.imap(analyse_chunk, window) if pool else map(analyse_chunk, window)
+            for text, chunk_keys, chunk_patterns in results:
+                outfile.write(text)
+                songs += sum(chunk_keys.values())
+                keys.update(chunk_keys)
+                patterns.update(chunk_patterns)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return songs, keys, patterns
+
+
+def run_corpus(args):
+    """Entry point for `main.py corpus`"""
+    infile = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    outfile = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        songs, keys, patterns = analyse_corpus(infile, outfile, args.workers, args.chunk_lines)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    print(f"Analysed {songs} songs", file=sys.stderr)
+    for name, count in keys.most_common(5):
+        print(f"  {name}: {count}", file=sys.stderr)
+    if patterns:
+        print("Most common opening progressions:", file=sys.stderr)
+        for pattern, count in patterns.most_common(5):
+            print(f"  {pattern}: {count}", file=sys.stderr)
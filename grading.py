@@ -0,0 +1,162 @@
+import json
+import sys
+from collections import namedtuple
+from functools import lru_cache
+from operator import eq
+
+from theory import THEORY
+
+# Pitch class of each natural note
+NOTE_PCS = {"c": 0, "d": 2, "e": 4, "f": 5, "g": 7, "a": 9, "b": 11}
+
+# Chord/key quality suffixes, all spellings learners tend to use
+MAJOR, MINOR, DIMINISHED, AUGMENTED = 0, 1, 2, 3
+QUALITIES = {
+    "": MAJOR, "maj": MAJOR, "major": MAJOR,
+    "m": MINOR, "min": MINOR, "minor": MINOR, "-": MINOR,
+    "dim": DIMINISHED, "diminished": DIMINISHED, "°": DIMINISHED, "o": DIMINISHED,
+    "aug": AUGMENTED, "augmented": AUGMENTED, "+": AUGMENTED,
+}
+
+# Roman numerals for scale degrees I-VII (quality marks after them are ignored)
+NUMERALS = ("i", "ii", "iii", "iv", "v", "vi", "vii")
+
+# Result of grading a batch: per-item 0/1 flags and {key: [asked, correct]} totals
+GradeResult = namedtuple("GradeResult", ["correct", "per_key", "total", "num_correct"])
+
+
+def _parse_root(text):
+    """Split a note name off the front of `text`, returning (pitch class, rest)"""
+    pc = NOTE_PCS[text[0]]
+    i = 1
+    # After the note letter, "#" and "b" are accidentals ("bb" is B flat)
+    while i < len(text) and text[i] in "#b":
+        pc += 1 if text[i] == "#" else -1
+        i += 1
+    return pc % 12, text[i:]
+
+
+@lru_cache(maxsize=8192)
+def canonical(answer):
+    """Normalise an answer so enharmonic and suffix variants compare equal
+
+    Keys and chords become pitch_class * 4 + quality ("F#", "Gb" and "F#/Gb" all
+    match; "am", "Am" and "A minor" match), and sharp/flat counts become 100 + n.
+    Anything else is compared as lower-cased text.
+    """
+    text = answer.strip().lower().replace("♯", "#").replace("♭", "b").replace(" ", "")
+    if text.isdigit():
+        return 100 + int(text)
+    try:
+        if "/" in text:
+            # Enharmonic pair such as "F#/Gb" or "f#/gbm": the quality is on the last spelling
+            first, last = text.split("/", 1)
+            pc, suffix = _parse_root(first)
+            _, quality = _parse_root(last)
+            if suffix:
+                return text
+        else:
+            pc, quality = _parse_root(text)
+        return pc * 4 + QUALITIES[quality]
+    except (KeyError, IndexError):
+        return text
+
+
+# Canonical codes for every answer the exercises can expect, computed once
+ANSWER_CODES = {
+    answer: canonical(answer)
+    for answer in (
+        *THEORY.keys, *THEORY.minor_keys, *THEORY.chord_keys, *THEORY.sharp_keys, *THEORY.flat_keys,
+        *(str(n) for n in range(8)),
+    )
+}
+
+
+def is_correct(user_answer, answer):
+    """Check a single answer using the same rules as batch grading"""
+    expected = ANSWER_CODES.get(answer)
+    if expected is None:
+        expected = canonical(answer)
+    return canonical(user_answer) == expected
+
+
+def parse_degree(answer):
+    """Scale degree (0-6) named by a roman numeral ("V", "vii°") or a number 1-7; None otherwise"""
+    text = answer.strip().lower().replace(" ", "").rstrip("°o+")
+    if text.endswith("dim"):
+        text = text[:-3]
+    if text.isdigit():
+        return int(text) - 1 if 1 <= int(text) <= 7 else None
+    return NUMERALS.index(text) if text in NUMERALS else None
+
+
+def grade_batch(expected, responses, keys=None):
+    """Grade whole sequences of expected answers and learner responses at once
+
+    Each distinct answer string is normalised only once (the canonical table and
+    cache absorb the repeats), so the per-item work is a code comparison.
+    `keys` optionally names the key each question is about for per-key totals.
+    """
+    codes = ANSWER_CODES
+    expected_codes = [codes[e] if e in codes else canonical(e) for e in expected]
+    response_codes = map(canonical, responses)
+    correct = bytearray(map(eq, expected_codes, response_codes))
+
+    per_key = {}
+    if keys is not None:
+        for key, ok in zip(keys, correct):
+            stats = per_key.get(key)
+            if stats is None:
+                stats = per_key[key] = [0, 0]
+            stats[0] += 1
+            stats[1] += ok
+    return GradeResult(correct, per_key, len(correct), sum(correct))
+
+
+def _grade_chunk(records, out, per_key):
+    result = grade_batch(
+        [r["answer"] for r in records],
+        [r.get("response", "") for r in records],
+        [r.get("metadata", {}).get("key") for r in records],
+    )
+    for record, ok in zip(records, result.correct):
+        out.write(json.dumps({"id": record.get("id"), "correct": bool(ok)}) + "\n")
+    for key, (asked, right) in result.per_key.items():
+        stats = per_key.setdefault(key, [0, 0])
+        stats[0] += asked
+        stats[1] += right
+    return result.total, result.num_correct
+
+
+def run_grade(args, chunk_size=100000):
+    """Entry point for `main.py grade`
+
+    Reads JSONL records as written by `main.py batch` with an added "response"
+    field, writes {"id", "correct"} lines and a per-key summary to stderr.
+    Records are graded in chunks so memory use does not grow with the input.
+    """
+    total = num_correct = 0
+    per_key = {}
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        with open(args.input) as f:
+            records = []
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+                if len(records) >= chunk_size:
+                    graded, right = _grade_chunk(records, out, per_key)
+                    total, num_correct, records = total + graded, num_correct + right, []
+            graded, right = _grade_chunk(records, out, per_key)
+            total, num_correct = total + graded, num_correct + right
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = {
+        "total": total,
+        "correct": num_correct,
+        "accuracy": num_correct / total * 100 if total else 0,
+        "per_key": {key: {"asked": asked, "correct": right} for key, (asked, right) in per_key.items()},
+    }
+    print(json.dumps(summary, indent=4), file=sys.stderr)
@@ -0,0 +1,117 @@
+from functools import lru_cache
+
+# Note letters and the pitch class of each natural note
+LETTERS = "CDEFGAB"
+NATURAL_PCS = (0, 2, 4, 5, 7, 9, 11)
+
+# Scale interval templates in semitones above the tonic
+MODES = {
+    "major": (0, 2, 4, 5, 7, 9, 11),
+    "natural minor": (0, 2, 3, 5, 7, 8, 10),
+    "harmonic minor": (0, 2, 3, 5, 7, 8, 11),
+    "melodic minor": (0, 2, 3, 5, 7, 9, 11),
+    "ionian": (0, 2, 4, 5, 7, 9, 11),
+    "dorian": (0, 2, 3, 5, 7, 9, 10),
+    "phrygian": (0, 1, 3, 5, 7, 8, 10),
+    "lydian": (0, 2, 4, 6, 7, 9, 11),
+    "mixolydian": (0, 2, 4, 5, 7, 9, 10),
+    "aeolian": (0, 2, 3, 5, 7, 8, 10),
+    "locrian": (0, 1, 3, 5, 6, 8, 10),
+}
+
+# Chord size names -> number of stacked thirds
+CHORD_SIZES = {"triad": 3, "seventh": 4, "ninth": 5}
+
+# Chord suffix by semitones above the root (third, fifth[, seventh])
+TRIAD_SUFFIXES = {(4, 7): "", (3, 7): "m", (3, 6): "dim", (4, 8): "aug"}
+SEVENTH_SUFFIXES = {
+    (4, 7, 11): "maj7", (4, 7, 10): "7", (3, 7, 10): "m7", (3, 7, 11): "mMaj7",
+    (3, 6, 10): "m7b5", (3, 6, 9): "dim7", (4, 8, 11): "augMaj7", (4, 8, 10): "aug7",
+}
+# Ninth above the root (mod 12) -> how it is written when it is not a plain 9
+NINTH_ALTERATIONS = {1: "b9", 2: "9", 3: "#9"}
+
+
+def parse_note(name):
+    """Split a note name such as "Eb" or "F##" into (letter index, pitch class)"""
+    letter = LETTERS.index(name[0].upper())
+    offset = sum(1 if c == "#" else -1 for c in name[1:])
+    return letter, (NATURAL_PCS[letter] + offset) % 12
+
+
+def spell(letter, pc):
+    """Name of pitch class `pc` written on `letter` (e.g. 4, 5 -> "E#")"""
+    offset = (pc - NATURAL_PCS[letter] + 6) % 12 - 6
+    return LETTERS[letter] + ("#" * offset if offset > 0 else "b" * -offset)
+
+
+def _spell_scale(tonic, intervals):
+    letter, pc = parse_note(tonic)
+    return tuple(spell((letter + i) % 7, (pc + step) % 12) for i, step in enumerate(intervals))
+
+
+def _accidentals(notes):
+    return sum(len(note) - 1 for note in notes)
+
+
+@lru_cache(maxsize=1024)
+def scale(tonic, mode="major"):
+    """Notes of the `mode` scale on `tonic`, one per letter name
+
+    An enharmonic tonic such as "F#/Gb" is spelled whichever way needs fewer
+    accidentals in this mode (sharps on a tie), so Db major but C# minor.
+    """
+    intervals = MODES[mode]
+    spellings = [_spell_scale(name, intervals) for name in tonic.split("/")]
+    return min(spellings, key=_accidentals)
+
+
+def chord_suffix(intervals):
+    """Chord suffix for the semitones of each chord tone above the root"""
+    if len(intervals) == 2:
+        return TRIAD_SUFFIXES.get(intervals, "?")
+    seventh = SEVENTH_SUFFIXES.get(intervals[:3], "?")
+    if len(intervals) == 3:
+        return seventh
+    ninth = NINTH_ALTERATIONS.get(intervals[3] % 12, "?")
+    if ninth == "9" and seventh in ("maj7", "7", "m7", "mMaj7"):
+        return seventh[:-1] + "9"  # Cmaj9, G9, Dm9
+    return f"{seventh}({ninth})"
+
+
+@lru_cache(maxsize=1024)
+def chord_notes(tonic, mode="major", degree=0, size=3):
+    """Notes of the diatonic chord built in thirds on scale `degree` (0-based)"""
+    notes = scale(tonic, mode)
+    return tuple(notes[(degree + 2 * i) % 7] for i in range(size))
+
+
+@lru_cache(maxsize=1024)
+def diatonic_chords(tonic, mode="major", size=3):
+    """Chord names on every degree of the scale, e.g. ("C", "Dm", ..., "Bdim")
+
+    `size` is 3 for triads, 4 for sevenths and 5 for ninths (or a CHORD_SIZES name).
+    """
+    size = CHORD_SIZES.get(size, size)
+    chords = []
+    for degree in range(7):
+        notes = chord_notes(tonic, mode, degree, size)
+        root = parse_note(notes[0])[1]
+        # Stacked thirds span more than an octave from the ninth on
+        intervals = tuple((parse_note(note)[1] - root) % 12 + (12 if i >= 3 else 0)
+                          for i, note in enumerate(notes[1:]))
+        chords.append(notes[0] + chord_suffix(intervals))
+    return tuple(chords)
+
+
+@lru_cache(maxsize=64)
+def roman_numerals(mode="major"):
+    """Degree labels for the triads of `mode`: case for major/minor, ° and + for dim/aug"""
+    labels = []
+    for degree, step in enumerate(MODES[mode]):
+        third, fifth = ((MODES[mode][(degree + i) % 7] - step) % 12 for i in (2, 4))
+        numeral = ("I", "II", "III", "IV", "V", "VI", "VII")[degree]
+        if third == 3:
+            numeral = numeral.lower()
+        labels.append(numeral + {6: "°", 8: "+"}.get(fifth, ""))
+    return tuple(labels)
@@ -0,0 +1,176 @@
+import json
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+# History dates are naive local times; they are stored as microseconds from this point
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+MAGIC = b"COFH"
+VERSION = 2  # Version 1 images have no extra fields
+
+# Entry fields with a column of their own; any others are kept as compact JSON
+FIELDS = ("date", "type", "score", "difficulty", "key")
+
+
+def to_micros(date):
+    """Integer timestamp for a history date (a datetime or its string form)"""
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    return (date - EPOCH) // MICROSECOND
+
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class HistoryColumns:
+    """Compact, column-oriented exercise history
+
+    Instead of one dict per exercise, each field is a typed array: integer
+    timestamps, float scores, and small integer codes for the exercise type,
+    difficulty and key. Type and key names are interned in lookup lists.
+    Any other fields of an entry (such as its sync ID) are kept as JSON text.
+    Entries are rebuilt as dicts on access, so code written for a list of
+    history dicts (len, iteration, [-5:], ...) works unchanged.
+    """
+
+    def __init__(self):
+        self.times = array("q")
+        self.scores = array("d")
+        self.types = array("B")
+        self.difficulties = array("b")  # -1 when the exercise has no difficulty
+        self.keys = array("b")  # -1 when the exercise is not tied to a key
+        self.extra_ends = array("I")  # End of each entry's extra fields in extra_data
+        self.extra_data = bytearray()
+        self.type_names = []
+        self.key_names = []
+        self._type_codes = {}
+        self._key_codes = {}
+
+    @classmethod
+    def from_entries(cls, entries):
+        columns = cls()
+        columns.extend(entries)
+        return columns
+
+    def _intern(self, value, names, codes):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(names)
+            names.append(value)
+        return code
+
+    def append(self, entry):
+        self.times.append(to_micros(entry["date"]))
+        self.scores.append(entry["score"])
+        self.types.append(self._intern(entry["type"], self.type_names, self._type_codes))
+        difficulty = entry.get("difficulty")
+        self.difficulties.append(-1 if difficulty is None else difficulty)
+        key = entry.get("key")
+        self.keys.append(-1 if key is None else self._intern(key, self.key_names, self._key_codes))
+        extra = {name: value for name, value in entry.items() if name not in FIELDS}
+        if extra:
+            self.extra_data += json.dumps(extra, separators=(",", ":"), default=str).encode("utf-8")
+        self.extra_ends.append(len(self.extra_data))
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def entry(self, i):
+        """Rebuild the history dict for row `i`"""
+        entry = {
+            "date": from_micros(self.times[i]),
+            "type": self.type_names[self.types[i]],
+            "score": self.scores[i],
+        }
+        if self.difficulties[i] >= 0:
+            entry["difficulty"] = self.difficulties[i]
+        if self.keys[i] >= 0:
+            entry["key"] = self.key_names[self.keys[i]]
+        start = self.extra_ends[i - 1] if i else 0
+        if self.extra_ends[i] > start:
+            entry.update(json.loads(self.extra_data[start:self.extra_ends[i]]))
+        return entry
+
+    def __len__(self):
+        return len(self.times)
+
+    def __bool__(self):
+        return len(self.times) > 0
+
+    def __iter__(self):
+        for i in range(len(self.times)):
+            yield self.entry(i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.entry(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("history index out of range")
+        return self.entry(index)
+
+    def recent(self, count):
+        """Return the last `count` entries, oldest first"""
+        return self[-count:] if count else []
+
+    def between(self, start=None, end=None, exercise_type=None):
+        """Yield entries dated within [start, end], optionally of a single exercise type"""
+        low = None if start is None else to_micros(start)
+        high = None if end is None else to_micros(end)
+        type_code = self._type_codes.get(exercise_type, -1) if exercise_type is not None else None
+        for i, ts in enumerate(self.times):
+            if (low is None or ts >= low) and (high is None or ts <= high) and \
+                    (type_code is None or self.types[i] == type_code):
+                yield self.entry(i)
+
+    def to_bytes(self):
+        """Serialise to a compact binary form (a small JSON header followed by the raw arrays)"""
+        header = json.dumps({
+            "length": len(self),
+            "types": self.type_names,
+            "keys": self.key_names,
+            "byteorder": sys.byteorder,
+        }).encode("utf-8")
+        parts = [MAGIC, struct.pack("<HI", VERSION, len(header)), header]
+        for column in (self.times, self.scores, self.types, self.difficulties, self.keys, self.extra_ends):
+            parts.append(column.tobytes())
+        parts.append(self.extra_data)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != MAGIC:
+            raise ValueError("Not a history file")
+        version, header_size = struct.unpack_from("<HI", data, 4)
+        if version not in (1, VERSION):
+            raise ValueError(f"Unsupported history format version {version}")
+        offset = 4 + struct.calcsize("<HI")
+        header = json.loads(data[offset:offset + header_size])
+        offset += header_size
+
+        columns = cls()
+        columns.type_names = header["types"]
+        columns.key_names = header["keys"]
+        columns._type_codes = {name: i for i, name in enumerate(columns.type_names)}
+        columns._key_codes = {name: i for i, name in enumerate(columns.key_names)}
+        length = header["length"]
+        fixed = [columns.times, columns.scores, columns.types, columns.difficulties, columns.keys]
+        if version > 1:
+            fixed.append(columns.extra_ends)
+        for column in fixed:
+            size = column.itemsize * length
+            column.frombytes(data[offset:offset + size])
+            if header["byteorder"] != sys.byteorder:
+                column.byteswap()
+            offset += size
+        if version > 1:
+            columns.extra_data = bytearray(data[offset:])
+        else:
+            columns.extra_ends = array("I", bytes(columns.extra_ends.itemsize * length))
+        return columns
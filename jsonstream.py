@@ -0,0 +1,164 @@
+import json
+import re
+from array import array
+
+NON_WHITESPACE = re.compile(r"[^ \t\r\n]")
+# What follows an array element: a comma or the closing bracket, with any whitespace
+ELEMENT_END = re.compile(r"[ \t\r\n]*([,\]])[ \t\r\n]*")
+
+
+class JSONStreamReader:
+    """Incremental reader for JSON text, parsing one value at a time from a buffered file
+
+    Only the unparsed remainder of the current chunk is kept, so a huge array
+    can be walked element by element without holding the document in memory.
+    A binary file is read one character per byte, so positions are file
+    offsets; its values are decoded from UTF-8 once their extent is known.
+    """
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.base = f.tell()  # File offset of buf[0] (binary files only)
+        self.binary = False
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        if isinstance(data, bytes):
+            data = data.decode("latin-1")
+            self.binary = True
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (without consuming it)"""
+        while True:
+            match = NON_WHITESPACE.search(self.buf, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON data")
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of `chars`, and return it"""
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} but found {char!r}")
+        self.pos += 1
+        return char
+
+    def tell(self):
+        """File offset of the next unread character (binary files only)"""
+        return self.base + self.pos
+
+    def _decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number or literal ending exactly at the buffer end may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    return value, end
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def value(self):
+        """Parse the next complete JSON value"""
+        value, end = self._decode()
+        if self.binary:
+            text = self.buf[self.pos:end]
+            if not text.isascii():
+                value = json.loads(text.encode("latin-1"))
+        self.pos = end
+        return value
+
+    def skip(self):
+        """Step over the next JSON value without keeping it"""
+        self.pos = self._decode()[1]
+
+    def index_array(self, offsets):
+        """Append the file offset of each element of the array just opened, reading through its "]"
+
+        Elements inside the current buffer are stepped over in a tight loop;
+        one that may run into the next chunk goes through skip().
+        """
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        scan = self.decoder.scan_once
+        element_end = ELEMENT_END.match
+        append = offsets.append
+        while True:
+            buf, pos, base = self.buf, self.pos, self.base
+            size = len(buf)
+            while True:
+                try:
+                    match = element_end(buf, scan(buf, pos)[1])
+                except (StopIteration, json.JSONDecodeError):
+                    break
+                if match is None:
+                    break
+                end = match.end()
+                if end >= size:
+                    break
+                append(base + pos)
+                pos = end
+                if match.group(1) == "]":
+                    self.pos = end
+                    return
+            self.pos = pos
+            # The element or what follows it may continue in the next chunk
+            offsets.append(self.tell())
+            self.skip()
+            if self.expect(",]") == "]":
+                return
+            self.peek()
+
+
+def index_object(f, array_key):
+    """Parse a top-level JSON object from a binary file, indexing the elements of `array_key`
+
+    Returns the object's other members and the file offset of every element
+    of the array (None when there is no such array). The elements are parsed
+    only to find where they end, so memory use does not depend on their size.
+    """
+    reader = JSONStreamReader(f)
+    members = {}
+    offsets = None
+    reader.expect("{")
+    if reader.peek() == "}":
+        return members, offsets
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == array_key and reader.peek() == "[":
+            offsets = array("q")
+            reader.expect("[")
+            reader.index_array(offsets)
+        else:
+            members[key] = reader.value()
+        if reader.expect(",}") == "}":
+            return members, offsets
+
+
+def read_values(f, offset, count):
+    """Yield `count` consecutive elements of an array from a binary file, the first at `offset`"""
+    f.seek(offset)
+    reader = JSONStreamReader(f, 4096 if count == 1 else 1 << 16)
+    for i in range(count):
+        if i:
+            reader.expect(",")
+        yield reader.value()
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import random
+import time
+
+# Answers the simulated students pick from (some right, most wrong)
+ANSWERS = ("C", "G", "D", "am", "em", "F#m", "Bdim", "0", "1", "2", "3")
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def read_prompt(reader):
+    """Read server output up to the next prompt line and return the prompt text"""
+    while True:
+        line = await reader.readline()
+        if not line:
+            return None
+        line = line.decode("utf-8").rstrip("\n")
+        if line.startswith("? "):
+            return line[2:]
+
+
+async def run_student(host, port, name, exercises, rng, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def answer(text):
+        start = time.perf_counter()
+        writer.write((text + "\n").encode("utf-8"))
+        await writer.drain()
+        prompt = await read_prompt(reader)
+        latencies.append(time.perf_counter() - start)
+        return prompt
+
+    try:
+        await read_prompt(reader)
+        prompt = await answer(name)
+        for _ in range(exercises):
+            prompt = await answer(rng.choice("2345"))
+            while prompt is not None and not prompt.startswith("Select an option"):
+                prompt = await answer(rng.choice(ANSWERS))
+        writer.write(b"8\n")
+        await writer.drain()
+        await reader.read()
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, clients, exercises, seed):
+    latencies = []
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_student(host, port, f"load-{i}", exercises, random.Random(rng.random()), latencies)
+        for i in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "exercises_per_client": exercises,
+        "elapsed_s": elapsed,
+        "sessions_per_s": clients / elapsed,
+        "responses": len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_loadgen(args):
+    """Entry point for `main.py loadgen`"""
+    results = asyncio.run(run_load(args.host, args.port, args.clients, args.exercises, args.seed))
+    print(json.dumps(results, indent=4))
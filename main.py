@@ -1,100 +1,180 @@
+import argparse
 import random
+import signal
+import sys
 import time
-import json
-import os
 from datetime import datetime
-import matplotlib.pyplot as plt
-from collections import defaultdict
+from charts import ChartRenderer, ProgressSeries, render_progress_chart
+from grading import is_correct, parse_degree, run_grade
+from harmony import chord_notes
+from metrics import Metrics
+from storage import AppendOnlyStore, SQLiteProfileStore, WriteBehindStore
+from theory import THEORY
+from questions import (ALL_ITEMS, EXERCISES, generate_progression, item_for_key, key_identification_questions,
+                       key_signature_questions, progression_level, relative_key_questions, run_batch)
+from sampling import key_sampler, proficiency_weight
+from scheduler import Scheduler
+from stats import ASKED, AnswerStats
+from sync import SyncState
 
 class CircleOfFifths:
-    def __init__(self):
-        # Define the Circle of Fifths keys
-        self.keys = ["C", "G", "D", "A", "E", "B", "F#/Gb", "C#/Db", "Ab", "Eb", "Bb", "F"]
-        
-        # Define the major and minor chords for each key
-        self.major_chords = {
-            "C": ["C", "Dm", "Em", "F", "G", "Am", "Bdim"],
-            "G": ["G", "Am", "Bm", "C", "D", "Em", "F#dim"],
-            "D": ["D", "Em", "F#m", "G", "A", "Bm", "C#dim"],
-            "A": ["A", "Bm", "C#m", "D", "E", "F#m", "G#dim"],
-            "E": ["E", "F#m", "G#m", "A", "B", "C#m", "D#dim"],
-            "B": ["B", "C#m", "D#m", "E", "F#", "G#m", "A#dim"],
-            "F#/Gb": ["F#", "G#m", "A#m", "B", "C#", "D#m", "E#dim"],
-            "C#/Db": ["Db", "Ebm", "Fm", "Gb", "Ab", "Bbm", "Cdim"],
-            "Ab": ["Ab", "Bbm", "Cm", "Db", "Eb", "Fm", "Gdim"],
-            "Eb": ["Eb", "Fm", "Gm", "Ab", "Bb", "Cm", "Ddim"],
-            "Bb": ["Bb", "Cm", "Dm", "Eb", "F", "Gm", "Adim"],
-            "F": ["F", "Gm", "Am", "Bb", "C", "Dm", "Edim"]
-        }
+    # Music theory tables are shared by every instance (see theory.TheoryIndex)
+    keys = THEORY.keys
+    major_chords = THEORY.major_chords
+    chord_degrees = THEORY.chord_degrees
+    adjacent_keys = THEORY.adjacent_keys
+    
+    # Adaptive difficulty rules (simulate.py replays learners against alternatives)
+    proficiency_step = 0.2  # Proficiency gained per correct answer
+    progression_step = 0.3  # Proficiency gained per correct chord in a progression
+    progression_thresholds = (3, 7)  # Skill levels where progressions turn medium, then hard
+    max_difficulty = 3  # Hardest key identification level
+    
+    def __init__(self, store=None, output=print, metrics=None, rng=None):
+        # Where messages for the learner go (the terminal unless running in the quiz server)
+        self.output = output
         
-        # Define the chord degrees
-        self.chord_degrees = ["I", "ii", "iii", "IV", "V", "vi", "vii°"]
-        
-        # Adjacent keys in the Circle of Fifths (for exercises)
-        self.adjacent_keys = {
-            "C": ["F", "G"],
-            "G": ["C", "D"],
-            "D": ["G", "A"],
-            "A": ["D", "E"],
-            "E": ["A", "B"],
-            "B": ["E", "F#/Gb"],
-            "F#/Gb": ["B", "C#/Db"],
-            "C#/Db": ["F#/Gb", "Ab"],
-            "Ab": ["C#/Db", "Eb"],
-            "Eb": ["Ab", "Bb"],
-            "Bb": ["Eb", "F"],
-            "F": ["Bb", "C"]
-        }
+        # Optional latency instrumentation (see metrics.Metrics); off unless requested
+        if metrics is not None:
+            metrics.instrument(self)
+        
+        # Random source for question generation (and review order ties)
+        self.rng = rng or random.Random()
+        
+        # Progress charts are drawn in the background from a cached, pre-parsed score series
+        self.chart_renderer = ChartRenderer()
+        self.progress = None
+        
+        # Where the profile lives (defaults to a JSON snapshot plus append-only history log)
+        self.store = store or AppendOnlyStore()
         
         # Initialize user profile with default settings
         self.user_data = {
-            "username": "user",
+            "username": getattr(self.store, "username", "user"),
             "exercises_completed": 0,
             "correct_answers": 0,
             "skill_level": 1,  # 1-10 scale
             "key_proficiency": {key: 1 for key in self.keys},
-            "exercise_history": [],
+            "exercise_history": self.store.new_history(),
+            "schedule": {},  # Spaced-repetition state per practice item
+            "stats": {},  # Answer counters by exercise type, key and difficulty
             "last_session": None
         }
         
         # Try to load existing user data
         self.load_user_data()
+        
+        # Keys are weighted towards low proficiency, and questions are drawn from
+        # the items due for review (falling back to weighted keys when none are due)
+        self.key_sampler = key_sampler(self.user_data["key_proficiency"])
+        self.scheduler = Scheduler(self.user_data.setdefault("schedule", {}), ALL_ITEMS, self.rng,
+                                   fallback=self.pick_item)
+        
+        # Answer counts and the proficiency total are kept current as answers come in,
+        # so progress views and the skill level never rescan the history
+        self.stats = AnswerStats.seeded(self.user_data.setdefault("stats", {}),
+                                        self.user_data["exercises_completed"], self.user_data["correct_answers"])
+        self.proficiency_total = sum(self.user_data["key_proficiency"].values())
+        
+        # New history entries get a sync ID and carry their answers and proficiency
+        # gains, so profiles from several machines can be merged (see sync.py)
+        self.sync = SyncState.attach(self.user_data)
+        self.exercise_answers = []
+        self.exercise_gains = {}
+    
+    def say(self, text=""):
+        """Show a line of output to the learner"""
+        self.output(text)
+    
+    def run_steps(self, steps):
+        """Drive an exercise generator from the terminal, answering each prompt with input()"""
+        try:
+            prompt = next(steps)
+            while True:
+                prompt = steps.send(input(prompt))
+        except StopIteration:
+            pass
+    
+    def next_question(self, questions):
+        """Draw the next question from a question generator"""
+        return next(questions)
+    
+    def check_answer(self, response, answer):
+        """Whether the learner's response matches the expected answer"""
+        return is_correct(response, answer)
     
     def save_user_data(self):
-        """Save user data to JSON file"""
-        with open("circle_of_fifths_user_data.json", "w") as f:
-            json.dump(self.user_data, f, indent=4, default=str)
-        print("Progress saved.")
+        """Save user data, appending only new history entries to the log"""
+        self.store.save(self.user_data)
+        self.say("Progress saved.")
     
     def load_user_data(self):
-        """Load user data from JSON file if it exists"""
+        """Load the profile snapshot if it exists (history is read lazily)"""
         try:
-            if os.path.exists("circle_of_fifths_user_data.json"):
-                with open("circle_of_fifths_user_data.json", "r") as f:
-                    self.user_data = json.load(f)
-                print(f"Welcome back, {self.user_data['username']}!")
+            if self.store.exists():
+                self.user_data = self.store.load()
+                self.progress = None
+                self.say(f"Welcome back, {self.user_data['username']}!")
         except Exception as e:
-            print(f"Could not load previous data: {e}")
-            print("Starting with a new profile.")
+            self.say(f"Could not load previous data: {e}")
+            # Keep the damaged files rather than overwriting them with the new profile
+            moved = self.store.set_aside()
+            if moved:
+                self.say(f"The old profile was kept as {moved}.")
+            self.say("Starting with a new profile.")
+    
+    def record_answer(self, correct, exercise, key, difficulty=None):
+        """Count an answered question and note it for the exercise's history entry"""
+        self.stats.record(correct, exercise, key, difficulty)
+        self.exercise_answers.append([key, int(correct)] if difficulty is None else [key, int(correct), difficulty])
+    
+    def record_exercise(self, entry):
+        """Add a finished exercise to the history and the cached progress series"""
+        entry["answers"], self.exercise_answers = self.exercise_answers, []
+        entry["gains"], self.exercise_gains = self.exercise_gains, {}
+        self.sync.tag(entry)
+        self.user_data["exercise_history"].append(entry)
+        if self.progress is not None:
+            self.progress.add(entry)
+    
+    def raise_proficiency(self, key, amount):
+        """Increase proficiency for a key (capped at 10) and update its selection weight"""
+        if key in self.user_data["key_proficiency"]:
+            previous = self.user_data["key_proficiency"][key]
+            proficiency = min(10, previous + amount)
+            self.user_data["key_proficiency"][key] = proficiency
+            self.proficiency_total += proficiency - previous
+            self.exercise_gains[key] = self.exercise_gains.get(key, 0) + amount
+            self.key_sampler.update(key, proficiency_weight(proficiency))
+    
+    def pick_key(self, rng):
+        """Choose a key to practise, favouring keys with low proficiency"""
+        return self.key_sampler.sample(rng)
+    
+    def pick_item(self, rng, family):
+        """Practice item for a key chosen by proficiency (used when nothing is due for review)"""
+        return item_for_key(rng, family, self.pick_key(rng))
     
     def update_skill_level(self):
         """Update overall skill level based on key proficiencies"""
-        self.user_data["skill_level"] = sum(self.user_data["key_proficiency"].values()) / len(self.keys)
+        self.user_data["skill_level"] = self.proficiency_total / len(self.keys)
     
     def display_main_menu(self):
         """Display the main menu and handle user selection"""
         while True:
-            print("\n==== CIRCLE OF FIFTHS - INTERACTIVE LEARNING ====")
-            print("1. Learn about the Circle of Fifths")
-            print("2. Practice Key Identification")
-            print("3. Chord Progression Exercise")
-            print("4. Relative Major/Minor Relationships")
-            print("5. Key Signature Quiz")
-            print("6. View Your Progress")
-            print("7. Change Username")
-            print("8. Exit")
+            self.report_chart()
+            self.say("\n==== CIRCLE OF FIFTHS - INTERACTIVE LEARNING ====")
+            self.say("1. Learn about the Circle of Fifths")
+            self.say("2. Practice Key Identification")
+            self.say("3. Chord Progression Exercise")
+            self.say("4. Relative Major/Minor Relationships")
+            self.say("5. Key Signature Quiz")
+            self.say("6. View Your Progress")
+            self.say("7. Change Username")
+            self.say("8. Ear Training")
+            self.say("9. Exit")
             
-            choice = input("\nSelect an option (1-8): ")
+            choice = input("\nSelect an option (1-9): ")
             
             if choice == "1":
                 self.show_tutorial()
@@ -111,138 +191,95 @@ class CircleOfFifths:
             elif choice == "7":
                 self.change_username()
             elif choice == "8":
+                self.ear_training_exercise()
+            elif choice == "9":
                 self.update_skill_level()
                 self.user_data["last_session"] = datetime.now()
                 self.save_user_data()
-                print("Thanks for learning with Circle of Fifths! Goodbye!")
+                self.store.close()
+                self.chart_renderer.close()
+                self.say("Thanks for learning with Circle of Fifths! Goodbye!")
                 break
             else:
-                print("Invalid option. Please try again.")
+                self.say("Invalid option. Please try again.")
     
     def show_tutorial(self):
         """Display tutorial information about the Circle of Fifths"""
-        print("\n==== CIRCLE OF FIFTHS TUTORIAL ====")
-        print("\nWhat is the Circle of Fifths?")
-        print("The Circle of Fifths is a fundamental concept in music theory that shows the relationship")
-        print("between the 12 tones of the chromatic scale, their corresponding key signatures, and the")
-        print("associated major and minor keys.")
-        
-        print("\nThe Circle is arranged as follows:")
-        print("  - Starting with C at the top (no sharps/flats)")
-        print("  - Moving clockwise, each key adds one sharp (C → G → D → A → E → B → F# → C#)")
-        print("  - Moving counterclockwise from C, each key adds one flat (C → F → Bb → Eb → Ab → Db → Gb)")
-        
-        print("\nKey Applications of the Circle of Fifths:")
-        print("1. Finding key signatures: The position on the circle tells you the number of sharps/flats")
-        print("2. Identifying closely related keys: Adjacent keys on the circle are closely related")
-        print("3. Chord progressions: Common progressions often follow the circle (e.g., ii-V-I)")
-        print("4. Modulation: The circle helps musicians understand and navigate key changes")
-        
-        print("\nChord Structure in Each Key:")
-        print("For any major key, the pattern of chords follows:")
-        print("I (major) - ii (minor) - iii (minor) - IV (major) - V (major) - vi (minor) - vii° (diminished)")
-        
-        print("\nExamples in C major:")
-        print("C (I) - Dm (ii) - Em (iii) - F (IV) - G (V) - Am (vi) - Bdim (vii°)")
+        self.say("\n==== CIRCLE OF FIFTHS TUTORIAL ====")
+        self.say("\nWhat is the Circle of Fifths?")
+        self.say("The Circle of Fifths is a fundamental concept in music theory that shows the relationship")
+        self.say("between the 12 tones of the chromatic scale, their corresponding key signatures, and the")
+        self.say("associated major and minor keys.")
+        
+        self.say("\nThe Circle is arranged as follows:")
+        self.say("  - Starting with C at the top (no sharps/flats)")
+        self.say("  - Moving clockwise, each key adds one sharp (C → G → D → A → E → B → F# → C#)")
+        self.say("  - Moving counterclockwise from C, each key adds one flat (C → F → Bb → Eb → Ab → Db → Gb)")
+        
+        self.say("\nKey Applications of the Circle of Fifths:")
+        self.say("1. Finding key signatures: The position on the circle tells you the number of sharps/flats")
+        self.say("2. Identifying closely related keys: Adjacent keys on the circle are closely related")
+        self.say("3. Chord progressions: Common progressions often follow the circle (e.g., ii-V-I)")
+        self.say("4. Modulation: The circle helps musicians understand and navigate key changes")
+        
+        self.say("\nChord Structure in Each Key:")
+        self.say("For any major key, the pattern of chords follows:")
+        self.say("I (major) - ii (minor) - iii (minor) - IV (major) - V (major) - vi (minor) - vii° (diminished)")
+        
+        self.say("\nExamples in C major:")
+        self.say("C (I) - Dm (ii) - Em (iii) - F (IV) - G (V) - Am (vi) - Bdim (vii°)")
         
         input("\nPress Enter to return to the main menu...")
     
     def key_identification_exercise(self):
         """Run an exercise to identify keys on the Circle of Fifths"""
-        print("\n==== KEY IDENTIFICATION EXERCISE ====")
-        print("Identify the correct key based on the clue.")
+        self.run_steps(self.key_identification_steps())
+    
+    def key_identification_steps(self):
+        """Key identification exercise as a generator that yields prompts and receives the answers"""
+        self.say("\n==== KEY IDENTIFICATION EXERCISE ====")
+        self.say("Identify the correct key based on the clue.")
         
         correct = 0
         total = 5  # Number of questions per exercise
         
         # Adjust difficulty based on skill level
-        difficulty = min(int(self.user_data["skill_level"]), 3)
+        difficulty = min(int(self.user_data["skill_level"]), self.max_difficulty)
+        questions = key_identification_questions(self.rng, difficulty, self.scheduler.pick, self.pick_key)
         
         for i in range(total):
-            # Select question type based on difficulty
-            question_type = random.randint(1, difficulty + 1)
-            
-            if question_type == 1:
-                # Basic: Find key with X sharps/flats
-                sharp_flat = random.choice(["sharp", "flat"])
-                if sharp_flat == "sharp":
-                    count = random.randint(0, 7)
-                    answer = ["C", "G", "D", "A", "E", "B", "F#/Gb", "C#/Db"][count]
-                    print(f"\nQuestion {i+1}: Which major key has {count} sharps?")
-                else:
-                    count = random.randint(0, 7)
-                    answer = ["C", "F", "Bb", "Eb", "Ab", "C#/Db", "F#/Gb", "B"][count]
-                    print(f"\nQuestion {i+1}: Which major key has {count} flats?")
-            
-            elif question_type == 2:
-                # Medium: Find position on circle
-                position = random.choice(["clockwise", "counterclockwise"])
-                steps = random.randint(1, 5)
-                start_key = random.choice(self.keys)
-                
-                if position == "clockwise":
-                    start_idx = self.keys.index(start_key)
-                    end_idx = (start_idx + steps) % 12
-                    answer = self.keys[end_idx]
-                    print(f"\nQuestion {i+1}: Starting from {start_key}, what key is {steps} steps clockwise on the Circle of Fifths?")
-                else:
-                    start_idx = self.keys.index(start_key)
-                    end_idx = (start_idx - steps) % 12
-                    answer = self.keys[end_idx]
-                    print(f"\nQuestion {i+1}: Starting from {start_key}, what key is {steps} steps counterclockwise on the Circle of Fifths?")
-            
-            elif question_type == 3:
-                # Advanced: Relative minor/major or specific chord in key
-                subtype = random.choice(["relative", "chord"])
-                
-                if subtype == "relative":
-                    # Find relative minor/major
-                    is_to_minor = random.choice([True, False])
-                    if is_to_minor:
-                        major_key = random.choice(self.keys)
-                        major_idx = self.keys.index(major_key)
-                        minor_idx = (major_idx + 9) % 12
-                        answer = self.keys[minor_idx].lower() + "m"
-                        print(f"\nQuestion {i+1}: What is the relative minor of {major_key} major?")
-                    else:
-                        minor_idx = random.randint(0, 11)
-                        minor_key = self.keys[minor_idx].lower() + "m"
-                        major_idx = (minor_idx + 3) % 12
-                        answer = self.keys[major_idx]
-                        print(f"\nQuestion {i+1}: What is the relative major of {minor_key}?")
-                else:
-                    # Find specific chord in key
-                    key = random.choice(self.keys)
-                    degree_idx = random.randint(0, 6)
-                    chord_degree = self.chord_degrees[degree_idx]
-                    answer = self.major_chords[key][degree_idx]
-                    print(f"\nQuestion {i+1}: In the key of {key} major, what is the {chord_degree} chord?")
+            prompt, answer, metadata = self.next_question(questions)
+            self.say(f"\nQuestion {i+1}: {prompt}")
             
             # Get user answer
-            user_answer = input("Your answer: ").strip()
+            user_answer = (yield "Your answer: ").strip()
             
             # Check answer
-            if user_answer.upper() == answer.upper() or user_answer.lower() == answer.lower():
-                print("Correct!")
+            answered = self.check_answer(user_answer, answer)
+            self.record_answer(answered, "Key Identification", metadata["key"], difficulty)
+            if "item" in metadata:
+                self.scheduler.review(metadata["item"], answered)
+            if answered:
+                self.say("Correct!")
                 correct += 1
                 # Increase proficiency for this key
                 related_key = answer.split('/')[0].replace('m', '')
-                if related_key in self.user_data["key_proficiency"]:
-                    self.user_data["key_proficiency"][related_key] = min(
-                        10, self.user_data["key_proficiency"][related_key] + 0.2
-                    )
+                self.raise_proficiency(related_key, self.proficiency_step)
             else:
-                print(f"Incorrect. The correct answer is {answer}.")
+                self.say(f"Incorrect. The correct answer is {answer}.")
+            
+            # Proficiency and review state changed; let a write-behind store persist them
+            self.store.mark_dirty(self.user_data)
         
         # Record results
         score = (correct / total) * 100
-        print(f"\nYou scored {score:.1f}% ({correct}/{total})")
+        self.say(f"\nYou scored {score:.1f}% ({correct}/{total})")
         
         self.user_data["exercises_completed"] += 1
         self.user_data["correct_answers"] += correct
         
         # Record exercise history
-        self.user_data["exercise_history"].append({
+        self.record_exercise({
             "date": datetime.now(),
             "type": "Key Identification",
             "score": score,
@@ -252,97 +289,73 @@ class CircleOfFifths:
         self.update_skill_level()
         self.save_user_data()
         
-        input("\nPress Enter to return to the main menu...")
+        yield "\nPress Enter to return to the main menu..."
     
     def chord_progression_exercise(self):
         """Exercise to identify chords in a progression"""
-        print("\n==== CHORD PROGRESSION EXERCISE ====")
-        print("Identify the chords in the given progression.")
-        
-        # Choose keys based on user proficiency
-        weighted_keys = []
-        for key, prof in self.user_data["key_proficiency"].items():
-            # Keys with lower proficiency appear more frequently
-            weight = max(1, (11 - prof))
-            weighted_keys.extend([key] * int(weight))
-        
-        selected_key = random.choice(weighted_keys)
-        
-        print(f"\nKey: {selected_key} major")
-        
-        # Generate a progression
-        progression_length = random.randint(3, 5)
-        progression = []
-        
-        # Common progression patterns based on difficulty
-        easy_patterns = [
-            [0, 3, 4], # I-IV-V
-            [0, 4, 3], # I-V-IV
-            [0, 5, 3, 4], # I-vi-IV-V
-        ]
-        
-        medium_patterns = [
-            [0, 5, 3, 4, 0], # I-vi-IV-V-I
-            [0, 1, 4, 0],    # I-ii-V-I
-            [5, 1, 4, 0],    # vi-ii-V-I
-        ]
-        
-        hard_patterns = [
-            [0, 1, 4, 5, 3, 4, 0], # I-ii-V-vi-IV-V-I
-            [0, 5, 1, 4, 0],      # I-vi-ii-V-I
-            [0, 2, 5, 3, 4, 0],   # I-iii-vi-IV-V-I
-        ]
-        
-        # Select pattern based on skill level
-        if self.user_data["skill_level"] < 3:
-            pattern = random.choice(easy_patterns)
-        elif self.user_data["skill_level"] < 7:
-            pattern = random.choice(medium_patterns)
-        else:
-            pattern = random.choice(hard_patterns)
+        self.run_steps(self.chord_progression_steps())
+    
+    def chord_progression_steps(self):
+        """Chord progression exercise as a generator that yields prompts and receives the answers"""
+        self.say("\n==== CHORD PROGRESSION EXERCISE ====")
+        self.say("Identify the chords in the given progression.")
         
-        # Generate the progression
-        for degree_idx in pattern:
-            degree = self.chord_degrees[degree_idx]
-            chord = self.major_chords[selected_key][degree_idx]
-            progression.append((degree, chord))
+        # Practice the chord most due for review, in its key
+        _, selected_key, picked = self.scheduler.pick(self.rng, "chord").split(":")
+        picked = int(picked)
         
-        # Display the progression with some blanks
-        num_blanks = min(len(progression) - 1, max(1, int(progression_length / 2)))
-        blank_positions = random.sample(range(len(progression)), num_blanks)
+        self.say(f"\nKey: {selected_key} major")
         
+        # Generate a progression with a pattern suited to the skill level
+        level = progression_level(self.user_data["skill_level"], self.progression_thresholds)
+        progression = generate_progression(self.rng, level, selected_key)
+        
+        # The picked chord is always asked, so its review item moves on: blank it
+        # where the pattern has it (trading one of the other blanks for it)
+        blanks = set(progression.blanks)
+        if picked in progression.pattern and picked not in (progression.pattern[i] for i in blanks):
+            blanks.discard(self.rng.choice(sorted(blanks)))
+            blanks.add(progression.pattern.index(picked))
+        
+        # Display the progression with some blanks
         questions = []
-        for i, (degree, chord) in enumerate(progression):
-            if i in blank_positions:
-                print(f"Position {i+1}: {degree} - ?")
-                questions.append((i, degree, chord))
+        for i, (degree, chord) in enumerate(progression.chords):
+            if i in blanks:
+                self.say(f"Position {i+1}: {degree} - ?")
+                questions.append((progression.pattern[i], degree, chord))
             else:
-                print(f"Position {i+1}: {degree} - {chord}")
+                self.say(f"Position {i+1}: {degree} - {chord}")
+        if picked not in progression.pattern:
+            # Not in any pattern (such as vii°): ask for it after the progression
+            questions.append((picked, self.chord_degrees[picked], THEORY.chord[selected_key, picked]))
         
         # Ask the questions
         correct = 0
-        for i, (pos, degree, chord) in enumerate(questions):
-            user_answer = input(f"\nWhat is the {degree} chord in {selected_key} major? ").strip()
+        for i, (degree_index, degree, chord) in enumerate(questions):
+            user_answer = (yield f"\nWhat is the {degree} chord in {selected_key} major? ").strip()
             
-            if user_answer.upper() == chord.upper() or user_answer.lower() == chord.lower():
-                print("Correct!")
+            answered = self.check_answer(user_answer, chord)
+            self.record_answer(answered, "Chord Progression", selected_key)
+            self.scheduler.review(f"chord:{selected_key}:{degree_index}", answered)
+            if answered:
+                self.say("Correct!")
                 correct += 1
                 # Increase proficiency
-                self.user_data["key_proficiency"][selected_key] = min(
-                    10, self.user_data["key_proficiency"][selected_key] + 0.3
-                )
+                self.raise_proficiency(selected_key, self.progression_step)
             else:
-                print(f"Incorrect. The {degree} chord in {selected_key} major is {chord}.")
+                self.say(f"Incorrect. The {degree} chord in {selected_key} major is {chord}.")
+            
+            self.store.mark_dirty(self.user_data)
         
         # Record results
         score = (correct / len(questions)) * 100
-        print(f"\nYou scored {score:.1f}% ({correct}/{len(questions)})")
+        self.say(f"\nYou scored {score:.1f}% ({correct}/{len(questions)})")
         
         self.user_data["exercises_completed"] += 1
         self.user_data["correct_answers"] += correct
         
         # Record exercise history
-        self.user_data["exercise_history"].append({
+        self.record_exercise({
             "date": datetime.now(),
             "type": "Chord Progression",
             "score": score,
@@ -352,68 +365,54 @@ class CircleOfFifths:
         self.update_skill_level()
         self.save_user_data()
         
-        input("\nPress Enter to return to the main menu...")
+        yield "\nPress Enter to return to the main menu..."
     
     def relative_key_exercise(self):
         """Exercise on relative major/minor keys"""
-        print("\n==== RELATIVE MAJOR/MINOR RELATIONSHIPS ====")
-        print("Practice identifying relative major and minor keys.")
+        self.run_steps(self.relative_key_steps())
+    
+    def relative_key_steps(self):
+        """Relative key exercise as a generator that yields prompts and receives the answers"""
+        self.say("\n==== RELATIVE MAJOR/MINOR RELATIONSHIPS ====")
+        self.say("Practice identifying relative major and minor keys.")
         
         total_questions = 5
         correct = 0
+        questions = relative_key_questions(self.rng, self.scheduler.pick)
         
         for i in range(total_questions):
-            # Decide if we're asking for relative major or minor
-            is_to_minor = random.choice([True, False])
-            
-            if is_to_minor:
-                # Ask for the relative minor
-                major_key = random.choice(self.keys)
-                major_idx = self.keys.index(major_key)
-                minor_idx = (major_idx + 9) % 12
-                answer = self.keys[minor_idx].lower() + "m"
-                
-                print(f"\nQuestion {i+1}: What is the relative minor of {major_key} major?")
-            else:
-                # Ask for the relative major
-                minor_idx = random.randint(0, 11)
-                minor_key = self.keys[minor_idx].lower() + "m"
-                major_idx = (minor_idx + 3) % 12
-                answer = self.keys[major_idx]
-                
-                print(f"\nQuestion {i+1}: What is the relative major of {minor_key}?")
+            prompt, answer, metadata = self.next_question(questions)
+            self.say(f"\nQuestion {i+1}: {prompt}")
             
-            user_answer = input("Your answer: ").strip()
+            user_answer = (yield "Your answer: ").strip()
             
-            if user_answer.upper() == answer.upper() or user_answer.lower() == answer.lower():
-                print("Correct!")
+            answered = self.check_answer(user_answer, answer)
+            self.record_answer(answered, "Relative Keys", metadata["key"])
+            self.scheduler.review(metadata["item"], answered)
+            if answered:
+                self.say("Correct!")
                 correct += 1
                 
                 # Increase proficiency for both keys
                 related_key = answer.split('/')[0].replace('m', '')
-                question_key = major_key if is_to_minor else self.keys[major_idx]
+                question_key = metadata["key"]
                 
-                if related_key in self.user_data["key_proficiency"]:
-                    self.user_data["key_proficiency"][related_key] = min(
-                        10, self.user_data["key_proficiency"][related_key] + 0.2
-                    )
-                
-                if question_key in self.user_data["key_proficiency"]:
-                    self.user_data["key_proficiency"][question_key] = min(
-                        10, self.user_data["key_proficiency"][question_key] + 0.2
-                    )
+                self.raise_proficiency(related_key, self.proficiency_step)
+                self.raise_proficiency(question_key, self.proficiency_step)
             else:
-                print(f"Incorrect. The correct answer is {answer}.")
+                self.say(f"Incorrect. The correct answer is {answer}.")
+            
+            self.store.mark_dirty(self.user_data)
         
         # Record results
         score = (correct / total_questions) * 100
-        print(f"\nYou scored {score:.1f}% ({correct}/{total_questions})")
+        self.say(f"\nYou scored {score:.1f}% ({correct}/{total_questions})")
         
         self.user_data["exercises_completed"] += 1
         self.user_data["correct_answers"] += correct
         
         # Record exercise history
-        self.user_data["exercise_history"].append({
+        self.record_exercise({
             "date": datetime.now(),
             "type": "Relative Keys",
             "score": score
@@ -422,61 +421,51 @@ class CircleOfFifths:
         self.update_skill_level()
         self.save_user_data()
         
-        input("\nPress Enter to return to the main menu...")
+        yield "\nPress Enter to return to the main menu..."
     
     def key_signature_quiz(self):
         """Quiz on key signatures (number of sharps/flats)"""
-        print("\n==== KEY SIGNATURE QUIZ ====")
-        print("Identify the number of sharps or flats in each key signature.")
+        self.run_steps(self.key_signature_steps())
+    
+    def key_signature_steps(self):
+        """Key signature quiz as a generator that yields prompts and receives the answers"""
+        self.say("\n==== KEY SIGNATURE QUIZ ====")
+        self.say("Identify the number of sharps or flats in each key signature.")
         
         total_questions = 5
         correct = 0
+        questions = key_signature_questions(self.rng, self.scheduler.pick)
         
         for i in range(total_questions):
-            # Randomly select a key
-            key = random.choice(self.keys)
-            
-            # Determine if key has sharps or flats
-            if key in ["C", "G", "D", "A", "E", "B", "F#/Gb", "C#/Db"]:
-                # Sharps
-                key_idx = ["C", "G", "D", "A", "E", "B", "F#/Gb", "C#/Db"].index(key)
-                if key_idx == 0:
-                    answer = "0"
-                else:
-                    answer = str(key_idx)
-                question = f"How many sharps are in the key signature of {key} major?"
-            else:
-                # Flats
-                key_idx = ["C", "F", "Bb", "Eb", "Ab", "Db", "Gb", "Cb"].index(key)
-                if key_idx == 0:
-                    answer = "0"
-                else:
-                    answer = str(key_idx)
-                question = f"How many flats are in the key signature of {key} major?"
+            prompt, answer, metadata = self.next_question(questions)
+            key = metadata["key"]
             
-            print(f"\nQuestion {i+1}: {question}")
-            user_answer = input("Your answer: ").strip()
+            self.say(f"\nQuestion {i+1}: {prompt}")
+            user_answer = (yield "Your answer: ").strip()
             
-            if user_answer == answer:
-                print("Correct!")
+            answered = self.check_answer(user_answer, answer)
+            self.record_answer(answered, "Key Signatures", metadata["key"])
+            self.scheduler.review(metadata["item"], answered)
+            if answered:
+                self.say("Correct!")
                 correct += 1
                 
                 # Increase proficiency
-                self.user_data["key_proficiency"][key] = min(
-                    10, self.user_data["key_proficiency"][key] + 0.2
-                )
+                self.raise_proficiency(key, self.proficiency_step)
             else:
-                print(f"Incorrect. The correct answer is {answer}.")
+                self.say(f"Incorrect. The correct answer is {answer}.")
+            
+            self.store.mark_dirty(self.user_data)
         
         # Record results
         score = (correct / total_questions) * 100
-        print(f"\nYou scored {score:.1f}% ({correct}/{total_questions})")
+        self.say(f"\nYou scored {score:.1f}% ({correct}/{total_questions})")
         
         self.user_data["exercises_completed"] += 1
         self.user_data["correct_answers"] += correct
         
         # Record exercise history
-        self.user_data["exercise_history"].append({
+        self.record_exercise({
             "date": datetime.now(),
             "type": "Key Signatures",
             "score": score
@@ -485,117 +474,339 @@ class CircleOfFifths:
         self.update_skill_level()
         self.save_user_data()
         
-        input("\nPress Enter to return to the main menu...")
+        yield "\nPress Enter to return to the main menu..."
+    
+    def ear_training_exercise(self):
+        """Ear training: hear chords of a key and name their scale degree"""
+        self.run_steps(self.ear_training_steps())
+    
+    def ear_training_steps(self, path="ear_training.wav", player=None):
+        """Ear training as a generator that yields prompts and receives the answers
+        
+        Each question is the key's tonic chord followed by another of its chords,
+        written to `path` and played through a local player when one is found.
+        """
+        import audio
+        
+        self.say("\n==== EAR TRAINING ====")
+        if not audio.available():
+            self.say("Ear training synthesises its chords with NumPy; install it with 'pip install numpy'.")
+            yield "\nPress Enter to return to the main menu..."
+            return
+        self.say("Listen to the tonic chord, then name the degree of the chord that follows it")
+        self.say("(a roman numeral such as IV or vii°, a number from 1 to 7, or the chord's name).")
+        
+        total_questions = 5
+        correct = 0
+        player = player or audio.find_player()
+        # Inversions and open voicings are harder to hear, so they come in with skill
+        voicings = audio.VOICINGS if self.user_data["skill_level"] >= 5 else ("close",)
+        
+        for i in range(total_questions):
+            key = self.pick_key(self.rng)
+            degree = self.rng.randrange(1, 7)
+            chord = self.chord_degrees[degree]
+            buffers = audio.progression_pcm([chord_notes(key), chord_notes(key, "major", degree)],
+                                            self.rng.choice(voicings))
+            audio.write_wav(path, buffers)
+            
+            self.say(f"\nQuestion {i+1}: {key} major")
+            if player is None or not audio.play(buffers, player=player):
+                self.say(f"Play '{path}' to hear the chords.")
+            user_answer = (yield "Which degree is the second chord? ").strip()
+            
+            answer = THEORY.chord[key, degree]
+            answered = parse_degree(user_answer) == degree or self.check_answer(user_answer, answer)
+            self.record_answer(answered, "Ear Training", key)
+            if answered:
+                self.say("Correct!")
+                correct += 1
+                self.raise_proficiency(key, self.proficiency_step)
+            else:
+                self.say(f"Incorrect. It was {chord} ({answer}).")
+            
+            self.store.mark_dirty(self.user_data)
+        
+        # Record results
+        score = (correct / total_questions) * 100
+        self.say(f"\nYou scored {score:.1f}% ({correct}/{total_questions})")
+        
+        self.user_data["exercises_completed"] += 1
+        self.user_data["correct_answers"] += correct
+        
+        # Record exercise history
+        self.record_exercise({
+            "date": datetime.now(),
+            "type": "Ear Training",
+            "score": score
+        })
+        
+        self.update_skill_level()
+        self.save_user_data()
+        
+        yield "\nPress Enter to return to the main menu..."
     
     def show_progress(self):
         """Display user progress statistics and charts"""
-        print("\n==== YOUR PROGRESS ====")
+        self.run_steps(self.progress_steps())
+    
+    def progress_steps(self, chart=True):
+        """Progress report as a generator that yields prompts (optionally without the chart)"""
+        self.say("\n==== YOUR PROGRESS ====")
         
-        # Calculate overall statistics
+        # Overall statistics come from the answer counters (exercises ask different numbers of questions)
         total_exercises = self.user_data["exercises_completed"]
-        total_correct = self.user_data["correct_answers"]
+        overall_accuracy = self.stats.accuracy() or 0
         
-        if total_exercises > 0:
-            overall_accuracy = (total_correct / (total_exercises * 5)) * 100
-        else:
-            overall_accuracy = 0
+        self.say(f"Username: {self.user_data['username']}")
+        self.say(f"Skill Level: {self.user_data['skill_level']:.1f}/10")
+        self.say(f"Exercises Completed: {total_exercises}")
+        self.say(f"Overall Accuracy: {overall_accuracy:.1f}%")
         
-        print(f"Username: {self.user_data['username']}")
-        print(f"Skill Level: {self.user_data['skill_level']:.1f}/10")
-        print(f"Exercises Completed: {total_exercises}")
-        print(f"Overall Accuracy: {overall_accuracy:.1f}%")
+        recent_accuracy = self.stats.recent_accuracy()
+        if recent_accuracy is not None:
+            streak, best = self.stats.streak()
+            self.say(f"Recent Accuracy: {recent_accuracy:.1f}%")
+            self.say(f"Correct Streak: {streak} (best {best})")
         
         if total_exercises > 0:
             # Show proficiency by key
-            print("\nProficiency by Key:")
+            self.say("\nProficiency by Key:")
             for key, prof in sorted(self.user_data["key_proficiency"].items(), 
                                   key=lambda x: x[1], reverse=True):
-                print(f"  {key}: {'█' * int(prof)}{' ' * (10-int(prof))} {prof:.1f}/10")
+                self.say(f"  {key}: {'█' * int(prof)}{' ' * (10-int(prof))} {prof:.1f}/10")
+            
+            # Accuracy per exercise type, where answers have been counted
+            by_type = self.stats.breakdown("type")
+            if by_type:
+                self.say("\nAccuracy by Exercise:")
+                for name, counter in sorted(by_type.items()):
+                    self.say(f"  {name}: {self.stats.accuracy('type:' + name):.1f}% of {counter[ASKED]} questions "
+                             f"(recent {self.stats.recent_accuracy('type:' + name):.1f}%)")
             
             # Show recent exercise history
             if self.user_data["exercise_history"]:
-                print("\nRecent Exercise History:")
-                recent = self.user_data["exercise_history"][-5:]
+                self.say("\nRecent Exercise History:")
+                recent = self.user_data["exercise_history"].recent(5)
                 for i, exercise in enumerate(reversed(recent)):
                     date_str = exercise["date"] if isinstance(exercise["date"], str) else exercise["date"].strftime("%Y-%m-%d %H:%M")
-                    print(f"  {date_str} - {exercise['type']} - Score: {exercise['score']:.1f}%")
+                    self.say(f"  {date_str} - {exercise['type']} - Score: {exercise['score']:.1f}%")
             
-            # Generate and display progress graph if there's enough data
-            if len(self.user_data["exercise_history"]) >= 3:
-                self.generate_progress_graph()
-                print("\nA progress graph has been saved as 'progress_chart.png'")
+            # Draw the progress graph in the background if there's enough new data
+            if chart and len(self.user_data["exercise_history"]) >= 3:
+                progress = self.progress_cache()
+                if self.chart_renderer.is_current(progress.version):
+                    self.say("\nYour progress graph in 'progress_chart.png' is up to date.")
+                else:
+                    self.chart_renderer.submit(progress.points(), version=progress.version)
+                    self.say("\nYour progress graph is being drawn; you will be told when 'progress_chart.png' is ready.")
         
-        input("\nPress Enter to return to the main menu...")
+        yield "\nPress Enter to return to the main menu..."
+    
+    def progress_cache(self):
+        """Pre-parsed score series for the whole history, built on first use"""
+        if self.progress is None:
+            self.progress = ProgressSeries(self.user_data["exercise_history"])
+        return self.progress
     
-    def generate_progress_graph(self):
-        """Generate a visual representation of user progress"""
+    def progress_series(self, start=None, end=None):
+        """Group exercise scores by type as date-sorted (date, score) lists"""
+        if start is None and end is None:
+            return self.progress_cache().points()
+        return ProgressSeries(self.user_data["exercise_history"].between(start, end)).points()
+    
+    def generate_progress_graph(self, start=None, end=None):
+        """Generate a visual representation of user progress (optionally for a date range)"""
         try:
-            # Extract data for plotting
-            history = self.user_data["exercise_history"]
-            
-            # Group by exercise type
-            exercise_types = defaultdict(list)
-            for ex in history:
-                date = ex["date"] if isinstance(ex["date"], str) else ex["date"]
-                if isinstance(date, str):
-                    try:
-                        date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S.%f")
-                    except ValueError:
-                        date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
-                exercise_types[ex["type"]].append((date, ex["score"]))
-            
-            # Create the plot
-            plt.figure(figsize=(10, 6))
-            
-            for ex_type, scores in exercise_types.items():
-                # Sort by date
-                scores.sort(key=lambda x: x[0])
-                
-                # Extract dates and scores
-                dates = [s[0] for s in scores]
-                values = [s[1] for s in scores]
-                
-                # Plot the line
-                plt.plot(dates, values, marker='o', label=ex_type)
-            
-            plt.title("Your Progress Over Time")
-            plt.xlabel("Date")
-            plt.ylabel("Score (%)")
-            plt.grid(True, linestyle='--', alpha=0.7)
-            plt.legend()
-            plt.ylim(0, 105)
-            
-            # Format the date axis
-            plt.gcf().autofmt_xdate()
-            
-            # Save the figure
-            plt.savefig("progress_chart.png")
-            plt.close()
-            
+            render_progress_chart(self.progress_series(start, end))
         except Exception as e:
-            print(f"Could not generate progress graph: {e}")
+            self.say(f"Could not generate progress graph: {e}")
+    
+    def report_chart(self):
+        """Tell the user about a background chart that has finished since the last menu"""
+        finished = self.chart_renderer.poll()
+        if finished is None:
+            return
+        path, error = finished
+        if error:
+            self.say(f"\nCould not generate progress graph: {error}")
+        else:
+            self.say(f"\nYour progress graph is ready: '{path}'")
     
     def change_username(self):
         """Allow the user to change their username"""
-        print("\n==== CHANGE USERNAME ====")
+        self.say("\n==== CHANGE USERNAME ====")
         current = self.user_data["username"]
-        print(f"Current username: {current}")
+        self.say(f"Current username: {current}")
         
         new_name = input("Enter new username (or press Enter to cancel): ").strip()
         
-        if new_name and new_name != current:
+        if new_name and new_name != current and not self.store.username_available(new_name):
+            self.say(f"The username {new_name} is already taken.")
+        elif new_name and new_name != current:
             self.user_data["username"] = new_name
-            print(f"Username changed to {new_name}")
+            self.say(f"Username changed to {new_name}")
             self.save_user_data()
         else:
-            print("Username unchanged.")
+            self.say("Username unchanged.")
 
 def main():
+    parser = argparse.ArgumentParser(description="Circle of Fifths - Interactive Learning Tool")
+    parser.add_argument("--db", help="Keep profiles in this shared SQLite database instead of a JSON file")
+    parser.add_argument("--user", default="user", help="Profile to use with --db (default: user)")
+    parser.add_argument("--save-delay", type=float, default=2.0, metavar="SECONDS",
+                        help="Coalesce profile saves and write them this long after a change (default: 2)")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="Time hot paths and write latency histograms to PATH on exit "
+                             "(Prometheus text for *.prom, JSON otherwise)")
+    commands = parser.add_subparsers(dest="command")
+    
+    batch = commands.add_parser("batch", help="Generate questions in bulk without an interactive session")
+    batch.add_argument("count", type=int, help="Number of questions to generate")
+    batch.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    batch.add_argument("--output", "-o", help="Output file (default: stdout)")
+    batch.add_argument("--seed", default=0, help="Base seed; each shard derives its own seed from it")
+    batch.add_argument("--workers", type=int, default=1, help="Worker processes for sharded generation")
+    batch.add_argument("--exercise", action="append", choices=EXERCISES,
+                       help="Only generate this exercise type (repeatable)")
+    batch.add_argument("--source", choices=["generators", "bank", "coverage"], default="generators",
+                       help="Question generators, draws from the precomputed question bank without repeats, "
+                            "or every bank question once in shuffled order")
+    batch.add_argument("--bank-file", help="Memory-map the question bank from this file (built if missing)")
+    
+    grade = commands.add_parser("grade", help="Grade a JSONL file of questions with learner responses")
+    grade.add_argument("input", help="JSONL records from 'batch' with a 'response' field added")
+    grade.add_argument("--output", "-o", help="Per-item results file (default: stdout)")
+    
+    serve = commands.add_parser("serve", help="Run the exercises as a TCP quiz server for many learners")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--profiles", default="profiles", help="Directory holding one profile per learner")
+    serve.add_argument("--flush-interval", type=float, default=2.0, help="Seconds between batched profile writes")
+    
+    loadgen = commands.add_parser("loadgen", help="Simulate many learners against a running quiz server")
+    loadgen.add_argument("--host", default="127.0.0.1")
+    loadgen.add_argument("--port", type=int, default=8765)
+    loadgen.add_argument("--clients", type=int, default=100, help="Concurrent learners")
+    loadgen.add_argument("--exercises", type=int, default=3, help="Exercises per learner")
+    loadgen.add_argument("--seed", type=int, default=0)
+    
+    cohort = commands.add_parser("cohort", help="Aggregate statistics over a directory tree of learner profiles")
+    cohort.add_argument("root", help="Directory searched recursively for profile .json files")
+    cohort.add_argument("--output", "-o", default="cohort_report", help="Report directory (default: cohort_report)")
+    cohort.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    
+    corpus = commands.add_parser("corpus", help="Detect the key and roman numerals of every song in a chord corpus")
+    corpus.add_argument("input", help="Text file with one song per line as chord symbols ('-' for stdin)")
+    corpus.add_argument("--output", "-o", help="JSONL results, one line per song (default: stdout)")
+    corpus.add_argument("--workers", type=int, default=1, help="Worker processes")
+    corpus.add_argument("--chunk-lines", type=int, default=2000, help="Songs handed to a worker at a time")
+    
+    simulate = commands.add_parser("simulate", help="Compare adaptive-difficulty policies on simulated learners")
+    simulate.add_argument("--learners", type=int, default=1000, help="Simulated learners per policy")
+    simulate.add_argument("--policy", action="append",
+                          help="Policy to simulate (repeatable; default: all of them): default, fast, slow, "
+                               "early-progressions, late-progressions or easy-keys")
+    simulate.add_argument("--population", choices=["novice", "intermediate", "uneven"], default="novice",
+                          help="Kind of learner to simulate (default: novice)")
+    simulate.add_argument("--seed", default=0, help="The same seed always simulates the same learners")
+    simulate.add_argument("--max-questions", type=int, default=5000,
+                          help="Give up on a learner who has not mastered every key after this many questions")
+    simulate.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    simulate.add_argument("--output", "-o", help="Write the JSON results to this file (default: stdout)")
+    
+    sync = commands.add_parser("sync", help="Merge this machine's profile with copies on other machines")
+    sync.add_argument("--profile", default="circle_of_fifths_user_data.json", help="Profile to sync")
+    target = sync.add_mutually_exclusive_group(required=True)
+    target.add_argument("--dir", help="Shared directory every machine publishes its new entries to")
+    target.add_argument("--listen", type=int, metavar="PORT", help="Wait for other machines to sync with this one")
+    target.add_argument("--connect", type=int, metavar="PORT", help="Sync with a machine listening on PORT")
+    sync.add_argument("--host", default="127.0.0.1", help="Address to listen on or connect to")
+    sync.add_argument("--once", action="store_true", help="With --listen, stop after the first sync")
+    
+    midi = commands.add_parser("midi", help="Export voice-led chord progressions as a MIDI file")
+    midi.add_argument("count", type=int, help="Number of progressions to export")
+    midi.add_argument("--output", "-o", default="progressions.mid", help="MIDI file (default: progressions.mid)")
+    midi.add_argument("--seed", default=0, help="The same seed always exports the same progressions")
+    midi.add_argument("--level", action="append", choices=["easy", "medium", "hard"],
+                      help="Only use this level's progression patterns (repeatable)")
+    midi.add_argument("--bpm", type=int, default=90, help="Tempo in beats per minute (a chord lasts four beats)")
+    
+    bench = commands.add_parser("bench", help="Run the benchmark suite and print the results as JSON")
+    bench.add_argument("--output", "-o", help="Write the JSON results to this file (default: stdout)")
+    bench.add_argument("--only", action="append", metavar="SECTION",
+                       help="Only run this section (repeatable): questions, exercises, grading, skill, "
+                            "profiles, startup, sampling, harmony, persistence, bank, audio, corpus, voicing or sync")
+    bench.add_argument("--sizes", type=int, nargs="+",
+                       help="History sizes for the profile save/load/chart cases (default: 10 10000 1000000)")
+    bench.add_argument("--number", type=int, default=10000, help="Calls per timing of the fast cases")
+    bench.add_argument("--profile", nargs="?", const="bench_profile", metavar="PREFIX",
+                       help="Record the run with cProfile and write PREFIX.prof and PREFIX.txt")
+    bench.add_argument("--tracemalloc", nargs="?", const="bench_memory.txt", metavar="PATH",
+                       help="Track peak memory per section and write the top allocation sites to PATH")
+    
+    args = parser.parse_args()
+    
+    if args.command == "cohort":
+        from cohort import run_cohort
+        run_cohort(args)
+        return
+    if args.command == "corpus":
+        from corpus import run_corpus
+        run_corpus(args)
+        return
+    if args.command == "simulate":
+        from simulate import run_simulate
+        run_simulate(args)
+        return
+    if args.command == "sync":
+        from sync import run_sync
+        run_sync(args)
+        return
+    if args.command == "midi":
+        from voicing import run_midi
+        run_midi(args)
+        return
+    if args.command == "bench":
+        from benchmarks.suite import run_benchmarks
+        run_benchmarks(args)
+        return
+    if args.command == "serve":
+        from server import run_server
+        run_server(args)
+        return
+    if args.command == "loadgen":
+        from loadgen import run_loadgen
+        run_loadgen(args)
+        return
+    if args.command == "batch":
+        run_batch(args)
+        return
+    if args.command == "grade":
+        run_grade(args)
+        return
+    
     print("Welcome to Circle of Fifths - Interactive Learning Tool!")
     print("This program will help you master the Circle of Fifths and memorize chords.")
     
-    app = CircleOfFifths()
-    app.display_main_menu()
+    # SQLite commits each save in a transaction; the JSON profile is written behind
+    if args.db:
+        store = SQLiteProfileStore(args.db, args.user)
+    else:
+        store = WriteBehindStore(AppendOnlyStore(), args.save_delay)
+    metrics = Metrics() if args.metrics else None
+    app = CircleOfFifths(store, metrics=metrics)
+    
+    # Turn termination signals into a normal exit so pending saves are flushed
+    for sig in (signal.SIGTERM, getattr(signal, "SIGHUP", None)):
+        if sig is not None:
+            signal.signal(sig, lambda signum, frame: sys.exit(128 + signum))
+    try:
+        app.display_main_menu()
+    finally:
+        app.store.close()
+        if metrics is not None:
+            metrics.write(args.metrics)
 
 if __name__ == "__main__":
     main()
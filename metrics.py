@@ -0,0 +1,153 @@
+import json
+import time
+from array import array
+from bisect import bisect_left
+from functools import wraps
+
+# Histogram bucket upper bounds in seconds: 10us doubling up to about 84s
+BUCKET_BOUNDS = tuple(1e-5 * 2 ** i for i in range(24))
+
+# CircleOfFifths methods timed when instrumentation is on
+TIMED_METHODS = ("next_question", "check_answer", "save_user_data", "load_user_data", "generate_progress_graph")
+
+# Exercise generators whose steps (answer in, next prompt out) are timed
+TIMED_STEPS = ("key_identification_steps", "chord_progression_steps", "relative_key_steps",
+               "key_signature_steps", "ear_training_steps", "progress_steps")
+
+METRIC = "circle_of_fifths_latency_seconds"
+
+
+class Histogram:
+    """Fixed-size latency histogram: one counter per bucket plus the running sum and max
+
+    Observing is a bisect and an array increment, and memory never grows with
+    the number of observations.
+    """
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.counts = array("Q", bytes(8 * (len(bounds) + 1)))  # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, capped at the max (None if empty)"""
+        if not self.count:
+            return None
+        target, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum_s": self.sum,
+            "mean_s": self.sum / self.count if self.count else None,
+            "p50_s": self.quantile(0.5),
+            "p90_s": self.quantile(0.9),
+            "p99_s": self.quantile(0.99),
+            "max_s": self.max,
+        }
+
+
+class Metrics:
+    """Named latency histograms for instrumented CircleOfFifths operations
+
+    Nothing is timed unless `instrument` is called on an app, so a disabled
+    metrics layer costs nothing on the hot path.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.histograms = {}
+
+    def histogram(self, name):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        return self.histograms[name]
+
+    def timed(self, name, fn):
+        """Wrap `fn` so each call is recorded in histogram `name`"""
+        hist, clock = self.histogram(name), self.clock
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(clock() - start)
+        return wrapper
+
+    def timed_steps(self, name, fn):
+        """Wrap a steps generator function so the time to produce each prompt is recorded
+
+        That is the wait a learner sees between sending an answer and getting
+        the next question (or the first prompt, for the opening step).
+        """
+        hist, clock = self.histogram(name), self.clock
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            steps = fn(*args, **kwargs)
+            answer = None
+            try:
+                while True:
+                    start = clock()
+                    try:
+                        prompt = steps.send(answer)
+                    except StopIteration:
+                        return
+                    finally:
+                        hist.observe(clock() - start)
+                    answer = yield prompt
+            finally:
+                steps.close()
+        return wrapper
+
+    def instrument(self, app):
+        """Replace the timed methods on one app instance with timing wrappers"""
+        for name in TIMED_METHODS:
+            setattr(app, name, self.timed(name, getattr(app, name)))
+        for name in TIMED_STEPS:
+            setattr(app, name, self.timed_steps(name, getattr(app, name)))
+        return app
+
+    def snapshot(self):
+        """Summary statistics per operation, suitable for a JSON dump"""
+        return {name: hist.summary() for name, hist in sorted(self.histograms.items())}
+
+    def prometheus(self):
+        """All histograms in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {METRIC} Time spent in instrumented Circle of Fifths operations",
+            f"# TYPE {METRIC} histogram",
+        ]
+        for name, hist in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, n in zip(hist.bounds + (float("inf"),), hist.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:.6g}"
+                lines.append(f'{METRIC}_bucket{{operation="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{METRIC}_sum{{operation="{name}"}} {hist.sum:.9g}')
+            lines.append(f'{METRIC}_count{{operation="{name}"}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to `path`: Prometheus text for *.prom, JSON otherwise"""
+        with open(path, "w") as f:
+            if path.endswith(".prom"):
+                f.write(self.prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=4)
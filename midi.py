@@ -0,0 +1,85 @@
+import struct
+
+# Meta event types used by the writer
+TRACK_NAME = 0x03
+MARKER = 0x06
+TEMPO = 0x51
+END_OF_TRACK = 0x2F
+
+# Bytes of track data gathered before each write to the file
+BUFFER_SIZE = 1 << 16
+
+
+def varlen(value):
+    """MIDI variable-length quantity: 7 bits per byte, high bit set on all but the last"""
+    out = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        out.insert(0, 0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(out)
+
+
+class MidiWriter:
+    """Streaming writer for a single-track (format 0) Standard MIDI File
+
+    Events are appended as they come and written out in blocks, so a file of
+    any length needs only a small buffer. The track length is not known until
+    the end, so close() seeks back to fill it in; the file must be seekable.
+    Times are in ticks; a rest before the next event accumulates in `delay`.
+    """
+
+    def __init__(self, f, ticks_per_beat=480, bpm=120, name=None):
+        self.f = f
+        self.ticks_per_beat = ticks_per_beat
+        self.delay = 0
+        self._buffer = bytearray()
+        self._length = 0
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, ticks_per_beat))
+        self._length_pos = f.tell() + 4
+        f.write(b"MTrk" + struct.pack(">I", 0))
+        if name:
+            self.meta(TRACK_NAME, name.encode("utf-8"))
+        self.meta(TEMPO, struct.pack(">I", round(60000000 / bpm))[1:])
+
+    def _event(self, data):
+        self._buffer += varlen(self.delay)
+        self._buffer += data
+        self.delay = 0
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self.f.write(self._buffer)
+        self._length += len(self._buffer)
+        self._buffer.clear()
+
+    def meta(self, kind, data):
+        self._event(bytes([0xFF, kind]) + varlen(len(data)) + data)
+
+    def marker(self, text):
+        """A named position in the track (shown by most sequencers), such as the start of a progression"""
+        self.meta(MARKER, text.encode("utf-8"))
+
+    def program(self, program, channel=0):
+        self._event(bytes([0xC0 | channel, program]))
+
+    def rest(self, ticks):
+        self.delay += ticks
+
+    def chord(self, notes, ticks, velocity=80, channel=0):
+        """Sound `notes` (MIDI note numbers) together for `ticks`"""
+        for note in notes:
+            self._event(bytes([0x90 | channel, note, velocity]))
+        self.delay += ticks
+        for note in notes:
+            self._event(bytes([0x80 | channel, note, 0]))
+
+    def close(self):
+        """End the track and fill in its length"""
+        self.meta(END_OF_TRACK, b"")
+        self._flush()
+        end = self.f.tell()
+        self.f.seek(self._length_pos)
+        self.f.write(struct.pack(">I", self._length))
+        self.f.seek(end)
@@ -0,0 +1,316 @@
+import csv
+import io
+import json
+import random
+import sys
+from collections import namedtuple
+from multiprocessing import Pool
+
+from theory import THEORY
+
+# A generated question: the text shown to the learner, the expected answer and
+# a dict describing what was asked (exercise type, keys involved, difficulty)
+Question = namedtuple("Question", ["prompt", "answer", "metadata"])
+
+# A chord progression with some positions left blank for the learner to fill in
+Progression = namedtuple("Progression", ["key", "chords", "blanks", "pattern"])
+
+# Common progression patterns (chord degree indexes) for each difficulty
+PROGRESSION_PATTERNS = {
+    "easy": (
+        (0, 3, 4),  # I-IV-V
+        (0, 4, 3),  # I-V-IV
+        (0, 5, 3, 4),  # I-vi-IV-V
+    ),
+    "medium": (
+        (0, 5, 3, 4, 0),  # I-vi-IV-V-I
+        (0, 1, 4, 0),  # I-ii-V-I
+        (5, 1, 4, 0),  # vi-ii-V-I
+    ),
+    "hard": (
+        (0, 1, 4, 5, 3, 4, 0),  # I-ii-V-vi-IV-V-I
+        (0, 5, 1, 4, 0),  # I-vi-ii-V-I
+        (0, 2, 5, 3, 4, 0),  # I-iii-vi-IV-V-I
+    ),
+}
+
+EXERCISES = ("Key Identification", "Chord Progression", "Relative Keys", "Key Signatures")
+
+# Practice items by family, as tracked by the spaced-repetition scheduler
+ITEMS = {
+    "sig": tuple(f"sig:{key}" for key in THEORY.keys),
+    "rel": tuple(f"rel:{key}:{direction}" for key in THEORY.keys for direction in ("minor", "major")),
+    "chord": tuple(f"chord:{key}:{degree}" for key in THEORY.keys for degree in range(7)),
+}
+ALL_ITEMS = tuple(item for items in ITEMS.values() for item in items)
+
+
+def progression_level(skill_level, thresholds=(3, 7)):
+    """Pattern difficulty used for a given skill level (medium and hard start at the thresholds)"""
+    if skill_level < thresholds[0]:
+        return "easy"
+    if skill_level < thresholds[1]:
+        return "medium"
+    return "hard"
+
+
+def random_item(rng, family):
+    """Default item picker: any item in the family, uniformly"""
+    return rng.choice(ITEMS[family])
+
+
+def item_for_key(rng, family, key):
+    """A practice item in `family` about `key`"""
+    if family == "sig":
+        return f"sig:{key}"
+    if family == "rel":
+        return f"rel:{key}:{rng.choice(['minor', 'major'])}"
+    return f"chord:{key}:{rng.randint(0, 6)}"
+
+
+def signature_question(item, exercise="Key Signatures"):
+    """How many sharps/flats a key has"""
+    key = item.split(":")[1]
+    count, accidental = THEORY.signature[key]
+    return Question(f"How many {accidental} are in the key signature of {key} major?", str(count),
+                    {"exercise": exercise, "kind": accidental, "key": key, "item": item})
+
+
+def signature_key_question(rng, item, exercise, difficulty=None, flats=None):
+    """Which key has a given number of sharps/flats (the reverse of signature_question)
+
+    `flats` picks the flat spelling of B, F#/Gb and C#/Db; by default it is random.
+    """
+    key = item.split(":")[1]
+    count, accidental = THEORY.signature[key]
+    if key in THEORY.flat_keys[5:] and (rng.choice([True, False]) if flats is None else flats):
+        # B, F#/Gb and C#/Db can also be spelled with 7, 6 and 5 flats
+        count, accidental = THEORY.flat_keys.index(key), "flats"
+    return Question(f"Which major key has {count} {accidental}?", key,
+                    {"exercise": exercise, "kind": accidental, "key": key, "difficulty": difficulty, "item": item})
+
+
+def circle_question(start_key, steps, position, exercise="Key Identification", difficulty=None):
+    """Which key lies `steps` positions clockwise or counterclockwise from `start_key`"""
+    answer = THEORY.step(start_key, steps if position == "clockwise" else -steps)
+    return Question(
+        f"Starting from {start_key}, what key is {steps} steps {position} on the Circle of Fifths?", answer,
+        {"exercise": exercise, "kind": position, "key": start_key, "difficulty": difficulty},
+    )
+
+
+def relative_question(item, exercise="Relative Keys", difficulty=None):
+    """Relative minor of a major key, or relative major of a minor key"""
+    _, key, direction = item.split(":")
+    if direction == "minor":
+        return Question(
+            f"What is the relative minor of {key} major?", THEORY.relative_minor[key],
+            {"exercise": exercise, "kind": "relative minor", "key": key, "difficulty": difficulty, "item": item},
+        )
+    return Question(
+        f"What is the relative major of {THEORY.relative_minor[key]}?", key,
+        {"exercise": exercise, "kind": "relative major", "key": key, "difficulty": difficulty, "item": item},
+    )
+
+
+def chord_question(item, exercise="Key Identification", difficulty=None):
+    """A specific diatonic chord in a key"""
+    _, key, degree = item.split(":")
+    degree_idx = int(degree)
+    return Question(
+        f"In the key of {key} major, what is the {THEORY.chord_degrees[degree_idx]} chord?",
+        THEORY.chord[key, degree_idx],
+        {"exercise": exercise, "kind": "chord", "key": key, "degree": degree_idx, "difficulty": difficulty,
+         "item": item},
+    )
+
+
+def key_identification_questions(rng, difficulty, pick=random_item, pick_key=None):
+    """Yield key identification questions; difficulty 1-3 unlocks harder question types
+
+    `pick(rng, family)` chooses the practice item behind each question and
+    `pick_key(rng)` the starting key of circle questions; by default both are
+    drawn uniformly.
+    """
+    exercise = "Key Identification"
+    while True:
+        question_type = rng.randint(1, difficulty + 1)
+
+        if question_type == 1:
+            # Basic: Find key with X sharps/flats
+            yield signature_key_question(rng, pick(rng, "sig"), exercise, difficulty)
+
+        elif question_type == 2:
+            # Medium: Find position on circle
+            position = rng.choice(["clockwise", "counterclockwise"])
+            steps = rng.randint(1, 5)
+            start_key = pick_key(rng) if pick_key else rng.choice(THEORY.keys)
+            yield circle_question(start_key, steps, position, exercise, difficulty)
+
+        elif rng.choice(["relative", "chord"]) == "relative":
+            # Advanced: Relative minor/major
+            yield relative_question(pick(rng, "rel"), exercise, difficulty)
+
+        else:
+            # Advanced: Specific chord in key
+            yield chord_question(pick(rng, "chord"), exercise, difficulty)
+
+
+def relative_key_questions(rng, pick=random_item):
+    """Yield relative major/minor questions"""
+    while True:
+        yield relative_question(pick(rng, "rel"))
+
+
+def key_signature_questions(rng, pick=random_item):
+    """Yield questions on the number of sharps or flats in a key signature"""
+    while True:
+        yield signature_question(pick(rng, "sig"))
+
+
+def generate_progression(rng, level, key):
+    """Build a progression in `key` from one of the patterns for `level`"""
+    pattern = rng.choice(PROGRESSION_PATTERNS[level])
+    chords = [(THEORY.chord_degrees[degree], THEORY.chord[key, degree]) for degree in pattern]
+
+    # Leave one or two chords blank
+    progression_length = rng.randint(3, 5)
+    num_blanks = min(len(chords) - 1, max(1, int(progression_length / 2)))
+    blanks = rng.sample(range(len(chords)), num_blanks)
+    return Progression(key, chords, blanks, pattern)
+
+
+def chord_progression_questions(rng, level=None, key=None, pick=random_item):
+    """Yield one question per blank in a stream of progressions
+
+    Levels are drawn uniformly and keys come from `pick` unless fixed by the caller.
+    """
+    while True:
+        progression = generate_progression(
+            rng, level or rng.choice(tuple(PROGRESSION_PATTERNS)), key or pick(rng, "chord").split(":")[1]
+        )
+        yield from progression_questions(progression)
+
+
+def progression_questions(progression):
+    """One question per blank of a progression, in position order"""
+    shown = " - ".join("?" if i in progression.blanks else chord
+                       for i, (degree, chord) in enumerate(progression.chords))
+    return [
+        Question(
+            f"What is the {degree} chord in {progression.key} major?", chord,
+            {"exercise": "Chord Progression", "kind": "progression", "key": progression.key,
+             "position": pos, "progression": shown,
+             "item": f"chord:{progression.key}:{progression.pattern[pos]}"},
+        )
+        for pos, (degree, chord) in enumerate(progression.chords) if pos in progression.blanks
+    ]
+
+
+def question_stream(rng, exercises=EXERCISES):
+    """Yield questions from the given exercise types in random order"""
+    generators = {
+        "Key Identification": key_identification_questions(rng, 3),
+        "Chord Progression": chord_progression_questions(rng),
+        "Relative Keys": relative_key_questions(rng),
+        "Key Signatures": key_signature_questions(rng),
+    }
+    sources = [generators[name] for name in exercises]
+    while True:
+        yield next(rng.choice(sources))
+
+
+def shard_seed(seed, shard):
+    """Seed for one shard of a batch run, so any shard can be regenerated on its own"""
+    return f"{seed}:{shard}"
+
+
+def bank_stream(rng, bank, exercises=EXERCISES):
+    """Yield questions from a QuestionBank, repeating none before all of its exercise's have come up
+
+    The exercise is picked at random and its questions are dealt from a
+    shuffled order (QuestionBank.shuffled), so apart from one shuffle per pass
+    through a bucket a draw is a single step.
+    """
+    decks = {name: bank.shuffled(rng, name, repeat=True) for name in exercises}
+    while True:
+        yield next(decks[rng.choice(exercises)])
+
+
+def coverage_order(bank, seed, exercises=EXERCISES):
+    """Every bank question of the given exercises in one shuffled order derived from `seed`"""
+    order = [i for name in exercises for i in bank.bucket(name)]
+    random.Random(f"{seed}:coverage").shuffle(order)
+    return order
+
+
+def _render_shard(args):
+    """Generate one shard and return it already formatted for output"""
+    seed, shard, start, count, fmt, exercises, source, bank_path = args
+    rng = random.Random(shard_seed(seed, shard))
+    if source == "generators":
+        stream = question_stream(rng, exercises)
+    else:
+        from bank import QuestionBank
+        bank = QuestionBank.open(bank_path) if bank_path else QuestionBank.build()
+        if source == "coverage":
+            stream = (bank[i] for i in coverage_order(bank, seed, exercises)[start:start + count])
+        else:
+            stream = bank_stream(rng, bank, exercises)
+    buf = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buf)
+        for i in range(start, start + count):
+            q = next(stream)
+            writer.writerow([i, q.metadata["exercise"], q.prompt, q.answer, json.dumps(q.metadata)])
+    else:
+        for i in range(start, start + count):
+            q = next(stream)
+            buf.write(json.dumps({"id": i, "prompt": q.prompt, "answer": q.answer, "metadata": q.metadata}))
+            buf.write("\n")
+    return buf.getvalue()
+
+
+def write_batch(out, count, seed=0, fmt="jsonl", workers=1, exercises=EXERCISES, shard_size=50000,
+                source="generators", bank_path=None):
+    """Stream `count` questions to the file object `out` as JSONL or CSV
+
+    The run is split into fixed-size shards, each with its own seed derived from
+    `seed`, so the output is identical whatever the number of workers.
+    `source` is "generators" (the exercise generators), "bank" (draws from the
+    precomputed QuestionBank; within a shard no question repeats until every
+    question of its exercise has been drawn) or "coverage" (every bank question
+    once, shuffled, stopping early if `count` is smaller). With `bank_path` the bank
+    is memory-mapped from that file, written first if missing, so all worker
+    processes share one copy.
+    """
+    if fmt == "csv":
+        csv.writer(out).writerow(["id", "exercise", "prompt", "answer", "metadata"])
+    if source != "generators":
+        from bank import QuestionBank
+        # Opening the bank here writes its file once, before any worker maps it
+        bank = QuestionBank.open(bank_path) if bank_path else QuestionBank.build()
+        if source == "coverage":
+            count = min(count, len(coverage_order(bank, seed, exercises)))
+    shards = [
+        (seed, shard, start, min(shard_size, count - start), fmt, tuple(exercises), source, bank_path)
+        for shard, start in enumerate(range(0, count, shard_size))
+    ]
+    if workers > 1:
+        with Pool(workers) as pool:
+            for chunk in pool.imap(_render_shard, shards):
+                out.write(chunk)
+    else:
+        for shard in shards:
+            out.write(_render_shard(shard))
+
+
+def run_batch(args):
+    """Entry point for `main.py batch`"""
+    exercises = args.exercise or EXERCISES
+    options = {"source": args.source, "bank_path": args.bank_file}
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            write_batch(out, args.count, args.seed, args.format, args.workers, exercises, **options)
+    else:
+        write_batch(sys.stdout, args.count, args.seed, args.format, args.workers, exercises, **options)
@@ -0,0 +1,67 @@
+class WeightedSampler:
+    """Sample items in proportion to float weights, with O(log n) updates
+
+    Weights live in a Fenwick (binary indexed) tree, so changing one weight and
+    drawing a sample both take O(log n) and the weights are used exactly rather
+    than rounded to whole copies in a list.
+    """
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        self.index = {item: i for i, item in enumerate(self.items)}
+        self.weights = [0.0] * len(self.items)
+        self.tree = [0.0] * (len(self.items) + 1)
+        self._top = 1
+        while self._top * 2 <= len(self.items):
+            self._top *= 2
+        for item, weight in zip(self.items, weights):
+            self.update(item, weight)
+
+    def update(self, item, weight):
+        """Set the weight of `item`"""
+        if weight < 0:
+            raise ValueError("Weights must not be negative")
+        i = self.index[item]
+        delta = weight - self.weights[i]
+        self.weights[i] = weight
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def weight(self, item):
+        return self.weights[self.index[item]]
+
+    def total(self):
+        """Sum of all weights"""
+        total, i = 0.0, len(self.items)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def sample(self, rng):
+        """Draw one item with probability weight / total"""
+        target = rng.random() * self.total()
+        pos, step = 0, self._top
+        # Walk down the tree to the first item whose running sum exceeds the target
+        while step:
+            nxt = pos + step
+            if nxt < len(self.tree) and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step //= 2
+        # Guard against float rounding at the very end of the range
+        while pos < len(self.items) - 1 and self.weights[pos] == 0:
+            pos += 1
+        return self.items[min(pos, len(self.items) - 1)]
+
+
+def proficiency_weight(proficiency):
+    """Selection weight for a key: lower proficiency keys come up more often"""
+    return max(1.0, 11 - proficiency)
+
+
+def key_sampler(key_proficiency):
+    """Sampler over keys weighted by the learner's proficiency in each"""
+    return WeightedSampler(key_proficiency, [proficiency_weight(p) for p in key_proficiency.values()])
@@ -0,0 +1,94 @@
+import heapq
+import random
+import time
+
+DAY = 86400
+
+# How soon a missed item comes back, in seconds
+RETRY_DELAY = 600
+
+# SM-2 limits and the answer quality assigned to right/wrong answers
+MIN_EASE = 1.3
+START_EASE = 2.5
+QUALITY_CORRECT = 5
+QUALITY_INCORRECT = 1
+
+
+class Scheduler:
+    """SM-2 spaced-repetition scheduler over fine-grained practice items
+
+    Items are strings such as "sig:D", "rel:A:minor" or "chord:Eb:4"; the part
+    before the first colon is the item's family. `state` maps each item to
+    [ease, interval in days, repetitions, due time] and is stored in the
+    profile as-is. Each family keeps a heap ordered by due time, so picking the
+    next item is O(log n); reviewed items are pushed again and their old heap
+    entries are skipped when they surface.
+    """
+
+    def __init__(self, state, items, rng=None, clock=time.time, fallback=None):
+        self.state = state
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.fallback = fallback  # fallback(rng, family) picks an item when none is due
+        self._heaps = {}
+        for item in items:
+            if item not in self.state:
+                # Unseen items are due immediately
+                self.state[item] = [START_EASE, 0, 0, 0]
+        for item, (_, _, _, due) in self.state.items():
+            self._heaps.setdefault(item.split(":", 1)[0], []).append((due, self.rng.random(), item))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+    def _push(self, item):
+        heap = self._heaps.setdefault(item.split(":", 1)[0], [])
+        heapq.heappush(heap, (self.state[item][3], self.rng.random(), item))
+        if len(heap) > 2 * len(self.state):
+            # Too many stale entries: rebuild from the current state
+            family = item.split(":", 1)[0]
+            heap[:] = [(s[3], self.rng.random(), i) for i, s in self.state.items() if i.startswith(family + ":")]
+            heapq.heapify(heap)
+
+    def next_item(self, family):
+        """Most overdue item in `family` (or the one due soonest if none are due yet)"""
+        heap = self._heaps[family]
+        while heap[0][0] != self.state[heap[0][2]][3]:
+            heapq.heappop(heap)  # Stale entry left behind by an earlier review
+        return heap[0][2]
+
+    def pick(self, rng, family):
+        """Item picker with the signature the question generators expect
+
+        Returns the most overdue item, or asks the fallback picker when nothing
+        in the family is due yet.
+        """
+        item = self.next_item(family)
+        if self.fallback is not None and self.state[item][3] > self.clock():
+            return self.fallback(rng, family)
+        return item
+
+    def due_count(self, family=None):
+        now = self.clock()
+        return sum(1 for item, s in self.state.items()
+                   if s[3] <= now and (family is None or item.startswith(family + ":")))
+
+    def review(self, item, correct):
+        """Reschedule `item` after an answer, using the SM-2 update rules"""
+        ease, interval, reps, _ = self.state.get(item, [START_EASE, 0, 0, 0])
+        quality = QUALITY_CORRECT if correct else QUALITY_INCORRECT
+        now = self.clock()
+        if correct:
+            reps += 1
+            if reps == 1:
+                interval = 1
+            elif reps == 2:
+                interval = 6
+            else:
+                interval = interval * ease
+            due = now + interval * DAY
+        else:
+            reps, interval = 0, 0
+            due = now + RETRY_DELAY
+        ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        self.state[item] = [ease, interval, reps, due]
+        self._push(item)
@@ -0,0 +1,262 @@
+import asyncio
+import os
+import re
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from main import CircleOfFifths
+from metrics import Metrics
+from storage import AppendOnlyStore, ProfileStore, detached
+
+# Profile names double as file names, so keep them simple
+USERNAME = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+MENU = (
+    "\n==== CIRCLE OF FIFTHS - QUIZ SERVER ====",
+    "2. Practice Key Identification",
+    "3. Chord Progression Exercise",
+    "4. Relative Major/Minor Relationships",
+    "5. Key Signature Quiz",
+    "6. View Your Progress",
+    "8. Exit",
+)
+MENU_PROMPT = "Select an option: "
+
+# Menu choice -> CircleOfFifths method returning the steps generator
+EXERCISES = {
+    "2": lambda app: app.key_identification_steps(),
+    "3": lambda app: app.chord_progression_steps(),
+    "4": lambda app: app.relative_key_steps(),
+    "5": lambda app: app.key_signature_steps(),
+    "6": lambda app: app.progress_steps(chart=False),
+}
+
+
+class DeferredStore(ProfileStore):
+    """Store wrapper whose saves are queued for the server's background writer"""
+
+    def __init__(self, store, writer):
+        self.inner = store
+        self.writer = writer
+
+    def exists(self):
+        return self.inner.exists()
+
+    def new_history(self):
+        return self.inner.new_history()
+
+    def load(self):
+        return self.inner.load()
+
+    def set_aside(self):
+        return self.inner.set_aside()
+
+    def save(self, user_data):
+        # The writer thread saves a copy, so the session can keep changing the profile meanwhile
+        self.writer.mark_dirty(self, detached(user_data))
+
+    def close(self):
+        self.inner.close()
+
+
+class ProfileWriter:
+    """Batches profile saves and writes them on a worker thread every `interval` seconds
+
+    Sessions only mark their profile dirty, so answering a question never waits
+    on the disk; a slow write holds up the writer thread, not the event loop.
+    """
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.dirty = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+        self.writes = 0
+        self._lock = None
+
+    def mark_dirty(self, store, user_data):
+        self.dirty[store] = user_data
+
+    def pending(self, username):
+        """Whether a save for `username` is queued or may be in progress"""
+        in_progress = self._lock is not None and self._lock.locked()
+        return in_progress or any(data["username"] == username for data in self.dirty.values())
+
+    def _write_batch(self, batch):
+        for store, user_data in batch.items():
+            try:
+                store.inner.save(user_data)
+                self.writes += 1
+            except Exception as e:
+                print(f"Could not save profile {user_data.get('username')}: {e}")
+                self.dirty.setdefault(store, user_data)
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.dirty:
+                return
+            batch, self.dirty = self.dirty, {}
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._write_batch, batch)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+class QuizSession:
+    """State machine for one connection: login, then menu and exercise steps in turn
+
+    The exercises are the same generators the terminal app runs; here each
+    received line is sent into the current generator instead of input().
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.lines = []
+        self.app = None
+        self.steps = None
+        self.closed = False
+
+    def start(self):
+        self.lines.append("Welcome to Circle of Fifths - Interactive Learning Tool!")
+        return "Username: "
+
+    def take_output(self):
+        lines, self.lines = self.lines, []
+        return lines
+
+    def show_menu(self):
+        self.app.report_chart()
+        self.lines.extend(MENU)
+        return MENU_PROMPT
+
+    async def handle(self, line):
+        """Process one line from the client and return the next prompt (None to hang up)"""
+        if self.app is None:
+            return await self.login(line.strip())
+
+        if self.steps is not None:
+            try:
+                return self.steps.send(line)
+            except StopIteration:
+                self.steps = None
+                return self.show_menu()
+
+        choice = line.strip()
+        if choice in EXERCISES:
+            self.steps = EXERCISES[choice](self.app)
+            return next(self.steps)
+        if choice == "8":
+            self.finish()
+            self.lines.append("Thanks for learning with Circle of Fifths! Goodbye!")
+            return None
+        self.lines.append("Invalid option. Please try again.")
+        return self.show_menu()
+
+    async def login(self, name):
+        if not USERNAME.match(name):
+            self.lines.append("Usernames may only use letters, digits, '-' and '_'.")
+            return "Username: "
+        if name in self.server.sessions:
+            self.lines.append("That profile is already in use.")
+            return "Username: "
+        self.server.sessions[name] = self
+        if self.server.writer.pending(name):
+            # The learner's previous session has not been written out yet
+            await self.server.writer.flush()
+        loop = asyncio.get_running_loop()
+        # Loading reads the profile snapshot, so keep it off the event loop
+        self.app = await loop.run_in_executor(None, self.server.open_profile, name, self.lines.append)
+        self.app.user_data["username"] = name
+        return self.show_menu()
+
+    def finish(self):
+        """Record the end of the session and queue a final save"""
+        if self.app is not None and not self.closed:
+            self.closed = True
+            self.app.update_skill_level()
+            self.app.user_data["last_session"] = datetime.now()
+            self.app.store.save(self.app.user_data)
+            self.server.sessions.pop(self.app.user_data["username"], None)
+
+
+class QuizServer:
+    """Line-oriented TCP quiz server running every learner in one asyncio process
+
+    Output lines are sent as-is; a line starting with "? " is a prompt and the
+    client answers it with one line.
+    """
+
+    def __init__(self, profiles_dir="profiles", flush_interval=2.0, metrics=None):
+        self.profiles_dir = profiles_dir
+        self.writer = ProfileWriter(flush_interval)
+        self.metrics = metrics  # Shared by every session when latency metrics are on
+        self.sessions = {}
+        os.makedirs(profiles_dir, exist_ok=True)
+
+    def open_profile(self, name, output):
+        store = AppendOnlyStore(os.path.join(self.profiles_dir, f"{name}.json"))
+        return CircleOfFifths(DeferredStore(store, self.writer), output=output, metrics=self.metrics)
+
+    async def send(self, writer, session, prompt):
+        text = "".join(line + "\n" for chunk in session.take_output() for line in chunk.split("\n"))
+        if prompt is not None:
+            text += "? " + prompt.strip() + "\n"
+        writer.write(text.encode("utf-8"))
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        session = QuizSession(self)
+        try:
+            await self.send(writer, session, session.start())
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                prompt = await session.handle(line.decode("utf-8", "replace").rstrip("\r\n"))
+                await self.send(writer, session, prompt)
+                if prompt is None:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            session.finish()
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=4096)
+        flusher = asyncio.create_task(self.writer.run())
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not supported on this platform; Ctrl+C still interrupts asyncio.run
+        print(f"Quiz server listening on {host}:{port} (profiles in {self.profiles_dir})")
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            flusher.cancel()
+            # Queue a final save for anyone still connected, then write everything out
+            for session in list(self.sessions.values()):
+                session.finish()
+            await self.writer.flush()
+            print(f"Quiz server stopped after {self.writer.writes} profile writes")
+
+
+def run_server(args):
+    """Entry point for `main.py serve`"""
+    metrics = Metrics() if args.metrics else None
+    server = QuizServer(args.profiles, args.flush_interval, metrics)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics is not None:
+            metrics.write(args.metrics)
@@ -0,0 +1,286 @@
+"""Monte Carlo learner simulator for comparing adaptive-difficulty policies, run with `main.py simulate`
+
+Synthetic learners answer the real exercise generators: only input() and the
+answer check are replaced, by a per-key recall probability that grows with
+practice and fades a little every simulated day. A policy overrides some of
+the CircleOfFifths adaptive rules (proficiency steps, progression thresholds,
+the key identification difficulty cap). Learner i starts with the same recall
+and learning and forgetting rates under every policy, so policies are
+compared on identical learners, and results do not depend on the number of
+workers.
+"""
+import json
+import os
+import random
+import sys
+from collections import Counter
+from multiprocessing import Pool
+
+from main import CircleOfFifths
+from questions import progression_level
+from storage import MemoryStore
+from theory import THEORY
+
+# Policy name -> CircleOfFifths attributes to override ("default" is the app as shipped)
+POLICIES = {
+    "default": {},
+    "fast": {"proficiency_step": 0.4, "progression_step": 0.6},
+    "slow": {"proficiency_step": 0.1, "progression_step": 0.15},
+    "early-progressions": {"progression_thresholds": (2, 4)},
+    "late-progressions": {"progression_thresholds": (5, 9)},
+    "easy-keys": {"max_difficulty": 1},
+}
+
+# Learner population -> ranges each learner's parameters are drawn from: starting recall per key,
+# share of the remaining gap closed by each question, and share of the gain lost per day
+LEARNERS = {
+    "novice": {"recall": (0.05, 0.35), "learn": (0.04, 0.12), "forget": (0.0, 0.02)},
+    "intermediate": {"recall": (0.3, 0.75), "learn": (0.04, 0.12), "forget": (0.0, 0.02)},
+    "uneven": {"recall": (0.05, 0.95), "learn": (0.02, 0.15), "forget": (0.0, 0.04)},
+}
+
+# Harder questions are answered less often (recall ** (1 + cost * (difficulty - 1))) but teach more
+DIFFICULTY_COST = 0.3
+DIFFICULTY_GAIN = 0.2
+
+# A learner has mastered the circle once every key is recalled at least this reliably
+MASTERY = 0.9
+
+# Exercises the learners choose from (uniformly), by steps generator name
+EXERCISE_STEPS = ("key_identification_steps", "chord_progression_steps", "relative_key_steps",
+                  "key_signature_steps")
+PROGRESSION_LEVELS = ("easy", "medium", "hard")
+
+EXERCISES_PER_DAY = 4
+MAX_QUESTIONS = 5000
+
+# Learners simulated per task handed to the pool
+CHUNK = 50
+
+DAY = 86400
+
+
+def silent(text=""):
+    pass
+
+
+class SyntheticLearner:
+    """Simulated student with a recall probability per key"""
+
+    def __init__(self, rng, recall, learn, forget):
+        self.rng = rng
+        self.recall = {key: rng.uniform(*recall) for key in THEORY.keys}
+        self.start = dict(self.recall)
+        self.learn = rng.uniform(*learn)
+        self.forget = rng.uniform(*forget)
+        self.asked = 0
+        self.correct = 0
+        self.wasted = 0  # Questions on keys that were already mastered
+
+    def answer(self, key, difficulty=1):
+        """Whether the learner gets a question on `key` right; either way, the feedback teaches"""
+        recall = self.recall[key]
+        if recall >= MASTERY:
+            self.wasted += 1
+        correct = self.rng.random() < recall ** (1 + DIFFICULTY_COST * (difficulty - 1))
+        gain = self.learn * (1 + DIFFICULTY_GAIN * (difficulty - 1))
+        self.recall[key] = recall + min(1.0, gain) * (1 - recall)
+        self.asked += 1
+        self.correct += correct
+        return correct
+
+    def rest(self):
+        """A day passes: recall slips back towards where the learner started"""
+        for key, recall in self.recall.items():
+            self.recall[key] = recall - self.forget * (recall - self.start[key])
+
+    def mastered(self):
+        return min(self.recall.values()) >= MASTERY
+
+    def mean_recall(self):
+        return sum(self.recall.values()) / len(self.recall)
+
+
+def run_exercise(steps):
+    """Run an exercise generator to the end (the answers are decided by the learner hook)"""
+    try:
+        next(steps)
+        while True:
+            steps.send("")
+    except StopIteration:
+        pass
+
+
+def simulate_learner(policy, population, seed, index, max_questions=MAX_QUESTIONS):
+    """Take learner `index` of the population through exercises until mastery or `max_questions`"""
+    learner = SyntheticLearner(random.Random(f"{seed}:{index}"), **LEARNERS[population])
+    start_recall = learner.mean_recall()
+    app = CircleOfFifths(MemoryStore(), output=silent, rng=random.Random(f"{seed}:{index}:questions"))
+    for name, value in POLICIES[policy].items():
+        setattr(app, name, value)
+    exercise_rng = random.Random(f"{seed}:{index}:exercises")
+
+    # Review due times follow simulated days rather than the wall clock
+    day = 0
+    app.scheduler.clock = lambda: day * DAY
+
+    # Note the key (and difficulty) of each question as the exercise draws it, so
+    # the learner can answer it; items name their key after the family
+    current = {"key": None, "difficulty": 1}
+    next_question, pick = app.next_question, app.scheduler.pick
+
+    def tracked_question(questions):
+        question = next_question(questions)
+        current["key"] = question.metadata["key"]
+        current["difficulty"] = question.metadata.get("difficulty") or 1
+        return question
+
+    def tracked_pick(rng, family):
+        item = pick(rng, family)
+        current["key"] = item.split(":")[1]
+        return item
+
+    app.next_question = tracked_question
+    app.scheduler.pick = tracked_pick
+    app.check_answer = lambda response, answer: learner.answer(current["key"], current["difficulty"])
+
+    exercises = 0
+    mastered = False
+    while learner.asked < max_questions:
+        name = exercise_rng.choice(EXERCISE_STEPS)
+        if name == "chord_progression_steps":
+            level = progression_level(app.user_data["skill_level"], app.progression_thresholds)
+            current["difficulty"] = PROGRESSION_LEVELS.index(level) + 1
+        run_exercise(getattr(app, name)())
+        exercises += 1
+        if learner.mastered():
+            mastered = True
+            break
+        if exercises % EXERCISES_PER_DAY == 0:
+            day += 1
+            learner.rest()
+    return {
+        "mastered": mastered,
+        "questions": learner.asked,
+        "exercises": exercises,
+        "days": day,
+        "correct": learner.correct,
+        "wasted": learner.wasted,
+        "recall_gain": learner.mean_recall() - start_recall,
+        # Skill level (1-10) as an estimate of true mean recall (0-1)
+        "calibration_error": abs((app.user_data["skill_level"] - 1) / 9 - learner.mean_recall()),
+    }
+
+
+class PolicyReport:
+    """Running totals for one policy; size depends on `max_questions`, not on the number of learners"""
+
+    def __init__(self):
+        self.learners = 0
+        self.mastered = 0
+        self.sessions = 0
+        self.totals = Counter()
+        self.mastery_questions = Counter()  # Questions to mastery -> learners
+        self.mastery_days = Counter()
+
+    def add(self, result):
+        self.learners += 1
+        self.sessions += -(-result["exercises"] // EXERCISES_PER_DAY)
+        for name in ("questions", "exercises", "correct", "wasted", "recall_gain", "calibration_error"):
+            self.totals[name] += result[name]
+        if result["mastered"]:
+            self.mastered += 1
+            self.mastery_questions[result["questions"]] += 1
+            self.mastery_days[result["days"]] += 1
+
+    def merge(self, other):
+        self.learners += other.learners
+        self.mastered += other.mastered
+        self.sessions += other.sessions
+        self.totals.update(other.totals)
+        self.mastery_questions.update(other.mastery_questions)
+        self.mastery_days.update(other.mastery_days)
+
+    def summary(self):
+        learners = self.learners or 1
+        questions = self.totals["questions"] or 1
+        return {
+            "learners": self.learners,
+            "sessions": self.sessions,
+            "mastered_share": self.mastered / learners,
+            "questions_to_mastery": distribution(self.mastery_questions),
+            "days_to_mastery": distribution(self.mastery_days),
+            "accuracy": self.totals["correct"] / questions,
+            # Question efficiency: how much of the practice went where it was still needed
+            "wasted_question_share": self.totals["wasted"] / questions,
+            "recall_points_per_100_questions": 100 * 100 * self.totals["recall_gain"] / questions,
+            "mean_exercises": self.totals["exercises"] / learners,
+            "mean_calibration_error": self.totals["calibration_error"] / learners,
+        }
+
+
+def distribution(counts):
+    """Mean and quantiles of a {value: count} histogram (None when it is empty)"""
+    total = sum(counts.values())
+    if not total:
+        return None
+    result = {"mean": sum(value * n for value, n in counts.items()) / total}
+    seen, values = 0, sorted(counts)
+    targets = [("p10", 0.1), ("median", 0.5), ("p90", 0.9)]
+    for value in values:
+        seen += counts[value]
+        while targets and seen >= targets[0][1] * total:
+            result[targets.pop(0)[0]] = value
+    return result
+
+
+def simulate_chunk(task):
+    """Simulate one chunk of learners under one policy and return the policy's partial report"""
+    policy, population, seed, start, count, max_questions = task
+    report = PolicyReport()
+    for index in range(start, start + count):
+        report.add(simulate_learner(policy, population, seed, index, max_questions))
+    return policy, report
+
+
+def simulate(policies, learners, population="novice", seed=0, workers=None, max_questions=MAX_QUESTIONS):
+    """Run `learners` synthetic learners under each policy and return {policy: summary}"""
+    workers = workers or os.cpu_count() or 1
+    reports = {policy: PolicyReport() for policy in policies}
+    tasks = ((policy, population, seed, start, min(CHUNK, learners - start), max_questions)
+             for start in range(0, learners, CHUNK) for policy in policies)
+    if workers == 1:
+        for policy, report in map(simulate_chunk, tasks):
+            reports[policy].merge(report)
+    else:
+        with Pool(workers) as pool:
+            # In task order, so float totals add up the same whatever the number of workers
+            for policy, report in pool.imap(simulate_chunk, tasks):
+                reports[policy].merge(report)
+    return {policy: reports[policy].summary() for policy in policies}
+
+
+def run_simulate(args):
+    """Entry point for `main.py simulate`"""
+    policies = args.policy or list(POLICIES)
+    unknown = sorted(set(policies) - set(POLICIES))
+    if unknown:
+        sys.exit(f"Unknown policy(s): {', '.join(unknown)}")
+    results = simulate(policies, args.learners, args.population, args.seed, args.workers, args.max_questions)
+    report = {
+        "population": args.population,
+        "seed": args.seed,
+        "max_questions": args.max_questions,
+        "policies": {policy: dict(POLICIES[policy]) for policy in policies},
+        "results": results,
+    }
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for policy, summary in results.items():
+        mastery = summary["questions_to_mastery"]
+        print(f"{policy}: {summary['mastered_share']:.0%} mastered"
+              + (f", median {mastery['median']} questions" if mastery else ""), file=sys.stderr)
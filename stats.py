@@ -0,0 +1,92 @@
+# Weight an answer keeps after each newer one, for the rolling accuracy (a half-life of about 14 answers)
+DECAY = 0.95
+
+# Fields of each counter: questions asked and answered correctly, the decayed
+# correct and asked weights behind the rolling accuracy, the current run of
+# correct answers and the longest run so far
+ASKED, CORRECT, RECENT_CORRECT, RECENT_WEIGHT, STREAK, BEST_STREAK = range(6)
+
+
+def new_counter():
+    return [0, 0, 0.0, 0.0, 0, 0]
+
+
+class AnswerStats:
+    """Answer counters kept up to date as each question is answered
+
+    `state` maps a counter name to a list of numbers (see the field indexes
+    above) and is stored in the profile as-is. "all" covers every answer;
+    "type:<exercise>", "key:<key>" and "difficulty:<n>" break them down, in
+    the same name:value style as the review schedule's items. Recording an
+    answer updates at most four counters, so progress views and difficulty
+    choices read ready-made numbers instead of scanning the history.
+    """
+
+    def __init__(self, state, decay=DECAY):
+        self.state = state
+        self.decay = decay
+        self.state.setdefault("all", new_counter())
+
+    @classmethod
+    def seeded(cls, state, exercises_completed, correct_answers):
+        """Stats for a profile saved before answers were counted
+
+        Only totals were kept then; every exercise is assumed to have had five
+        questions, as the old progress report did.
+        """
+        stats = cls(state)
+        overall = stats.state["all"]
+        if not overall[ASKED] and exercises_completed:
+            overall[ASKED] = max(correct_answers, exercises_completed * 5)
+            overall[CORRECT] = correct_answers
+        return stats
+
+    def _update(self, name, correct):
+        counter = self.state.get(name)
+        if counter is None:
+            counter = self.state[name] = new_counter()
+        counter[ASKED] += 1
+        counter[RECENT_WEIGHT] = counter[RECENT_WEIGHT] * self.decay + 1
+        counter[RECENT_CORRECT] *= self.decay
+        if correct:
+            counter[CORRECT] += 1
+            counter[RECENT_CORRECT] += 1
+            counter[STREAK] += 1
+            if counter[STREAK] > counter[BEST_STREAK]:
+                counter[BEST_STREAK] = counter[STREAK]
+        else:
+            counter[STREAK] = 0
+
+    def record(self, correct, exercise=None, key=None, difficulty=None):
+        """Count one answered question"""
+        self._update("all", correct)
+        if exercise is not None:
+            self._update(f"type:{exercise}", correct)
+        if key is not None:
+            self._update(f"key:{key}", correct)
+        if difficulty is not None:
+            self._update(f"difficulty:{difficulty}", correct)
+
+    def counter(self, name="all"):
+        return self.state.get(name) or new_counter()
+
+    def accuracy(self, name="all"):
+        """Share of questions answered correctly, in percent (None before any answer)"""
+        counter = self.counter(name)
+        return 100 * counter[CORRECT] / counter[ASKED] if counter[ASKED] else None
+
+    def recent_accuracy(self, name="all"):
+        """Accuracy with older answers exponentially discounted, in percent (None before any answer)"""
+        counter = self.counter(name)
+        return 100 * counter[RECENT_CORRECT] / counter[RECENT_WEIGHT] if counter[RECENT_WEIGHT] else None
+
+    def streak(self, name="all"):
+        """Current and best run of correct answers"""
+        counter = self.counter(name)
+        return counter[STREAK], counter[BEST_STREAK]
+
+    def breakdown(self, family):
+        """{value: counter} for every counter in a family ("type", "key" or "difficulty")"""
+        prefix = family + ":"
+        return {name[len(prefix):]: counter for name, counter in self.state.items() if name.startswith(prefix)}
+
@@ -0,0 +1,798 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from history import FIELDS, HistoryColumns
+from jsonstream import index_object, read_values
+
+# Write a binary image of the history once this many records are not covered by it
+COMPACT_EVERY = 1000
+
+# Saves only read a history this long into memory to compact it; longer ones are
+# compacted when something else (such as a chart) has already loaded them
+COMPACT_LOAD_LIMIT = 100000
+
+# Inline history entries moved to the log per write when migrating an old profile
+MIGRATE_BATCH = 10000
+
+
+class ProfileStore:
+    """Interface for places a learner profile can be kept"""
+
+    def exists(self):
+        raise NotImplementedError
+
+    def new_history(self):
+        raise NotImplementedError
+
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, user_data):
+        raise NotImplementedError
+
+    def username_available(self, username):
+        return True
+
+    def mark_dirty(self, user_data):
+        """Note an unsaved change; stores that write behind persist it soon after"""
+
+    def set_aside(self):
+        """Move an unreadable profile out of the way, returning where it went (if anywhere)"""
+        return None
+
+    def close(self):
+        pass
+
+
+def write_atomic(path, data):
+    """Replace `path` with `data` so a crash leaves either the old or the new file, never half of one"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def detached(user_data):
+    """Copy of a profile that another thread can save while the session keeps changing it
+
+    Profile values are scalars or dicts of scalars/lists of numbers (key
+    proficiency, the review schedule), so copying two levels deep is enough and
+    much cheaper than a deepcopy. The history is shared rather than copied, as
+    a HistoryPrefix of its current length: the save writes only the entries
+    that existed when the counters were copied, never ones added later.
+    """
+    snapshot = {}
+    for name, value in user_data.items():
+        if isinstance(value, dict):
+            value = {k: list(v) if isinstance(v, list) else v for k, v in value.items()}
+        snapshot[name] = value
+    history = user_data["exercise_history"]
+    snapshot["exercise_history"] = HistoryPrefix(*saved_history(history))
+    return snapshot
+
+
+class HistoryPrefix:
+    """The first `length` entries of a shared history that may still grow, as copied by detached()"""
+
+    def __init__(self, history, length):
+        self.history = history
+        self.length = length
+
+
+def saved_history(history):
+    """The history object a profile to be saved refers to, and how many of its entries to save"""
+    if isinstance(history, HistoryPrefix):
+        return history.history, history.length
+    return history, len(history)
+
+
+class HistoryLog:
+    """List-like view of the exercise history backed by an append-only JSON-lines file"""
+
+    def __init__(self, path, length=0, size=0, image=None):
+        self.path = path
+        self.image_path = os.path.splitext(path)[0] + ".bin"
+        self._length = length  # Records already written to the log
+        self._size = size  # Byte size of the log covering those records
+        self._image = image  # (records, log bytes) covered by the binary image, if any
+        self._loaded = None  # Persisted records as HistoryColumns, read on first full access
+        self._pending = []  # Records appended since the last flush
+
+    def append(self, entry):
+        self._pending.append(entry)
+
+    def __len__(self):
+        return self._length + len(self._pending)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        yield from self._iter_persisted()
+        yield from self._pending
+
+    def __reversed__(self):
+        """Yield entries newest first, reading the log backwards a block at a time"""
+        yield from reversed(self._pending)
+        if self._loaded is not None:
+            for i in range(len(self._loaded) - 1, -1, -1):
+                yield self._loaded.entry(i)
+            return
+        if not self._length:
+            return
+        block = 65536
+        rest = b""
+        with open(self.path, "rb") as f:
+            pos = self._size
+            while pos > 0:
+                step = min(block, pos)
+                pos -= step
+                f.seek(pos)
+                lines = (f.read(step) + rest).split(b"\n")
+                # The first line may continue in the block before
+                rest = lines.pop(0) if pos > 0 else b""
+                for line in reversed(lines):
+                    if line.strip():
+                        yield json.loads(line)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1 and stop == len(self) and self._length - start <= 64:
+                # Recent entries only need the tail of the log
+                return self._tail(max(0, self._length - start)) + self._pending[max(0, start - self._length):]
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("history index out of range")
+        if index >= self._length:
+            return self._pending[index - self._length]
+        return self._persisted()[index]
+
+    def recent(self, count):
+        """Return the last `count` entries, oldest first"""
+        return self[-count:] if count else []
+
+    def between(self, start=None, end=None, exercise_type=None):
+        """Yield entries dated within [start, end], optionally of a single exercise type"""
+        for entry in self:
+            date = str(entry["date"])
+            if (exercise_type is None or entry["type"] == exercise_type) and \
+                    (start is None or date >= str(start)) and (end is None or date <= str(end)):
+                yield entry
+
+    def _read_image(self):
+        """The binary image of the history as (HistoryColumns, log offset it covers), if usable"""
+        if self._image and self._image[0] <= self._length and os.path.exists(self.image_path):
+            with open(self.image_path, "rb") as f:
+                columns = HistoryColumns.from_bytes(f.read())
+            if len(columns) == self._image[0]:
+                return columns, self._image[1]
+        return None, 0
+
+    def _log_records(self, offset):
+        """Parse log records from byte `offset` up to the end covered by the snapshot, one line at a time"""
+        remaining = self._size - offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                if line.strip():
+                    yield json.loads(line)
+
+    def _iter_persisted(self):
+        """Yield persisted records without keeping them, unless they are already loaded"""
+        if self._loaded is not None:
+            yield from self._loaded
+            return
+        columns, offset = self._read_image()
+        if columns is not None:
+            yield from columns
+        if self._length > (len(columns) if columns is not None else 0):
+            yield from self._log_records(offset)
+
+    def _persisted(self):
+        """Read every record in the log into HistoryColumns (cached after the first call)
+
+        When a binary image of the history exists, it is loaded directly and
+        only the log records written after it are parsed.
+        """
+        if self._loaded is None:
+            columns, offset = self._read_image()
+            if columns is None:
+                columns = HistoryColumns()
+            if self._length > len(columns):
+                columns.extend(self._log_records(offset))
+            self._loaded = columns
+        return self._loaded
+
+    def compact(self):
+        """Write the loaded history as a binary image so later loads can skip parsing the log"""
+        if self._loaded is None:
+            return False
+        write_atomic(self.image_path, self._loaded.to_bytes())
+        self._image = (self._length, self._size)
+        return True
+
+    def _tail(self, count):
+        """Read the last `count` persisted records without scanning the whole log"""
+        if count == 0:
+            return []
+        if self._loaded is not None:
+            return self._loaded[-count:]
+        block = 8192
+        data = b""
+        with open(self.path, "rb") as f:
+            pos = self._size
+            while pos > 0 and data.count(b"\n") <= count:
+                step = min(block, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        lines = [line for line in data.splitlines() if line.strip()]
+        return [json.loads(line) for line in lines[-count:]]
+
+    def flush(self, length=None):
+        """Append pending records to the log, returning how many were written
+
+        With `length`, only records before that position in the history are written.
+        """
+        count = len(self._pending)
+        if length is not None:
+            count = max(0, min(count, length - self._length))
+        if not count:
+            return 0
+        # Take the records first so entries appended while writing wait for the next flush
+        pending = self._pending[:count]
+        del self._pending[:count]
+        payload = "".join(
+            json.dumps(entry, separators=(",", ":"), default=str) + "\n" for entry in pending
+        ).encode("utf-8")
+        try:
+            with open(self.path, "ab") as f:
+                # Drop anything written after the last snapshot (e.g. an interrupted save)
+                f.truncate(self._size)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            self._pending[:0] = pending
+            raise
+        if self._loaded is not None:
+            self._loaded.extend(pending)
+        self._length += len(pending)
+        self._size += len(payload)
+        return len(pending)
+
+
+class InlineHistory:
+    """Read-only view of the history array inside a profile saved before the history log existed
+
+    Only the file offset of each entry is kept; entries are parsed from the file
+    when they are read. New entries wait in memory until the first save moves
+    the whole history to a log. From then on the view forwards to that log:
+    the save rewrites the profile file, and a session may still hold the view.
+    """
+
+    def __init__(self, path, offsets):
+        self.path = path
+        self.offsets = offsets
+        self.log = None  # The HistoryLog the history was moved to, once saved
+        self._pending = []
+        self._lock = threading.Lock()  # Guards _pending and log while the history moves
+
+    def append(self, entry):
+        with self._lock:
+            if self.log is None:
+                self._pending.append(entry)
+                return
+        self.log.append(entry)
+
+    def move_to(self, log):
+        """Copy the history into `log` a batch at a time and forward to it from then on, returning the log"""
+        if self.log is None:
+            for entry in self._read(0, len(self.offsets)):
+                log.append(entry)
+                if len(log._pending) >= MIGRATE_BATCH:
+                    log.flush()
+            with self._lock:
+                for entry in self._pending:
+                    log.append(entry)
+                self._pending = []
+                self.log = log
+        return self.log
+
+    def __len__(self):
+        if self.log is not None:
+            return len(self.log)
+        return len(self.offsets) + len(self._pending)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def _read(self, start, stop):
+        if start < stop:
+            with open(self.path, "rb") as f:
+                yield from read_values(f, self.offsets[start], stop - start)
+
+    def __iter__(self):
+        if self.log is not None:
+            yield from self.log
+            return
+        yield from self._read(0, len(self.offsets))
+        yield from self._pending
+
+    def __reversed__(self):
+        if self.log is not None:
+            yield from reversed(self.log)
+            return
+        yield from reversed(self._pending)
+        with open(self.path, "rb") as f:
+            for offset in reversed(self.offsets):
+                yield from read_values(f, offset, 1)
+
+    def __getitem__(self, index):
+        if self.log is not None:
+            return self.log[index]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            stored = len(self.offsets)
+            return list(self._read(min(start, stored), min(stop, stored))) + \
+                self._pending[max(0, start - stored):max(0, stop - stored)]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("history index out of range")
+        if index >= len(self.offsets):
+            return self._pending[index - len(self.offsets)]
+        return next(self._read(index, index + 1))
+
+    def recent(self, count):
+        """Return the last `count` entries, oldest first"""
+        return self[-count:] if count else []
+
+    def between(self, start=None, end=None, exercise_type=None):
+        """Yield entries dated within [start, end], optionally of a single exercise type"""
+        for entry in self:
+            date = str(entry["date"])
+            if (exercise_type is None or entry["type"] == exercise_type) and \
+                    (start is None or date >= str(start)) and (end is None or date <= str(end)):
+                yield entry
+
+
+class AppendOnlyStore(ProfileStore):
+    """Profile storage split into a small JSON snapshot and an append-only history log
+
+    The snapshot holds the username, counters and key proficiency and is rewritten on
+    every save, but it never grows with the history. Exercise history entries are
+    appended to a JSON-lines log, so a save only writes the records added since the
+    previous one. The snapshot remembers how much of the log it covers, which lets a
+    load skip reading the log entirely until the history is actually needed.
+    Every COMPACT_EVERY records the history is also written as a binary
+    HistoryColumns image, so a full read only parses the log records after it.
+    """
+
+    def __init__(self, path="circle_of_fifths_user_data.json", log_path=None):
+        self.path = path
+        self.log_path = log_path or os.path.splitext(path)[0] + "_history.jsonl"
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def new_history(self):
+        return HistoryLog(self.log_path)
+
+    def load(self):
+        """Load the snapshot and attach a lazy view of the history log
+
+        Loading never writes. The snapshot is parsed incrementally. Older
+        profiles keep the whole history inline; only the file offset of each
+        entry is noted, and the first save moves the history to the log, so
+        memory use does not grow with the history.
+        """
+        with open(self.path, "rb") as f:
+            user_data, offsets = index_object(f, "exercise_history")
+
+        meta = user_data.pop("history_log", None)
+        if meta is None:
+            history = InlineHistory(self.path, offsets if offsets is not None else [])
+        else:
+            history = HistoryLog(self.log_path, meta["length"], meta["size"], meta.get("image"))
+            if meta["length"] and not os.path.exists(self.log_path):
+                raise FileNotFoundError(f"History log {self.log_path} is missing")
+        user_data["exercise_history"] = history
+        return user_data
+
+    def save(self, user_data):
+        """Append new history records and rewrite the snapshot"""
+        history, length = saved_history(user_data["exercise_history"])
+        if isinstance(history, InlineHistory):
+            # An older profile: the session's view keeps working on the log it moves to
+            history = user_data["exercise_history"] = history.move_to(self.new_history())
+        elif not isinstance(history, HistoryLog):
+            # A history kept in memory: move it to the log a batch at a time
+            converted = self.new_history()
+            for entry in history:
+                converted.append(entry)
+                if len(converted._pending) >= MIGRATE_BATCH:
+                    converted.flush()
+            history = user_data["exercise_history"] = converted
+        history.flush(length)
+        covered = history._image[0] if history._image else 0
+        if history._length - covered >= COMPACT_EVERY and \
+                (history._loaded is not None or history._length <= COMPACT_LOAD_LIMIT):
+            history._persisted()
+            history.compact()
+        self._write_snapshot(user_data, history)
+
+    def _write_snapshot(self, user_data, history):
+        snapshot = {k: v for k, v in user_data.items() if k != "exercise_history"}
+        snapshot["history_log"] = {"length": history._length, "size": history._size, "image": history._image}
+        write_atomic(self.path, json.dumps(snapshot, indent=4, default=str).encode("utf-8"))
+
+    def set_aside(self):
+        """Rename the snapshot, log and image with a .damaged suffix so a new profile starts clean"""
+        suffix = time.strftime(".damaged-%Y%m%d-%H%M%S")
+        log_image = os.path.splitext(self.log_path)[0] + ".bin"
+        for path in (self.path, self.log_path, log_image):
+            if os.path.exists(path):
+                os.replace(path, path + suffix)
+        return self.path + suffix
+
+
+class SQLiteHistory:
+    """List-like view of one user's rows in the exercise_history table"""
+
+    def __init__(self, store):
+        self.store = store
+        self._length = None
+        self._pending = []
+
+    def append(self, entry):
+        self._pending.append(entry)
+
+    def _stored(self):
+        """Number of rows already in the table (counted on first use)"""
+        if self._length is None:
+            row = self.store.conn.execute(
+                "SELECT COUNT(*) FROM exercise_history WHERE username = ?", (self.store.username,)
+            ).fetchone()
+            self._length = row[0]
+        return self._length
+
+    def __len__(self):
+        return self._stored() + len(self._pending)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        yield from self.between()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1 and stop == len(self):
+                return self.recent(stop - start)
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("history index out of range")
+        return list(self)[index]
+
+    def recent(self, count):
+        """Return the last `count` entries, oldest first"""
+        if count <= 0:
+            return []
+        pending = self._pending[-count:]
+        needed = count - len(pending)
+        rows = []
+        if needed:
+            rows = self.store.conn.execute(
+                "SELECT date, type, score, difficulty, key, extra FROM exercise_history "
+                "WHERE username = ? ORDER BY id DESC LIMIT ?",
+                (self.store.username, needed),
+            ).fetchall()
+        return [self._entry(row) for row in reversed(rows)] + pending
+
+    def between(self, start=None, end=None, exercise_type=None):
+        """Yield entries dated within [start, end], optionally of a single exercise type"""
+        query = "SELECT date, type, score, difficulty, key, extra FROM exercise_history WHERE username = ?"
+        params = [self.store.username]
+        if exercise_type is not None:
+            query += " AND type = ?"
+            params.append(exercise_type)
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(str(start))
+        if end is not None:
+            query += " AND date <= ?"
+            params.append(str(end))
+        for row in self.store.conn.execute(query + " ORDER BY id", params):
+            yield self._entry(row)
+        for entry in self._pending:
+            date = str(entry["date"])
+            if (exercise_type is None or entry["type"] == exercise_type) and \
+                    (start is None or date >= str(start)) and (end is None or date <= str(end)):
+                yield entry
+
+    def __reversed__(self):
+        """Yield entries newest first"""
+        yield from reversed(self._pending)
+        rows = self.store.conn.execute(
+            "SELECT date, type, score, difficulty, key, extra FROM exercise_history "
+            "WHERE username = ? ORDER BY id DESC",
+            (self.store.username,),
+        )
+        for row in rows:
+            yield self._entry(row)
+
+    @staticmethod
+    def _entry(row):
+        entry = {"date": row[0], "type": row[1], "score": row[2]}
+        if row[3] is not None:
+            entry["difficulty"] = row[3]
+        if row[4] is not None:
+            entry["key"] = row[4]
+        if row[5] is not None:
+            entry.update(json.loads(row[5]))
+        return entry
+
+    @staticmethod
+    def _extra(entry):
+        """Compact JSON of the fields without a column of their own (such as the sync ID), if any"""
+        extra = {name: value for name, value in entry.items() if name not in FIELDS}
+        return json.dumps(extra, separators=(",", ":"), default=str) if extra else None
+
+    def flush(self, length=None):
+        """Insert pending entries, returning how many were written
+
+        With `length`, only entries before that position in the history are written.
+        """
+        count = len(self._pending)
+        if length is not None:
+            count = max(0, min(count, length - self._stored()))
+        if not count:
+            return 0
+        pending = self._pending[:count]
+        self.store.conn.executemany(
+            "INSERT INTO exercise_history (username, type, date, score, difficulty, key, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(self.store.username, e["type"], str(e["date"]), e["score"],
+              e.get("difficulty"), e.get("key"), self._extra(e)) for e in pending],
+        )
+        del self._pending[:count]
+        if self._length is not None:
+            self._length += count
+        return count
+
+
+class SQLiteProfileStore(ProfileStore):
+    """Multi-user profile store keeping one row per user in a SQLite database
+
+    A single connection is opened for the whole session. History lives in an
+    exercise_history table indexed by (username, type, date), so progress views
+    fetch only the rows they display instead of the full history.
+    """
+
+    def __init__(self, path, username):
+        self.path = path
+        self.username = username
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                exercises_completed INTEGER NOT NULL,
+                correct_answers INTEGER NOT NULL,
+                skill_level REAL NOT NULL,
+                key_proficiency TEXT NOT NULL,
+                last_session TEXT,
+                schedule TEXT,
+                stats TEXT,
+                sync TEXT
+            );
+            CREATE TABLE IF NOT EXISTS exercise_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                type TEXT NOT NULL,
+                date TEXT NOT NULL,
+                score REAL NOT NULL,
+                difficulty INTEGER,
+                key TEXT,
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_user_type_date
+                ON exercise_history (username, type, date);
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(users)")}
+        if "schedule" not in columns:
+            # Databases created before spaced repetition was added
+            self.conn.execute("ALTER TABLE users ADD COLUMN schedule TEXT")
+        if "stats" not in columns:
+            # Databases created before answers were counted
+            self.conn.execute("ALTER TABLE users ADD COLUMN stats TEXT")
+        if "sync" not in columns:
+            # Databases created before profiles could be synced
+            self.conn.execute("ALTER TABLE users ADD COLUMN sync TEXT")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(exercise_history)")}
+        if "extra" not in columns:
+            # Databases created before entries carried answers, gains and sync IDs
+            self.conn.execute("ALTER TABLE exercise_history ADD COLUMN extra TEXT")
+
+    def exists(self):
+        row = self.conn.execute("SELECT 1 FROM users WHERE username = ?", (self.username,)).fetchone()
+        return row is not None
+
+    def username_available(self, username):
+        row = self.conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+        return row is None
+
+    def new_history(self):
+        return SQLiteHistory(self)
+
+    def load(self):
+        row = self.conn.execute(
+            "SELECT username, exercises_completed, correct_answers, skill_level, key_proficiency, last_session, "
+            "schedule, stats, sync FROM users WHERE username = ?",
+            (self.username,),
+        ).fetchone()
+        user_data = {
+            "username": row[0],
+            "exercises_completed": row[1],
+            "correct_answers": row[2],
+            "skill_level": row[3],
+            "key_proficiency": json.loads(row[4]),
+            "exercise_history": self.new_history(),
+            "schedule": json.loads(row[6] or "{}"),
+            "stats": json.loads(row[7] or "{}"),
+            "last_session": row[5],
+        }
+        if row[8] is not None:
+            user_data["sync"] = json.loads(row[8])
+        return user_data
+
+    def save(self, user_data):
+        history, length = saved_history(user_data["exercise_history"])
+        if not isinstance(history, SQLiteHistory):
+            converted = self.new_history()
+            for entry in history:
+                converted.append(entry)
+            history = user_data["exercise_history"] = converted
+        last_session = user_data["last_session"]
+        with self.conn:
+            if user_data["username"] != self.username:
+                # change_username: move the profile and its history to the new name
+                self.conn.execute("UPDATE users SET username = ? WHERE username = ?",
+                                  (user_data["username"], self.username))
+                self.conn.execute("UPDATE exercise_history SET username = ? WHERE username = ?",
+                                  (user_data["username"], self.username))
+                self.username = user_data["username"]
+            self.conn.execute(
+                "INSERT INTO users (username, exercises_completed, correct_answers, skill_level, "
+                "key_proficiency, last_session, schedule, stats, sync) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET exercises_completed = excluded.exercises_completed, "
+                "correct_answers = excluded.correct_answers, skill_level = excluded.skill_level, "
+                "key_proficiency = excluded.key_proficiency, last_session = excluded.last_session, "
+                "schedule = excluded.schedule, stats = excluded.stats, sync = excluded.sync",
+                (self.username, user_data["exercises_completed"], user_data["correct_answers"],
+                 user_data["skill_level"], json.dumps(user_data["key_proficiency"]),
+                 None if last_session is None else str(last_session),
+                 json.dumps(user_data.get("schedule", {})), json.dumps(user_data.get("stats", {})),
+                 None if user_data.get("sync") is None else json.dumps(user_data["sync"])),
+            )
+            history.flush(length)
+
+    def close(self):
+        self.conn.close()
+
+
+class MemoryStore(ProfileStore):
+    """Profile kept in memory only, for simulated learners and other throwaway sessions"""
+
+    def __init__(self):
+        self.user_data = None
+
+    def exists(self):
+        return self.user_data is not None
+
+    def new_history(self):
+        return HistoryColumns()
+
+    def load(self):
+        return self.user_data
+
+    def save(self, user_data):
+        self.user_data = user_data
+
+
+class WriteBehindStore(ProfileStore):
+    """Wraps another store so saves are coalesced and written on a background thread
+
+    save() and mark_dirty() only take a copy of the profile; the newest copy is
+    written `delay` seconds after the first unsaved change, so a burst of
+    changes costs one write. flush() writes immediately and close() flushes
+    before closing, so nothing is lost on a clean exit. `requested` counts save
+    requests and `writes` the writes that actually reached the inner store.
+    """
+
+    def __init__(self, inner, delay=2.0):
+        self.inner = inner
+        self.delay = delay
+        self.requested = 0
+        self.writes = 0
+        self._pending = None
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()  # Guards _pending and _timer
+        self._write_lock = threading.Lock()  # One write at a time, in order
+
+    def exists(self):
+        return self.inner.exists()
+
+    def new_history(self):
+        return self.inner.new_history()
+
+    def load(self):
+        return self.inner.load()
+
+    def username_available(self, username):
+        return self.inner.username_available(username)
+
+    def set_aside(self):
+        return self.inner.set_aside()
+
+    def save(self, user_data):
+        snapshot = detached(user_data)
+        with self._lock:
+            self.requested += 1
+            self._pending = snapshot
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    mark_dirty = save
+
+    def flush(self):
+        """Write the newest pending copy now, returning whether anything was written"""
+        with self._write_lock:
+            with self._lock:
+                snapshot, self._pending = self._pending, None
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if snapshot is None:
+                return False
+            try:
+                self.inner.save(snapshot)
+            except Exception:
+                with self._lock:
+                    if self._pending is None:
+                        self._pending = snapshot  # Retry on the next flush
+                raise
+            self.writes += 1
+            return True
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.flush()
+            self.inner.close()
@@ -0,0 +1,326 @@
+"""Profile sync between machines, run with `main.py sync`
+
+Each profile is a node with a random name. Every history entry it records gets
+an ID "<milliseconds>-<node>-<sequence>" in fixed-width hex, where the sequence
+counts the node's own entries. The time part is a hybrid clock that never falls
+behind an ID the profile has already seen, so IDs are unique and sort in the
+order the entries were made (entries older than sync sort first, by
+position). Entries also carry the answers and proficiency
+gains of their exercise, which is what the counters are recomputed from.
+
+A profile remembers the highest sequence number it holds from every node
+(`seen`). Entries always travel in sequence order, so that vector says exactly
+which entries another profile lacks, and they are found by reading the history
+backwards from the newest. After a merge the counters, key proficiency and
+answer statistics equal those of a replay of the merged log in ID order,
+starting from each node's baseline: its counters when it started syncing,
+which stand for its older entries without answers. When every new entry sorts
+after those already held (the usual case of one machine at a time), the replay
+carries on from the current state, so a sync costs time in proportion to the
+new entries; otherwise the whole log is replayed.
+"""
+import json
+import os
+import socket
+import sys
+import time
+
+from stats import BEST_STREAK, STREAK, new_counter
+from storage import write_atomic
+
+# Entries per file written to a shared sync directory
+CHUNK_ENTRIES = 5000
+
+BASELINE_FILE = "baseline.json"
+
+# Fields of an answer counter that add up across nodes (the others are streaks)
+ADDED_FIELDS = range(STREAK)
+
+
+def make_id(millis, node, seq):
+    return f"{millis:012x}-{node}-{seq:08x}"
+
+
+def parse_id(entry_id):
+    """(milliseconds, node, sequence) of an entry ID"""
+    millis, node, seq = entry_id.split("-")
+    return int(millis, 16), node, int(seq, 16)
+
+
+def baseline(user_data):
+    """What a profile had counted when it started syncing, standing in for its untagged history"""
+    return {
+        "exercises": user_data["exercises_completed"],
+        "correct": user_data["correct_answers"],
+        "gains": {key: p - 1 for key, p in user_data["key_proficiency"].items() if p != 1},
+        "stats": {name: list(counter) for name, counter in user_data.get("stats", {}).items()},
+    }
+
+
+def replay(user_data, stats, entry):
+    """Count an exercise's answers and proficiency gains as if it had just been done"""
+    answers = entry["answers"]
+    user_data["exercises_completed"] += 1
+    user_data["correct_answers"] += sum(answer[1] for answer in answers)
+    proficiency = user_data["key_proficiency"]
+    for key, gain in entry["gains"].items():
+        if key in proficiency:
+            # Gains are never negative, so capping each one equals capping the total
+            proficiency[key] = min(10, proficiency[key] + gain)
+    for answer in answers:
+        stats.record(bool(answer[1]), entry["type"], answer[0], answer[2] if len(answer) > 2 else None)
+
+
+class SyncState:
+    """Sync bookkeeping kept in the profile under "sync" (see the module docstring)"""
+
+    def __init__(self, state):
+        self.state = state
+
+    @classmethod
+    def attach(cls, user_data):
+        """Sync state of a profile, starting it (as a new node) if the profile has none"""
+        state = user_data.get("sync")
+        if state is None:
+            node = os.urandom(4).hex()
+            # Entries already in the history belong to this node, numbered in order
+            legacy = len(user_data["exercise_history"])
+            state = user_data["sync"] = {
+                "node": node,
+                "seq": legacy,
+                "legacy": legacy,
+                "clock": 0,
+                "last_id": "",
+                "seen": {node: legacy},
+                "published": 0,
+                "baselines": {node: baseline(user_data)},
+            }
+        return cls(state)
+
+    @property
+    def node(self):
+        return self.state["node"]
+
+    def tag(self, entry):
+        """Give a new entry of this node the next ID"""
+        state = self.state
+        state["seq"] += 1
+        state["clock"] = max(int(time.time() * 1000), state["clock"] + 1)
+        entry["id"] = state["last_id"] = make_id(state["clock"], state["node"], state["seq"])
+        state["seen"][state["node"]] = state["seq"]
+
+    def entry_id(self, entry, index):
+        """ID of the history entry at `index`
+
+        Entries older than sync are numbered by position with a time part of
+        zero: their dates are naive local times that may sort after the
+        node's first tagged entry, and IDs must follow sequence order.
+        """
+        entry_id = entry.get("id")
+        if entry_id is None and index < self.state["legacy"]:
+            entry_id = make_id(0, self.node, index + 1)
+        return entry_id
+
+    def missing(self, history, seen, nodes=None):
+        """Entries held here that a profile which has seen `seen` lacks, in ID order
+
+        Only the newest part of the history is read: the scan stops as soon as
+        every missing entry has been found.
+        """
+        wanted = sum(max(0, held - seen.get(node, 0)) for node, held in self.state["seen"].items()
+                     if nodes is None or node in nodes)
+        found = []
+        index = len(history)
+        for entry in reversed(history):
+            if len(found) == wanted:
+                break
+            index -= 1
+            entry_id = self.entry_id(entry, index)
+            if entry_id is None:
+                continue
+            _, node, seq = parse_id(entry_id)
+            if seq > seen.get(node, 0) and (nodes is None or node in nodes):
+                found.append(dict(entry, id=entry_id, date=str(entry["date"])))
+        found.sort(key=lambda entry: entry["id"])
+        return found
+
+    def merge(self, user_data, stats, entries, baselines=None):
+        """Add the entries and node baselines this profile lacks and recompute its counters
+
+        `entries` are in ID order; ones already held are skipped. Returns the
+        number of entries added.
+        """
+        state = self.state
+        seen = state["seen"]
+        new = []
+        for entry in entries:
+            millis, node, seq = parse_id(entry["id"])
+            if seq <= seen.get(node, 0):
+                continue
+            if seq != seen.get(node, 0) + 1:
+                raise ValueError(f"Entries of node {node} are missing before {entry['id']}")
+            seen[node] = seq
+            state["clock"] = max(state["clock"], millis)
+            new.append(entry)
+        new_baselines = {node: data for node, data in (baselines or {}).items() if node not in state["baselines"]}
+        state["baselines"].update(new_baselines)
+
+        history = user_data["exercise_history"]
+        for entry in new:
+            history.append(entry)
+        if new_baselines or (new and new[0]["id"] < state["last_id"]):
+            self.rebuild(user_data, stats)
+        else:
+            for entry in new:
+                if "answers" in entry:
+                    replay(user_data, stats, entry)
+        if new:
+            state["last_id"] = max(state["last_id"], new[-1]["id"])
+        user_data["skill_level"] = sum(user_data["key_proficiency"].values()) / len(user_data["key_proficiency"])
+        return len(new)
+
+    def rebuild(self, user_data, stats):
+        """Recompute counters, proficiency and answer statistics from the baselines and the whole log"""
+        baselines = [self.state["baselines"][node] for node in sorted(self.state["baselines"])]
+        user_data["exercises_completed"] = sum(data["exercises"] for data in baselines)
+        user_data["correct_answers"] = sum(data["correct"] for data in baselines)
+        proficiency = user_data["key_proficiency"]
+        for key in proficiency:
+            proficiency[key] = min(10, 1 + sum(data["gains"].get(key, 0) for data in baselines))
+
+        # Stats are updated in place: the session's AnswerStats wraps the same dict
+        stats.state.clear()
+        for data in baselines:
+            for name, counter in data["stats"].items():
+                total = stats.state.setdefault(name, new_counter())
+                for field in ADDED_FIELDS:
+                    total[field] += counter[field]
+                total[STREAK] = max(total[STREAK], counter[STREAK])
+                total[BEST_STREAK] = max(total[BEST_STREAK], counter[BEST_STREAK])
+        stats.state.setdefault("all", new_counter())
+
+        tagged = []
+        for index, entry in enumerate(user_data["exercise_history"]):
+            if "answers" in entry:
+                tagged.append((self.entry_id(entry, index), entry))
+        tagged.sort(key=lambda pair: pair[0])
+        for _, entry in tagged:
+            replay(user_data, stats, entry)
+
+    def sync_directory(self, user_data, stats, path):
+        """Publish this node's new entries to a shared directory and merge everyone else's
+
+        Each node writes only its own entries, as files named by the range of
+        sequence numbers they hold, so files are never rewritten and a sync
+        reads just the files with entries this profile lacks. Returns
+        (entries published, entries merged).
+        """
+        state = self.state
+        own = os.path.join(path, self.node)
+        os.makedirs(own, exist_ok=True)
+        if not os.path.exists(os.path.join(own, BASELINE_FILE)):
+            write_atomic(os.path.join(own, BASELINE_FILE),
+                         json.dumps(state["baselines"][self.node]).encode("utf-8"))
+        published = self.missing(user_data["exercise_history"], {self.node: state["published"]}, {self.node})
+        for start in range(0, len(published), CHUNK_ENTRIES):
+            chunk = published[start:start + CHUNK_ENTRIES]
+            first, last = parse_id(chunk[0]["id"])[2], parse_id(chunk[-1]["id"])[2]
+            write_atomic(os.path.join(own, f"{first:08x}-{last:08x}.jsonl"), "".join(
+                json.dumps(entry, separators=(",", ":"), default=str) + "\n" for entry in chunk
+            ).encode("utf-8"))
+            state["published"] = last
+
+        entries, baselines = [], {}
+        for node in sorted(os.listdir(path)):
+            folder = os.path.join(path, node)
+            if node == self.node or not os.path.isdir(folder):
+                continue
+            if node not in state["baselines"] and os.path.exists(os.path.join(folder, BASELINE_FILE)):
+                with open(os.path.join(folder, BASELINE_FILE)) as f:
+                    baselines[node] = json.load(f)
+            held = state["seen"].get(node, 0)
+            for name in sorted(os.listdir(folder)):
+                if not name.endswith(".jsonl") or int(name[9:17], 16) <= held:
+                    continue
+                with open(os.path.join(folder, name)) as f:
+                    entries.extend(entry for entry in map(json.loads, f) if parse_id(entry["id"])[2] > held)
+        entries.sort(key=lambda entry: entry["id"])
+        return len(published), self.merge(user_data, stats, entries, baselines)
+
+    def request(self):
+        """What this profile tells the other side of a socket sync it already has"""
+        return {"seen": self.state["seen"], "nodes": sorted(self.state["baselines"])}
+
+    def reply(self, user_data, request):
+        """Entries and baselines the profile that sent `request` lacks, with this profile's own request"""
+        return {
+            "entries": self.missing(user_data["exercise_history"], request["seen"]),
+            "baselines": {node: data for node, data in self.state["baselines"].items()
+                          if node not in request["nodes"]},
+            **self.request(),
+        }
+
+
+def send(f, message):
+    f.write(json.dumps(message, separators=(",", ":"), default=str).encode("utf-8") + b"\n")
+    f.flush()
+
+
+def receive(f):
+    line = f.readline()
+    if not line:
+        raise ConnectionError("The other side closed the connection")
+    return json.loads(line)
+
+
+def serve_sync(app, host, port, once=False):
+    """Accept sync connections, merging and saving the profile after each
+
+    The client sends what it holds, this side replies with what the client
+    lacks, and the client sends back what this side lacks.
+    """
+    with socket.create_server((host, port)) as server:
+        print(f"Waiting for sync connections on {host}:{port}", file=sys.stderr)
+        while True:
+            conn, address = server.accept()
+            with conn, conn.makefile("rwb") as f:
+                reply = app.sync.reply(app.user_data, receive(f))
+                send(f, reply)
+                delta = receive(f)
+                merged = app.sync.merge(app.user_data, app.stats, delta["entries"], delta["baselines"])
+            app.store.save(app.user_data)
+            print(f"{address[0]}: sent {len(reply['entries'])} entries, merged {merged}", file=sys.stderr)
+            if once:
+                return
+
+
+def sync_socket(app, host, port):
+    """Sync with a profile served by serve_sync; returns (entries sent, entries merged)"""
+    with socket.create_connection((host, port)) as conn, conn.makefile("rwb") as f:
+        send(f, app.sync.request())
+        reply = receive(f)
+        merged = app.sync.merge(app.user_data, app.stats, reply["entries"], reply["baselines"])
+        delta = app.sync.reply(app.user_data, reply)
+        send(f, {"entries": delta["entries"], "baselines": delta["baselines"]})
+    app.store.save(app.user_data)
+    return len(delta["entries"]), merged
+
+
+def run_sync(args):
+    """Entry point for `main.py sync`"""
+    from main import CircleOfFifths
+    from storage import AppendOnlyStore, SQLiteProfileStore
+
+    store = SQLiteProfileStore(args.db, args.user) if args.db else AppendOnlyStore(args.profile)
+    app = CircleOfFifths(store, output=lambda text="": None)
+    if args.dir:
+        sent, merged = app.sync.sync_directory(app.user_data, app.stats, args.dir)
+        app.store.save(app.user_data)
+    elif args.listen:
+        serve_sync(app, args.host, args.listen, args.once)
+        return
+    else:
+        sent, merged = sync_socket(app, args.host, args.connect)
+    print(f"Node {app.sync.node}: sent {sent} entries, merged {merged}; "
+          f"{app.user_data['exercises_completed']} exercises, skill level {app.user_data['skill_level']:.1f}",
+          file=sys.stderr)
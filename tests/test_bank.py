@@ -0,0 +1,24 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank import QuestionBank  # noqa: E402
+from questions import bank_stream  # noqa: E402
+
+
+class BankStreamTest(unittest.TestCase):
+    def test_no_repeats_until_the_bucket_is_used_up(self):
+        bank = QuestionBank.build()
+        size = len(bank.bucket("Relative Keys"))
+        stream = bank_stream(random.Random(1), bank, ("Relative Keys",))
+        first = [next(stream).prompt for _ in range(size)]
+        second = [next(stream).prompt for _ in range(size)]
+        self.assertEqual(len(set(first)), size)
+        self.assertEqual(set(second), set(first))
+
+
+if __name__ == "__main__":
+    unittest.main()
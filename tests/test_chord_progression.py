@@ -0,0 +1,38 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import CircleOfFifths  # noqa: E402
+from simulate import run_exercise  # noqa: E402
+from storage import MemoryStore  # noqa: E402
+
+
+def silent(text=""):
+    pass
+
+
+class ChordProgressionTest(unittest.TestCase):
+    def test_repeated_exercises_move_to_other_keys(self):
+        app = CircleOfFifths(MemoryStore(), output=silent, rng=random.Random(1))
+        app.check_answer = lambda response, answer: True
+        keys = []
+        for _ in range(15):
+            keys.append(app.scheduler.next_item("chord").split(":")[1])
+            run_exercise(app.chord_progression_steps())
+        self.assertGreater(len(set(keys)), 1)
+
+    def test_picked_chord_is_reviewed(self):
+        app = CircleOfFifths(MemoryStore(), output=silent, rng=random.Random(1))
+        app.check_answer = lambda response, answer: True
+        for _ in range(15):
+            item = app.scheduler.next_item("chord")
+            due = app.scheduler.state[item][3]
+            run_exercise(app.chord_progression_steps())
+            self.assertGreater(app.scheduler.state[item][3], due)
+
+
+if __name__ == "__main__":
+    unittest.main()
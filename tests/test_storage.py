@@ -0,0 +1,135 @@
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import CircleOfFifths  # noqa: E402
+from simulate import run_exercise  # noqa: E402
+from storage import AppendOnlyStore, SQLiteProfileStore, WriteBehindStore  # noqa: E402
+
+
+def silent(text=""):
+    pass
+
+
+def legacy_profile(path, entries):
+    """Write a profile in the format used before the history log, with the history inline"""
+    keys = CircleOfFifths.keys
+    user_data = {
+        "username": "legacy",
+        "exercises_completed": entries,
+        "correct_answers": entries,
+        "skill_level": 1,
+        "key_proficiency": {key: 1 for key in keys},
+        "exercise_history": [
+            {"date": f"2024-01-01 10:00:{i % 60:02d}", "type": "key_identification", "score": 1.0,
+             "difficulty": 0, "key": keys[i % len(keys)]}
+            for i in range(entries)
+        ],
+        "last_session": "2024-01-01 10:01:00",
+    }
+    with open(path, "w") as f:
+        json.dump(user_data, f, indent=4)
+
+
+class LegacyProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "profile.json")
+        legacy_profile(self.path, 20)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_load_leaves_the_file_unchanged(self):
+        with open(self.path, "rb") as f:
+            before = f.read()
+        history = AppendOnlyStore(self.path).load()["exercise_history"]
+        self.assertEqual(len(history), 20)
+        self.assertEqual(history[-1]["key"], CircleOfFifths.keys[19 % 12])
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), before)
+
+    def test_write_behind_saves_after_migration(self):
+        store = WriteBehindStore(AppendOnlyStore(self.path), delay=60)
+        app = CircleOfFifths(store, output=silent, rng=random.Random(1))
+        app.check_answer = lambda response, answer: True
+        for _ in range(2):
+            run_exercise(app.key_signature_steps())
+            self.assertTrue(store.flush())
+        history = app.user_data["exercise_history"]
+        self.assertEqual(len(history), 22)
+        self.assertEqual(history[0]["key"], "C")
+        store.close()
+
+        reloaded = AppendOnlyStore(self.path).load()
+        self.assertEqual(len(reloaded["exercise_history"]), 22)
+        self.assertEqual([entry["id"] for entry in reloaded["exercise_history"][20:]],
+                         [entry["id"] for entry in history[20:]])
+        self.assertEqual(reloaded["exercises_completed"], 22)
+
+
+class WriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "profile.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_snapshot_history_matches_its_counters(self):
+        store = WriteBehindStore(AppendOnlyStore(self.path), delay=60)
+        app = CircleOfFifths(store, output=silent, rng=random.Random(1))
+        app.check_answer = lambda response, answer: True
+        run_exercise(app.key_signature_steps())
+        # Another exercise finishes after the save was requested but before it is written
+        save, store.save = store.save, lambda user_data: None
+        run_exercise(app.key_signature_steps())
+        store.save = save
+        self.assertTrue(store.flush())
+
+        saved = AppendOnlyStore(self.path).load()
+        self.assertEqual(saved["exercises_completed"], 1)
+        self.assertEqual(len(saved["exercise_history"]), 1)
+
+        store.save(app.user_data)
+        store.close()
+        saved = AppendOnlyStore(self.path).load()
+        self.assertEqual(saved["exercises_completed"], 2)
+        self.assertEqual(len(saved["exercise_history"]), 2)
+
+
+class SQLiteStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "profiles.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_round_trip_keeps_entry_fields_and_sync_state(self):
+        store = SQLiteProfileStore(self.path, "learner")
+        app = CircleOfFifths(store, output=silent, rng=random.Random(1))
+        app.check_answer = lambda response, answer: True
+        for _ in range(2):
+            run_exercise(app.key_signature_steps())
+        history = list(app.user_data["exercise_history"])
+        store.close()
+
+        store = SQLiteProfileStore(self.path, "learner")
+        loaded = store.load()
+        self.assertEqual(loaded["sync"], app.user_data["sync"])
+        self.assertEqual(list(loaded["exercise_history"]), [dict(entry, date=str(entry["date"])) for entry in history])
+        self.assertEqual([entry["id"] for entry in reversed(loaded["exercise_history"])],
+                         [entry["id"] for entry in reversed(history)])
+        self.assertLessEqual({"id", "answers", "gains"}, set(history[0]))
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
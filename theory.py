@@ -0,0 +1,74 @@
+from types import MappingProxyType
+
+from harmony import diatonic_chords, roman_numerals
+
+
+class TheoryIndex:
+    """Read-only lookup tables for the Circle of Fifths, built once at import
+
+    Every lookup the exercises need (circle position, key signature, relative
+    keys, diatonic chords) is a dict or tuple access, so nothing is searched
+    or recomputed while questions are being generated.
+    """
+
+    __slots__ = (
+        "keys", "chord_degrees", "major_chords", "adjacent_keys", "position",
+        "sharp_keys", "flat_keys", "signature", "relative_minor", "minor_keys",
+        "relative_major", "chord", "chord_keys",
+    )
+
+    def __init__(self):
+        # Keys in circle order, starting from C and moving clockwise
+        keys = ("C", "G", "D", "A", "E", "B", "F#/Gb", "C#/Db", "Ab", "Eb", "Bb", "F")
+        chord_degrees = roman_numerals("major")
+        # Diatonic triads derived from the scale, spelled per harmony.scale
+        major_chords = {key: diatonic_chords(key, "major") for key in keys}
+
+        self.keys = keys
+        self.chord_degrees = chord_degrees
+        self.major_chords = MappingProxyType(major_chords)
+        self.position = MappingProxyType({key: i for i, key in enumerate(keys)})
+        self.adjacent_keys = MappingProxyType({
+            key: (keys[(i - 1) % 12], keys[(i + 1) % 12]) for i, key in enumerate(keys)
+        })
+
+        # Major key for a given number of sharps/flats (index = count)
+        self.sharp_keys = ("C", "G", "D", "A", "E", "B", "F#/Gb", "C#/Db")
+        self.flat_keys = ("C", "F", "Bb", "Eb", "Ab", "C#/Db", "F#/Gb", "B")
+
+        # Key -> (count, "sharps"/"flats"); the enharmonic keys are spelled with sharps
+        signature = {key: (i, "sharps") for i, key in enumerate(self.sharp_keys)}
+        for i, key in enumerate(("F", "Bb", "Eb", "Ab"), start=1):
+            signature[key] = (i, "flats")
+        self.signature = MappingProxyType(signature)
+
+        # Relative minor sits three steps clockwise (e.g. C -> am, G -> em)
+        self.minor_keys = tuple(key.lower() + "m" for key in keys)
+        self.relative_minor = MappingProxyType({
+            key: self.minor_keys[(i + 3) % 12] for i, key in enumerate(keys)
+        })
+        self.relative_major = MappingProxyType({
+            minor: keys[(i + 9) % 12] for i, minor in enumerate(self.minor_keys)
+        })
+
+        # (key, degree index) -> chord and chord -> keys containing it
+        self.chord = MappingProxyType({
+            (key, degree): chord for key, chords in major_chords.items() for degree, chord in enumerate(chords)
+        })
+        chord_keys = {}
+        for key, chords in major_chords.items():
+            for chord in chords:
+                chord_keys.setdefault(chord, []).append(key)
+        self.chord_keys = MappingProxyType({chord: tuple(ks) for chord, ks in chord_keys.items()})
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError("TheoryIndex is read-only")
+        object.__setattr__(self, name, value)
+
+    def step(self, key, steps):
+        """Key reached by moving `steps` positions clockwise (negative for counterclockwise)"""
+        return self.keys[(self.position[key] + steps) % 12]
+
+
+THEORY = TheoryIndex()
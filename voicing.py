@@ -0,0 +1,149 @@
+"""Voice leading for generated progressions and bulk MIDI export, run with `main.py midi`
+
+Every chord has a set of candidate four-part voicings (root in the bass, three
+upper voices on chord tones). A progression is voiced by dynamic programming
+over those candidates, minimising total voice movement plus a penalty for
+parallel fifths and octaves. Candidate sets, the cost table between two chords'
+candidates and whole voiced progressions are all memoised, so a batch run only
+solves each distinct progression once.
+"""
+import random
+import sys
+from functools import lru_cache
+from itertools import combinations
+from operator import add
+
+from harmony import chord_notes, parse_note
+from midi import MidiWriter
+from questions import PROGRESSION_PATTERNS, generate_progression
+from theory import THEORY
+
+# MIDI note ranges for the bass and for the three upper voices
+BASS_RANGE = (40, 55)  # E2-G3
+UPPER_RANGE = (55, 79)  # G3-G5
+
+# Upper voices may be at most this far apart from their neighbours
+MAX_SPACING = 12
+
+# Cost added for each pair of voices moving in parallel fifths or octaves
+PARALLEL_PENALTY = 6
+
+# Upper voices of the first chord are kept near this pitch rather than drifting to the edges
+CENTRE = 64
+
+# Note lengths in ticks (480 per beat): a whole bar per chord and a bar of rest between progressions
+TICKS_PER_BEAT = 480
+CHORD_TICKS = 4 * TICKS_PER_BEAT
+GAP_TICKS = 4 * TICKS_PER_BEAT
+
+
+@lru_cache(maxsize=1024)
+def candidate_voicings(notes):
+    """Four-part voicings (bass first, ascending MIDI notes) of a chord given as note names
+
+    The root is in the bass. The upper voices use only chord tones, cover
+    every note of a triad (a seventh chord may drop its fifth) and are no
+    more than MAX_SPACING apart.
+    """
+    pcs = [parse_note(note)[1] for note in notes]
+    root = pcs[0]
+    required = set(pcs) if len(pcs) <= 3 else set(pcs) - {pcs[2]}
+    basses = [p for p in range(*BASS_RANGE) if p % 12 == root]
+    pitches = [p for p in range(*UPPER_RANGE) if p % 12 in pcs]
+    voicings = []
+    for upper in combinations(pitches, 3):
+        if upper[1] - upper[0] > MAX_SPACING or upper[2] - upper[1] > MAX_SPACING:
+            continue
+        if not required <= {p % 12 for p in upper} | {root}:
+            continue
+        for bass in basses:
+            if bass < upper[0]:
+                voicings.append((bass,) + upper)
+    return tuple(voicings)
+
+
+def transition_cost(a, b):
+    """Total semitones moved between two voicings, plus a penalty per parallel fifth or octave"""
+    cost = sum(abs(x - y) for x, y in zip(a, b))
+    for i, j in combinations(range(len(a)), 2):
+        interval = (a[j] - a[i]) % 12
+        if interval in (0, 7) and (b[j] - b[i]) % 12 == interval and a[i] != b[i] and a[j] != b[j]:
+            cost += PARALLEL_PENALTY
+    return cost
+
+
+@lru_cache(maxsize=4096)
+def transition_table(first, second):
+    """Costs from every candidate of chord `first` (rows) to every candidate of `second`, one column per target"""
+    sources, targets = candidate_voicings(first), candidate_voicings(second)
+    return tuple(tuple(transition_cost(a, b) for a in sources) for b in targets)
+
+
+def start_cost(voicing):
+    return abs(sum(voicing[1:]) / 3 - CENTRE)
+
+
+@lru_cache(maxsize=4096)
+def voice_progression(chords):
+    """Smoothest voicing of a progression (a tuple of chords as note-name tuples)
+
+    Returns one voicing per chord, found by dynamic programming: the cheapest
+    way to reach each candidate of a chord is the cheapest way to reach some
+    candidate of the previous chord plus the move between them.
+    """
+    costs = [start_cost(v) for v in candidate_voicings(chords[0])]
+    back = []
+    for first, second in zip(chords, chords[1:]):
+        step_back, step_costs = [], []
+        for column in transition_table(first, second):
+            totals = list(map(add, costs, column))
+            best = min(totals)
+            step_costs.append(best)
+            step_back.append(totals.index(best))
+        back.append(step_back)
+        costs = step_costs
+    index = costs.index(min(costs))
+    path = [index]
+    for step_back in reversed(back):
+        index = step_back[index]
+        path.append(index)
+    path.reverse()
+    return tuple(candidate_voicings(chord)[i] for chord, i in zip(chords, path))
+
+
+def progression_chords(progression):
+    """Note-name tuples for the chords of a questions.Progression"""
+    return tuple(chord_notes(progression.key, "major", degree) for degree in progression.pattern)
+
+
+def progression_stream(rng, levels=tuple(PROGRESSION_PATTERNS)):
+    """Yield random progressions like those of the chord progression exercise"""
+    while True:
+        yield generate_progression(rng, rng.choice(levels), rng.choice(THEORY.keys))
+
+
+def export_midi(f, count, seed=0, levels=tuple(PROGRESSION_PATTERNS), bpm=90):
+    """Write `count` voiced progressions one after another into a MIDI file, each behind a marker
+
+    Progressions are generated, voiced and written one at a time, so memory
+    use does not grow with `count`. The file must be seekable.
+    """
+    rng = random.Random(seed)
+    writer = MidiWriter(f, TICKS_PER_BEAT, bpm, name="Circle of Fifths progressions")
+    writer.program(0)  # Acoustic grand piano
+    progressions = progression_stream(rng, levels)
+    for i in range(count):
+        progression = next(progressions)
+        writer.marker(f"{i + 1}: {progression.key} major " + "-".join(degree for degree, _ in progression.chords))
+        for voicing in voice_progression(progression_chords(progression)):
+            writer.chord(voicing, CHORD_TICKS)
+        writer.rest(GAP_TICKS)
+    writer.close()
+
+
+def run_midi(args):
+    """Entry point for `main.py midi`"""
+    with open(args.output, "wb") as f:
+        export_midi(f, args.count, args.seed, tuple(args.level or PROGRESSION_PATTERNS), args.bpm)
+    print(f"Wrote {args.count} progressions to {args.output} "
+          f"({voice_progression.cache_info().currsize} distinct progressions voiced)", file=sys.stderr)